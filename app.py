@@ -1,15 +1,21 @@
-from flask import Flask, render_template, request, jsonify, abort
+from flask import Flask, render_template, request, jsonify, abort, Response
 import os
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pytz
 import uuid
-from automation.login import open_website
+from automation.dispatcher import (dispatch_reservations, acquire_worker_slots, release_worker_slots,
+                                   wait_for_worker_slot, get_max_browser_workers)
+from automation.flight_recorder import CAPTURE_POLICIES, get_default_capture_policy
+from automation.metrics import REGISTRY, record_attempt
+from automation.activation_scheduler import ActivationScheduler, is_scheduler_enabled
+from automation.hedge import get_default_hedges, get_max_hedges
 from weather_service import get_daily_weather
+from reservation_store import ReservationStore
 
-# Import the Azure Data Tables client
-from azure.data.tables import TableServiceClient, UpdateMode
+# Shared, pooled Azure Table client
+from automation.storage_clients import get_table_client
 from azure.core.exceptions import ResourceExistsError
 
 # Load environment variables
@@ -29,9 +35,13 @@ app = Flask(__name__)
 
 ALLOWED = set(os.getenv("GOOGLE_ALLOWED_EMAILS", "").split(","))
 
-def get_table_client():
-    service_client = TableServiceClient.from_connection_string(conn_str=os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
-    return service_client.get_table_client(table_name=os.getenv("AZURE_STORAGE_TABLE_NAME"))
+def get_reservation_store():
+    return ReservationStore(get_table_client())
+
+def find_reservation(store, date, time):
+    """Point lookup of the reservation for `date`/`time` in its activation-date partition."""
+    utc_activation_time = datetime.fromisoformat(calculate_utc_activation_time(date, time))
+    return store.find(f"{date}_{time}", utc_activation_time)
 
 @app.before_request
 def enforce_allowlist():
@@ -58,6 +68,12 @@ def submit():
         time = data.get('time')
         time_slot_range = int(data.get('time_slot_range', '0'))  # Default to 0 if not provided
         course = data.get('course', 'ALL')  # Default to 'ALL' if not provided
+        capture_policy = data.get('capture_policy') or get_default_capture_policy()
+        if capture_policy not in CAPTURE_POLICIES:
+            return jsonify({'status': 'error', 'message': f"Invalid capture_policy: {capture_policy}"}), 400
+        hedges = int(data.get('hedges') or get_default_hedges())  # parallel attempts racing the unlock
+        if not 1 <= hedges <= get_max_hedges():
+            return jsonify({'status': 'error', 'message': f"hedges must be between 1 and {get_max_hedges()}"}), 400
 
         # Log the received data
         logging.info(f"Received reservation request - Date: {date}, Time: {time}, Time Slot Range: {time_slot_range}, Course: {course}")
@@ -69,9 +85,9 @@ def submit():
         # appended with a UUID for uniqueness in case of duplicate activation times.
         row_key = f"{date}_{time}"
 
-        # Build the entity to insert
+        # Build the entity to insert; the store assigns its activation-date
+        # partition and indexes it as due work
         reservation_entity = {
-            "PartitionKey": "reservations", 
             "RowKey": row_key,  # This is a unique identifier for the entity
             "date": date,
             "time": time,
@@ -81,12 +97,15 @@ def submit():
             "locked_until": datetime(1970, 1, 1, tzinfo=pytz.utc),
             "retry_count": 0,                 # Default retry count is 0
             "screenshot_folder_url": "",     # Will be set when processing starts
-            "course": course                  # Use the provided course or default to 'ALL'
+            "course": course,                 # Use the provided course or default to 'ALL'
+            "capture_policy": capture_policy,  # "full" or "flight_recorder" for the critical window
+            "hedges": hedges                   # >1 races that many attempts, first hold wins
         }
 
         # Insert the entity into the table
-        table_client = get_table_client()
-        table_client.create_entity(entity=reservation_entity)
+        get_reservation_store().create(reservation_entity)
+        if scheduler is not None:
+            scheduler.upsert(row_key, utc_activation_time)
         
         return jsonify({
             'status': 'success',
@@ -161,101 +180,214 @@ def calculate_utc_activation_time(user_date: str, user_time: str) -> str:
 # New route to process pending reservations, similar to your scheduler.py logic.
 @app.route('/run-reservation', methods=['GET','POST'])
 def run_reservation():
+    results = process_due_reservations()
+    return jsonify({"status": "success", "results": results}), 200
+
+def process_due_reservations(as_of=None):
+    """
+    Claim and run the pending reservations due by `as_of` (epoch seconds,
+    default now), as many as this instance has free browser workers for (one
+    per hedge). The rest stay in the due index for a later run or another
+    instance, and are reported as "deferred". Called by /run-reservation and
+    by the activation scheduler, which passes the due time it woke for
+    (possibly a little in the future). Returns the per-reservation results.
+    """
     # Constants
     MAX_RETRIES = 3
     LOCK_DURATION_MINUTES = 5
 
-    table_client = get_table_client()
-    now_utc = datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    store = get_reservation_store()
+    as_of_dt = datetime.fromtimestamp(as_of, pytz.utc) if as_of is not None else datetime.now(pytz.utc)
+    now_utc = as_of_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    # 1) Find ONE pending reservation whose activation time has arrived
-    #    and whose lock has already expired.
-    filter_query = (
-        "status eq 'pending' and "
-        f"utc_activation_time le datetime'{now_utc}' and "
-        f"locked_until lt datetime'{now_utc}'"
-    )
-    entities = table_client.query_entities(filter_query)
-    entity = next(entities, None)
+    # 1) Find EVERY pending reservation whose activation time has arrived
+    #    and whose lock has already expired: a range read of the due index.
+    due = store.due(as_of_dt)
 
-    if not entity:
+    if not due:
         logging.info(f"No pending reservations to process at {now_utc}")
-        return jsonify({"status": "success", "results": []}), 200
-
-    row_key = entity["RowKey"]
-    reservation_date = entity["date"]
-    reservation_time = entity["time"]
-    time_slot_range = entity.get("time_slot_range", 0)  # Get time_slot_range, default to 0
-    course = entity["course"]  # Get course directly from entity
-    retry_count = entity.get("retry_count", 0) + 1
-
-    # 2) Lock it right away
-    lock_until = datetime.now(pytz.utc) + timedelta(minutes=LOCK_DURATION_MINUTES)
-    entity["status"] = "locked"
-    entity["locked_until"] = lock_until
-    entity["retry_count"] = retry_count
-    
-    # If this is the first attempt (retry_count = 1), generate and store the screenshot folder URL
-    if retry_count == 1 and not entity.get("screenshot_folder_url"):
-        from automation.login import blob_service
-        blob_service.set_reservation_context(row_key, retry_count)
-        entity["screenshot_folder_url"] = blob_service.get_reservation_folder_url()
-        logging.info(f"Generated screenshot folder URL for reservation {row_key}")
-    
-    table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
-    logging.info(f"Locked reservation {row_key} until {lock_until}")
-
-    # Set up the blob storage context for this reservation
-    from automation.login import blob_service
-    blob_service.set_reservation_context(row_key, retry_count)
-
-    # 3) PROCESS it
-    result = {"RowKey": row_key}
-    try:
-        logging.info(f"Processing reservation {row_key}: {reservation_date} {reservation_time} with time slot range {time_slot_range} for course {course}")
-        open_website(reservation_date, reservation_time, time_slot_range, course)
-        # If we get here, it succeeded:
-        entity["status"] = "executed"
-        entity["locked_until"] = None
-        table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
-        logging.info(f"Reservation {row_key} executed successfully")
-        result["status"] = "executed"
+        return []
+
+    # 2) Lock as many as there are free workers for right away (which moves
+    #    them in the due index to the lock expiry). The lock is an
+    #    ETag-conditional claim, so when several instances poll at once exactly
+    #    one of them wins each reservation; the worker's lease heartbeat then
+    #    keeps locked_until ahead of the running attempt, and if the worker
+    #    dies the lease runs out and the reservation comes due again.
+    claimed = {}
+    jobs = []
+    deferred = []
+    for _, entity in due:
+        row_key = entity["RowKey"]
+        hedges = entity.get("hedges") or 1
+        if hedges > get_max_browser_workers():
+            logging.warning(f"Reservation {row_key} asks for {hedges} hedges, running {get_max_browser_workers()}")
+            hedges = get_max_browser_workers()
+        if not acquire_worker_slots(hedges):
+            deferred.append(row_key)
+            continue
+        retry_count = entity.get("retry_count", 0) + 1
+
+        lock_until = datetime.now(pytz.utc) + timedelta(minutes=LOCK_DURATION_MINUTES)
+        lease_owner = uuid.uuid4().hex
+        entity["retry_count"] = retry_count
+
+        try:
+            # If this is the first attempt (retry_count = 1), generate and store the screenshot folder URL
+            if retry_count == 1 and not entity.get("screenshot_folder_url"):
+                from automation.login import blob_service
+                entity["screenshot_folder_url"] = blob_service.get_reservation_folder_url(row_key)
+                logging.info(f"Generated screenshot folder URL for reservation {row_key}")
+            won = store.claim(entity, lease_owner, lock_until)
+        except Exception:
+            release_worker_slots(hedges)
+            raise
+        if not won:
+            logging.info(f"Reservation {row_key} was claimed by another instance, skipping")
+            release_worker_slots(hedges)
+            continue
+        logging.info(f"Locked reservation {row_key} until {lock_until} (lease {lease_owner})")
+
+        claimed[row_key] = entity
+        # Hedged reservations run one job per hedge under the same lease
+        for hedge in range(1, hedges + 1):
+            jobs.append({
+                "PartitionKey": entity["PartitionKey"],
+                "RowKey": row_key,
+                "date": entity["date"],
+                "time": entity["time"],
+                "time_slot_range": entity.get("time_slot_range", 0),  # Get time_slot_range, default to 0
+                "course": entity["course"],  # Get course directly from entity
+                "retry_count": retry_count,
+                "capture_policy": entity.get("capture_policy"),
+                "lease_owner": lease_owner,
+                "lease_seconds": LOCK_DURATION_MINUTES * 60,
+                "hedge": hedge,
+                "hedges": hedges
+            })
 
-    except Exception as e:
-        # On failure: if we still have retries left, keep status = pending
-        error_message = str(e)
-        if "No available tee times within the allowed range" in error_message:
-            # Immediately mark as failed for no available tee times
-            entity["status"] = "failed"
-            result["status"] = "failed"
-            logging.error(f"Reservation {row_key} failed - no available tee times: {error_message}")
-        elif retry_count < MAX_RETRIES:
-            entity["status"] = "pending"
-            result["status"] = "pending"
-            logging.warning(f"Reservation {row_key} failed, retry {retry_count}/{MAX_RETRIES}: {error_message}")
+    if deferred:
+        logging.info(f"All browser workers busy, leaving {len(deferred)} reservation(s) due: {deferred}")
+
+    # 3) PROCESS them in parallel on the browser worker pool
+    results = [{"RowKey": row_key, "status": "deferred"} for row_key in deferred]
+    hedge_outcomes = {}
+
+    def record_outcome(job, outcome):
+        row_key = job["RowKey"]
+        entity = claimed[row_key]
+        retry_count = job["retry_count"]
+        result = {"RowKey": row_key}
+
+        if job.get("hedges", 1) > 1:
+            # Wait for every hedge, then settle the reservation once
+            hedge_outcomes.setdefault(row_key, []).append(outcome)
+            if len(hedge_outcomes[row_key]) < job["hedges"]:
+                return
+            outcome = merge_hedge_outcomes(hedge_outcomes.pop(row_key))
+            # Hedges do not email their own results; the reservation gets one
+            from automation.login import send_email
+            send_email(job["date"], job["time"], outcome.get("actual_time"), success=outcome["succeeded"])
+            if outcome.get("hedge_winner") is not None:
+                entity["hedge_winner"] = outcome["hedge_winner"]
+                entity["hedge_margin_ms"] = outcome.get("hedge_margin_ms")
+                result["hedge_winner"] = outcome["hedge_winner"]
+                result["hedge_margin_ms"] = outcome.get("hedge_margin_ms")
+                logging.info(f"Reservation {row_key}: hedge {outcome['hedge_winner']} held a slot first"
+                             f" (margin {outcome.get('hedge_margin_ms')} ms)")
+
+        if outcome["succeeded"]:
+            entity["status"] = "executed"
+            entity["locked_until"] = None
+            logging.info(f"Reservation {row_key} executed successfully")
+            result["status"] = "executed"
         else:
-            entity["status"] = "failed"
-            result["status"] = "failed"
-            logging.error(f"Reservation {row_key} failed permanently after {retry_count} tries: {error_message}")
-
-        # Note: we DO NOT clear locked_until here so that no one picks it
-        # up again until the original lock expires.
-        table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
-        result["error"] = error_message
-        result["retry_count"] = retry_count
-
-    return jsonify({"status": "success", "results": [result]}), 200
+            # On failure: if we still have retries left, keep status = pending
+            error_message = outcome.get("error", "")
+            if "No available tee times within the allowed range" in error_message:
+                # Immediately mark as failed for no available tee times
+                entity["status"] = "failed"
+                result["status"] = "failed"
+                logging.error(f"Reservation {row_key} failed - no available tee times: {error_message}")
+            elif retry_count < MAX_RETRIES:
+                entity["status"] = "pending"
+                result["status"] = "pending"
+                logging.warning(f"Reservation {row_key} failed, retry {retry_count}/{MAX_RETRIES}: {error_message}")
+            else:
+                entity["status"] = "failed"
+                result["status"] = "failed"
+                logging.error(f"Reservation {row_key} failed permanently after {retry_count} tries: {error_message}")
+
+            # Note: we DO NOT clear locked_until here so that no one picks it
+            # up again until the lock expires; a retry is indexed as due at
+            # that expiry.
+            result["error"] = error_message
+            result["retry_count"] = retry_count
+
+        # Only the lease holder writes the outcome; if the lease was lost the
+        # reservation belongs to whichever instance took it over.
+        if not store.complete(entity, job["lease_owner"]):
+            logging.warning(f"Lease on reservation {row_key} was lost, not recording {result['status']}")
+            result["status"] = "lease_lost"
+
+        record_attempt(job["course"], result["status"], outcome.get("metrics", {}), outcome.get("error"))
+        results.append(result)
+
+    logging.info(f"Dispatching {len(jobs)} reservation(s) to the browser worker pool")
+    dispatch_reservations(jobs, record_outcome)
+
+    return results
+
+def merge_hedge_outcomes(outcomes):
+    """
+    Combine the outcomes of one reservation's hedged attempts: it succeeded if
+    any hedge did. The winner is the hedge whose hold was published first; the
+    margin is how far ahead of the closest losing hedge it was, in ms. Every
+    hedge's storage latencies are kept.
+    """
+    winner = next((o for o in outcomes if (o.get("hedge") or {}).get("won")), None)
+    margins = [o["hedge"]["margin_ms"] for o in outcomes
+               if (o.get("hedge") or {}).get("won") is False and o["hedge"].get("margin_ms") is not None]
+    succeeded = next((o for o in outcomes if o["succeeded"]), None)
+    # Report the attempt that decided the result: a success, else the winning
+    # hedge's failure, else any hedge that did not merely back off
+    merged = dict(succeeded or winner or next(
+        (o for o in outcomes if (o.get("hedge") or {}).get("won") is not False), outcomes[0]))
+    merged["metrics"] = dict(merged.get("metrics") or {})
+    merged["metrics"]["storage_latency"] = [series for o in outcomes
+                                            for series in (o.get("metrics") or {}).get("storage_latency", [])]
+    if winner is not None:
+        merged["hedge_winner"] = winner["hedge"]["hedge"]
+        merged["hedge_margin_ms"] = round(min(margins), 1) if margins else None
+        merged["metrics"]["hedge_margin_ms"] = merged["hedge_margin_ms"]
+    return merged
+
+def load_pending_activations():
+    """
+    (RowKey, due time) of every pending reservation for the activation scheduler.
+    A reservation is due at its activation time, or when its lock expires if
+    a failed attempt left it locked for a retry.
+    """
+    return get_reservation_store().pending()
 
     
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint for phase latencies, retries, failures and upload times."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/get-reservations', methods=['GET'])
 def get_reservations():
     try:
-        table_client = get_table_client()
-        # Query all reservations, ordered by date and time
-        entities = list(table_client.query_entities(
-            query_filter="PartitionKey eq 'reservations'",
+        # Query all reservations, or those activating on/after ?from=YYYY-MM-DD,
+        # as a range over the activation-date partitions
+        activation_from = request.args.get('from')
+        if activation_from:
+            activation_from = datetime.strptime(activation_from, '%Y-%m-%d')
+        entities = get_reservation_store().list_reservations(
+            activation_from,
             select=["date", "time", "status", "retry_count", "screenshot_folder_url"]
-        ))
+        )
         
         # Format the entities for the frontend
         formatted_reservations = []
@@ -293,11 +425,15 @@ def cancel_reservation():
                 'message': 'Date and time are required'
             }), 400
             
-        table_client = get_table_client()
+        store = get_reservation_store()
         row_key = f"{date}_{time}"
         
-        # Delete the entity instead of updating its status
-        table_client.delete_entity(partition_key="reservations", row_key=row_key)
+        # Delete the entity (and its due-index entry) instead of updating its status
+        entity = find_reservation(store, date, time)
+        if entity is not None:
+            store.delete(entity)
+        if scheduler is not None:
+            scheduler.remove(row_key)
         
         return jsonify({
             'status': 'success',
@@ -357,14 +493,28 @@ def serve_blob_image(blob_path):
         return '', 404
     
 def get_reservation_status(date, time):
-    table_client = get_table_client()
-    row_key = f"{date}_{time}"
     try:
-        entity = table_client.get_entity(partition_key="reservations", row_key=row_key)
+        entity = find_reservation(get_reservation_store(), date, time)
+        if entity is None:
+            return None
         return entity.get('status', 'failed')
     except Exception as e:
         # Log the error if needed
         return None
     
+def run_scheduled_reservations(row_keys, as_of):
+    """Scheduler callback: process due reservations, pacing retries of deferred ones."""
+    results = process_due_reservations(as_of)
+    if results and all(r["status"] == "deferred" for r in results):
+        # Every worker is busy with another run; the scheduler reloads (and
+        # finds these still due) when this returns, so wait for a free worker
+        wait_for_worker_slot(timeout=60)
+
+# In-process activation scheduler (SCHEDULER_ENABLED=1); /run-reservation keeps working alongside it
+scheduler = None
+if is_scheduler_enabled():
+    scheduler = ActivationScheduler(load_pending_activations, run_scheduled_reservations)
+    scheduler.start()
+
 if __name__ == '__main__':
     app.run(port=8080, host='0.0.0.0', debug=True)
@@ -0,0 +1,150 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from .metrics import SCHEDULER_LATENESS, SCHEDULER_QUEUE
+
+def is_scheduler_enabled():
+    """SCHEDULER_ENABLED=1 runs due reservations from the in-process scheduler."""
+    return os.getenv("SCHEDULER_ENABLED", "0") == "1"
+
+def get_scheduler_lead_seconds():
+    """How long before a reservation's due time the scheduler wakes (SCHEDULER_LEAD_SECONDS)."""
+    try:
+        return max(0.0, float(os.getenv("SCHEDULER_LEAD_SECONDS", "0")))
+    except ValueError:
+        logging.warning("Invalid SCHEDULER_LEAD_SECONDS, using 0")
+        return 0.0
+
+class ActivationScheduler:
+    """
+    Wakes at each pending reservation's due time instead of waiting for an
+    external poll of /run-reservation.
+
+    Due times (epoch seconds) sit in a min-heap keyed by time; a row key that
+    is re-scheduled or removed leaves a stale heap entry behind, which is
+    skipped when it reaches the top. The scheduler thread sleeps on a
+    Condition until the earliest due time minus `lead_seconds`, or until
+    `upsert`/`remove` changes the schedule, then hands every due row key to
+    `run_due(row_keys, as_of)` on its own thread and measures how late it woke.
+
+    `load_pending()` returns [(row_key, due_datetime), ...] for the full
+    reload done at start, after each run (to pick up retries, whose due time
+    is their lock expiry) and every `resync_seconds` as a safety net.
+    """
+    def __init__(self, load_pending, run_due, lead_seconds=None, resync_seconds=None):
+        self.load_pending = load_pending
+        self.run_due = run_due
+        self.lead_seconds = get_scheduler_lead_seconds() if lead_seconds is None else lead_seconds
+        if resync_seconds is None:
+            resync_seconds = float(os.getenv("SCHEDULER_RESYNC_SECONDS", "300"))
+        self.resync_seconds = resync_seconds
+        self._heap = []
+        self._due = {}  # row_key -> due epoch seconds currently scheduled
+        self._cond = threading.Condition()
+        self._next_resync = 0.0
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        """Load the pending reservations and start the scheduler thread."""
+        if self._thread is not None:
+            return
+        self.reload()
+        self._thread = threading.Thread(target=self._run, name="activation-scheduler", daemon=True)
+        self._thread.start()
+        logging.info(f"Activation scheduler started with {len(self._due)} pending reservation(s), "
+                     f"lead {self.lead_seconds:.1f} s")
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def reload(self):
+        """Replace the schedule with a fresh read of every pending reservation."""
+        try:
+            pending = self.load_pending()
+        except Exception as e:
+            logging.error(f"Scheduler reload failed: {e}")
+            return
+        with self._cond:
+            self._heap = []
+            self._due = {}
+            for row_key, due in pending:
+                self._push(row_key, due.timestamp())
+            self._next_resync = time.time() + self.resync_seconds
+            SCHEDULER_QUEUE.set(len(self._due))
+            self._cond.notify()
+
+    def upsert(self, row_key, due):
+        """Schedule (or re-schedule) one reservation at the aware datetime `due`."""
+        with self._cond:
+            self._push(row_key, due.timestamp())
+            SCHEDULER_QUEUE.set(len(self._due))
+            self._cond.notify()
+
+    def remove(self, row_key):
+        """Drop a reservation from the schedule (its heap entry goes stale)."""
+        with self._cond:
+            self._due.pop(row_key, None)
+            SCHEDULER_QUEUE.set(len(self._due))
+            self._cond.notify()
+
+    def _push(self, row_key, due_ts):
+        self._due[row_key] = due_ts
+        heapq.heappush(self._heap, (due_ts, row_key))
+
+    def _pop_due(self, now):
+        """Pop every live entry whose wake time has passed. Caller holds the lock."""
+        due = []
+        while self._heap:
+            due_ts, row_key = self._heap[0]
+            if self._due.get(row_key) != due_ts:
+                heapq.heappop(self._heap)  # stale: removed or re-scheduled
+                continue
+            if due_ts - self.lead_seconds > now:
+                break
+            heapq.heappop(self._heap)
+            del self._due[row_key]
+            due.append((row_key, due_ts))
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.time()
+                due = self._pop_due(now)
+                if not due:
+                    timeout = self._next_resync - now
+                    if self._heap:
+                        timeout = min(timeout, self._heap[0][0] - self.lead_seconds - now)
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+                        continue
+                SCHEDULER_QUEUE.set(len(self._due))
+            if not due:
+                self.reload()
+                continue
+
+            woke = time.time()
+            for row_key, due_ts in due:
+                lateness = woke - (due_ts - self.lead_seconds)
+                SCHEDULER_LATENESS.observe(max(0.0, lateness))
+                logging.info(f"Scheduler woke for {row_key} {lateness * 1000:.1f} ms after its wake time")
+            row_keys = [row_key for row_key, _ in due]
+            as_of = max(due_ts for _, due_ts in due)
+            threading.Thread(target=self._dispatch, args=(row_keys, as_of),
+                             name="activation-run", daemon=True).start()
+
+    def _dispatch(self, row_keys, as_of):
+        try:
+            self.run_due(row_keys, as_of)
+        except Exception as e:
+            logging.error(f"Scheduled run for {row_keys} failed: {e}")
+        finally:
+            # Failed attempts come back as pending with a new due time
+            self.reload()
@@ -0,0 +1,121 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from .attempt_logger import AttemptLogger
+from .screenshot_uploader import ScreenshotUploader
+from .flight_recorder import FlightRecorder, get_default_capture_policy
+from .server_clock import ServerClockEstimator
+from .wait_policy import WaitPolicy, get_hold_wait_profile
+from .page_library import PageLibrary
+
+class AttemptContext:
+    """
+    Per-attempt execution state threaded through open_website and every step helper.
+
+    Holds the reservation folder / attempt number that screenshots and logs are
+    written under, the attempt's own screenshot counter, its background
+    screenshot uploader and its AttemptLogger, so several attempts can run at
+    once in threads or processes without sharing state.
+    The blob service itself is stateless and may be shared between contexts.
+
+    `capture_policy` selects how screenshots are taken inside the critical
+    window: "full" captures and uploads every frame, "flight_recorder" keeps
+    frames in a FlightRecorder ring buffer until the window closes.
+
+    `hedge` is the hedge index of a hedged attempt; it is stamped into the
+    names of its screenshots and log so sibling hedges do not collide.
+    """
+    def __init__(self, reservation_folder, attempt, blob_service, capture_policy=None, hedge=None):
+        self.reservation_folder = reservation_folder
+        self.attempt = attempt
+        self.blob_service = blob_service
+        self.attempt_id = uuid.uuid4().hex[:8]
+        self._screenshot_counter = 0
+        self.timings = {}  # named measurements reported alongside the phase spans
+        self.server_clock = ServerClockEstimator()
+        self.http_engine = None  # DirectHttpEngine when SHEET_REFRESH_MODE=http
+        self.lease = None  # ReservationLease kept alive by the worker while the attempt runs
+        self.hedge = None  # HedgeCoordinator when the reservation runs several hedged attempts
+        self.booked_time = None  # tee time confirmed by this attempt
+        self.wait = WaitPolicy()
+        self._lock = threading.Lock()
+        self.logger = AttemptLogger(reservation_folder, attempt, blob_service, self.attempt_id, hedge=hedge)
+        self.page_lib = PageLibrary(self.logger)
+        self.uploader = ScreenshotUploader(blob_service, reservation_folder, attempt, hedge=hedge)
+        self.capture_policy = capture_policy or get_default_capture_policy()
+        self.recorder = FlightRecorder() if self.capture_policy == "flight_recorder" else None
+
+    def next_screenshot_number(self):
+        """Return the next sequential screenshot number for this attempt."""
+        with self._lock:
+            self._screenshot_counter += 1
+            return self._screenshot_counter
+
+    def check_lease(self):
+        """Raise LeaseLost if another instance has taken this reservation over."""
+        if self.lease is not None:
+            self.lease.check()
+
+    def is_recording(self):
+        """True while screenshots should go to the flight recorder instead of the uploader."""
+        return self.recorder is not None and self.recorder.active
+
+    @contextmanager
+    def critical_window(self):
+        """
+        Mark the unlock-critical section. Under the flight_recorder policy the
+        buffered frames are persisted when the block exits, whether the booking
+        was confirmed or the attempt failed. Waits inside the window follow
+        HOLD_WAIT_PROFILE.
+        """
+        navigation_profile = self.wait.profile
+        self.wait.use(get_hold_wait_profile())
+        if self.recorder is not None:
+            self.logger.log("Flight recorder armed for critical window")
+            self.recorder.active = True
+        try:
+            yield
+        finally:
+            self.wait.use(navigation_profile)
+            if self.recorder is not None:
+                self.recorder.active = False
+                self.logger.log(f"Flight recorder persisting {len(self.recorder.frames)} frame(s)")
+                self.recorder.flush(self.uploader)
+
+    def metrics(self):
+        """Phase spans and timings of this attempt, in the form metrics.record_attempt expects."""
+        return {
+            "phases": [[label, seconds] for label, seconds in self.logger.spans],
+            "unlock_to_click_seconds": self.timings.get("unlock_to_click_seconds"),
+            "clock_offset_ms": self.timings.get("clock_offset_ms"),
+            "clock_uncertainty_ms": self.timings.get("clock_uncertainty_ms"),
+            "server_clock_offset_ms": self.timings.get("server_clock_offset_ms"),
+            "screenshot_upload_ms": list(self.uploader.upload_ms),
+            "idle": self.wait.stats(),
+            "browser_lease_ms": self.timings.get("browser_lease_ms"),
+            "browser_launch_ms": self.timings.get("browser_launch_ms"),
+        }
+
+    def close(self):
+        """
+        Finish the attempt: wait for queued screenshot uploads to drain, record
+        their latencies in the attempt log, then flush and upload the log.
+        """
+        try:
+            if self.http_engine is not None:
+                self.http_engine.close()
+            if self.server_clock.history:
+                self.logger.log("ForeTees clock estimate history", event="server_clock_history",
+                                history=self.server_clock.history)
+            if self.page_lib.calls:
+                self.logger.log("Page library call costs", event="page_lib_summary",
+                                summary=self.page_lib.summary())
+            self.logger.log(f"Idle time in waits: {self.wait.stats()}", event="idle", **self.wait.stats())
+            if self.lease is not None:
+                self.logger.log(f"Reservation lease renewed {self.lease.renewals} time(s)"
+                                f"{', lost: ' + self.lease.lost_reason if self.lease.lost else ''}",
+                                event="lease_summary", renewals=self.lease.renewals, lost=self.lease.lost_reason)
+            self.uploader.drain()
+            self.logger.log(f"Screenshot uploads: {self.uploader.stats()}")
+        finally:
+            self.logger.close_and_upload()
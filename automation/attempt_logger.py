@@ -1,38 +1,66 @@
 import os
+import json
 import time
+import logging
 import threading
 from datetime import datetime
 
 class AttemptLogger:
-    """Helper for detailed per-attempt logging with ms precision and blob upload."""
-    def __init__(self, reservation_folder, attempt, blob_service):
+    """
+    Helper for detailed per-attempt logging with blob streaming.
+
+    Events are buffered in memory as structured records (wall-clock timestamp
+    plus a monotonic offset from the start of the attempt) and a background
+    thread appends them in JSON-lines batches to an Azure append blob every
+    LOG_FLUSH_INTERVAL seconds, so a killed worker still leaves a partial log.
+    Batches that cannot be appended are written to a local fallback file,
+    which is uploaded as a whole at `close_and_upload`. A hedged attempt's
+    log is named after its hedge too, so sibling hedges get separate blobs.
+    """
+    def __init__(self, reservation_folder, attempt, blob_service, attempt_id=None, flush_interval=None, hedge=None):
         self.reservation_folder = reservation_folder
         self.attempt = attempt
         self.blob_service = blob_service
         self.log_dir = os.path.join(os.path.dirname(__file__), 'logs', 'temp')
         os.makedirs(self.log_dir, exist_ok=True)
-        self.log_name = f"attempt_{self.attempt}"
-        self.log_path = os.path.join(self.log_dir, f"{self.log_name}.log")
+        self.log_name = f"attempt_{self.attempt}" + (f"_h{hedge}" if hedge is not None else "")
+        # Local file name is unique per attempt so concurrent attempts never share a file
+        local_name = f"{self.reservation_folder}_{self.log_name}_{attempt_id or os.getpid()}".replace(' ', '_').replace(':', '')
+        self.log_path = os.path.join(self.log_dir, f"{local_name}.log")
+        if flush_interval is None:
+            flush_interval = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+        self.flush_interval = flush_interval
         self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self.spans = []  # (label, seconds) of every completed context() block
         self._start_time = time.time()
-        with open(self.log_path, 'w', encoding='utf-8') as f:
-            f.write(f"Log for reservation: {self.reservation_folder}, attempt: {self.attempt}\n")
-            f.write(f"Start time: {datetime.now().isoformat()}\n")
-
-    def log(self, message):
-        now = datetime.now()
-        ms = int((now - now.replace(microsecond=0)).microseconds / 1000)
-        timestamp = now.strftime('%Y-%m-%d %H:%M:%S') + f'.{ms:03d}'
+        self._start_mono = time.monotonic()
+        self._blob_name = None
+        self._used_fallback = False
+        self._closed = threading.Event()
+
+        self.log(f"Log for reservation: {self.reservation_folder}, attempt: {self.attempt}", event="start")
+        self._thread = threading.Thread(target=self._run, name=f"attempt-logger-{local_name}", daemon=True)
+        self._thread.start()
+
+    def log(self, message, **fields):
+        """Buffer one structured event. Extra keyword fields are stored as-is."""
+        record = {
+            "ts": datetime.now().isoformat(timespec='milliseconds'),
+            "mono_ms": round((time.monotonic() - self._start_mono) * 1000, 3),
+            "msg": message,
+        }
+        record.update(fields)
         with self._lock:
-            with open(self.log_path, 'a', encoding='utf-8') as f:
-                f.write(f"[{timestamp}] {message}\n")
+            self._buffer.append(record)
 
     def log_duration(self, label, start, end, extra=None):
         duration_ms = int((end - start) * 1000)
         msg = f"{label} took {duration_ms} ms"
         if extra:
             msg += f" | {extra}"
-        self.log(msg)
+        self.log(msg, event="duration", label=label, duration_ms=duration_ms)
 
     def context(self, label):
         class Ctx:
@@ -41,18 +69,47 @@ class AttemptLogger:
                 self.label = label
             def __enter__(self):
                 self._start = time.time()
-                self.logger.log(f"START: {self.label}")
+                self.logger.log(f"START: {self.label}", event="span_start", label=self.label)
                 return self
             def __exit__(self, exc_type, exc_val, exc_tb):
                 end = time.time()
+                with self.logger._lock:
+                    self.logger.spans.append((self.label, end - self._start))
                 self.logger.log_duration(self.label, self._start, end)
-                self.logger.log(f"END: {self.label}")
+                self.logger.log(f"END: {self.label}", event="span_end", label=self.label,
+                                error=exc_type.__name__ if exc_type else None)
         return Ctx(self)
 
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Append all buffered events to the blob, or to the local fallback file on failure."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            data = "".join(json.dumps(record, default=str) + "\n" for record in batch).encode('utf-8')
+            try:
+                if self._blob_name is None:
+                    self._blob_name = self.blob_service.create_append_log(self.log_name, self.reservation_folder, self.attempt)
+                self.blob_service.append_log_block(self._blob_name, data)
+            except Exception as e:
+                logging.error(f"Failed to append attempt log batch, writing to local fallback: {e}")
+                with open(self.log_path, 'ab') as f:
+                    f.write(data)
+                self._used_fallback = True
+
     def close_and_upload(self):
-        self.log(f"Log finished at {datetime.now().isoformat()}")
-        try:
-            self.blob_service.upload_log_file(self.log_path, self.log_name)
-            os.remove(self.log_path)
-        except Exception as e:
-            self.log(f"Failed to upload log file: {e}")
\ No newline at end of file
+        self.log(f"Log finished at {datetime.now().isoformat()}", event="finish")
+        self._closed.set()
+        self._thread.join(self.flush_interval + 5)
+        self.flush()
+        if self._used_fallback:
+            try:
+                self.blob_service.upload_log_file(self.log_path, f"{self.log_name}_fallback", self.reservation_folder, self.attempt)
+                os.remove(self.log_path)
+            except Exception as e:
+                logging.error(f"Failed to upload fallback log file {self.log_path}: {e}")
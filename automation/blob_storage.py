@@ -1,16 +1,14 @@
-from azure.storage.blob import BlobServiceClient
 import os
 import logging
 from datetime import datetime
 from azure.core.exceptions import ResourceNotFoundError, ServiceRequestError
 import time
+from .storage_clients import get_blob_service_client
 
 class BlobStorageService:
     def __init__(self):
         self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         self.container_name = os.getenv("AZURE_STORAGE_BLOB_CONTAINER_NAME")
-        self.current_reservation_folder = None
-        self.current_attempt = None
         self.max_retries = 3
         self.retry_delay = 1  # seconds
         
@@ -23,7 +21,7 @@ class BlobStorageService:
         else:
             logging.info("Using Azure Portal storage")
             
-        self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+        self.blob_service_client = get_blob_service_client()
         self.container_client = self.blob_service_client.get_container_client(self.container_name)
         
     def _retry_operation(self, operation, *args, **kwargs):
@@ -36,27 +34,20 @@ class BlobStorageService:
                     raise
                 time.sleep(self.retry_delay * (2 ** attempt))
         
-    def set_reservation_context(self, row_key, retry_count):
-        """Set the current reservation context for uploading screenshots"""
-        self.current_reservation_folder = row_key
-        self.current_attempt = retry_count
-        logging.info(f"Set reservation context: folder={row_key}, attempt={retry_count}")
-        
-    def upload_screenshot(self, local_file_path, method_name):
-        """Upload a screenshot to blob storage in the correct attempt folder"""
+    def upload_screenshot(self, image_bytes, method_name, reservation_folder, attempt, captured_at=None, extension="png"):
+        """Upload in-memory image bytes to blob storage in the given reservation/attempt folder"""
         try:
-            if not self.current_reservation_folder or self.current_attempt is None:
+            if not reservation_folder or attempt is None:
                 raise ValueError("No active reservation context")
                 
-            # Generate blob name with folder structure
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            blob_name = f"{self.current_reservation_folder}/Attempt_{self.current_attempt}/{method_name}_{timestamp}.png"
+            # Generate blob name with folder structure, stamped with the capture time
+            timestamp = (captured_at or datetime.now()).strftime('%Y%m%d_%H%M%S')
+            blob_name = f"{reservation_folder}/Attempt_{attempt}/{method_name}_{timestamp}.{extension}"
             
-            # Upload the file with retry logic
+            # Upload the bytes with retry logic
             def upload_operation():
                 blob_client = self.container_client.get_blob_client(blob_name)
-                with open(local_file_path, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
+                blob_client.upload_blob(image_bytes, overwrite=True)
                 return blob_name
             
             blob_name = self._retry_operation(upload_operation)
@@ -66,15 +57,15 @@ class BlobStorageService:
             logging.error(f"Failed to upload screenshot: {str(e)}")
             raise
             
-    def upload_log_file(self, local_file_path, log_name):
-        """Upload a log file to blob storage in the correct attempt folder"""
+    def upload_log_file(self, local_file_path, log_name, reservation_folder, attempt):
+        """Upload a log file to blob storage in the given reservation/attempt folder"""
         try:
-            if not self.current_reservation_folder or self.current_attempt is None:
+            if not reservation_folder or attempt is None:
                 raise ValueError("No active reservation context")
 
             # Generate blob name with folder structure
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            blob_name = f"{self.current_reservation_folder}/Attempt_{self.current_attempt}/{log_name}_{timestamp}.log"
+            blob_name = f"{reservation_folder}/Attempt_{attempt}/{log_name}_{timestamp}.log"
 
             # Upload the file with retry logic
             def upload_operation():
@@ -90,9 +81,34 @@ class BlobStorageService:
             logging.error(f"Failed to upload log file: {str(e)}")
             raise
             
-    def get_reservation_folder_url(self):
-        """Get the URL for the current reservation folder"""
-        if self.current_reservation_folder:
+    def create_append_log(self, log_name, reservation_folder, attempt):
+        """Create an append blob for a streamed attempt log and return its name"""
+        if not reservation_folder or attempt is None:
+            raise ValueError("No active reservation context")
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        blob_name = f"{reservation_folder}/Attempt_{attempt}/{log_name}_{timestamp}.log"
+
+        def create_operation():
+            blob_client = self.container_client.get_blob_client(blob_name)
+            blob_client.create_append_blob()
+            return blob_name
+
+        blob_name = self._retry_operation(create_operation)
+        logging.info(f"Created append log blob {blob_name}")
+        return blob_name
+
+    def append_log_block(self, blob_name, data):
+        """Append a batch of log lines to an existing append blob"""
+        def append_operation():
+            blob_client = self.container_client.get_blob_client(blob_name)
+            blob_client.append_block(data)
+
+        self._retry_operation(append_operation)
+
+    def get_reservation_folder_url(self, reservation_folder):
+        """Get the URL for a reservation folder"""
+        if reservation_folder:
             # Get the storage account name from environment variable
             account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
             if not account_name:
@@ -100,7 +116,7 @@ class BlobStorageService:
             
             # Construct the Azure Storage URL
             container_url = f"https://{account_name}.blob.core.windows.net/{self.container_name}"
-            folder_url = f"{container_url}/{self.current_reservation_folder}"
+            folder_url = f"{container_url}/{reservation_folder}"
             return folder_url
         return None
 
@@ -167,8 +183,9 @@ class BlobStorageService:
             blob_data = self._retry_operation(download_blob_operation)
             
             # Set cache headers
+            content_type = 'image/jpeg' if blob_path.endswith('.jpg') else 'image/png'
             headers = {
-                'Content-Type': 'image/png',
+                'Content-Type': content_type,
                 'Cache-Control': 'public, max-age=31536000',  # Cache for 1 year
                 'ETag': blob_properties.etag,
                 'Last-Modified': blob_properties.last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
@@ -0,0 +1,224 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from seleniumbase import SB
+
+def is_browser_pool_enabled():
+    """BROWSER_POOL=1 keeps a warm browser per worker process between attempts."""
+    return os.getenv("BROWSER_POOL", "0") == "1"
+
+def _descendant_rss_mb(root_pid):
+    """Resident memory (MB) of every process below `root_pid` (Xvfb, chromedriver, Chrome)."""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the command name may contain spaces; fields resume after the last ')'
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    children = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    page_mb = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    total, stack = 0.0, list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_mb
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+class _PooledBrowser:
+    """An entered SB context kept open across attempts."""
+    def __init__(self, options):
+        self.options = dict(options)
+        start = time.perf_counter()
+        self._context = SB(**self.options)
+        self.sb = self._context.__enter__()
+        self.launch_ms = (time.perf_counter() - start) * 1000
+        self.uses = 0
+
+    def is_alive(self):
+        try:
+            self.sb.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self._context.__exit__(None, None, None)
+        except Exception as e:
+            logging.warning(f"Error closing pooled browser: {e}")
+
+class BrowserPool:
+    """
+    Warm undetected Chrome instances (with their virtual display) for this
+    worker process.
+
+    `lease` hands out an idle browser launched with the same SB options, or
+    launches one, and resets it to a clean state when the attempt ends: extra
+    tabs closed, resource blocking lifted, cookies and site storage cleared
+    and the tab parked on about:blank. The HTTP cache is kept warm on purpose.
+    A browser is recycled after BROWSER_POOL_MAX_USES leases, when its process
+    tree exceeds BROWSER_POOL_MAX_RSS_MB, when the reset fails, or at once if
+    it runs on a persistent account profile (SESSION_USER_DATA_DIR).
+    """
+    def __init__(self, max_uses=None, max_rss_mb=None):
+        if max_uses is None:
+            max_uses = int(os.getenv("BROWSER_POOL_MAX_USES", "20"))
+        if max_rss_mb is None:
+            max_rss_mb = float(os.getenv("BROWSER_POOL_MAX_RSS_MB", "1500"))
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {"launches": 0, "reuses": 0, "recycled": 0}
+
+    def _take(self, options):
+        with self._lock:
+            for browser in self._idle:
+                if browser.options == options:
+                    self._idle.remove(browser)
+                    return browser
+        return None
+
+    def _launch(self, options):
+        browser = _PooledBrowser(options)
+        with self._lock:
+            self.stats["launches"] += 1
+        logging.info(f"Launched pooled browser in {browser.launch_ms:.0f} ms")
+        return browser
+
+    def prewarm(self, options):
+        """Launch an idle browser ahead of the first lease."""
+        browser = self._launch(options)
+        with self._lock:
+            self._idle.append(browser)
+
+    @contextmanager
+    def lease(self, options, logger=None, timings=None):
+        """
+        Yield a ready `sb` for one attempt. Lease and launch latencies are
+        logged and stored in `timings` ("browser_lease_ms", "browser_launch_ms").
+        """
+        start = time.perf_counter()
+        browser = self._take(options)
+        if browser is not None and not browser.is_alive():
+            self._discard(browser, "dead")
+            browser = None
+        launched = browser is None
+        if launched:
+            browser = self._launch(options)
+        else:
+            with self._lock:
+                self.stats["reuses"] += 1
+        browser.uses += 1
+        lease_ms = (time.perf_counter() - start) * 1000
+        if timings is not None:
+            timings["browser_lease_ms"] = lease_ms
+            timings["browser_launch_ms"] = browser.launch_ms if launched else 0.0
+        if logger is not None:
+            logger.log(f"Browser lease took {lease_ms:.0f} ms ({'launched' if launched else 'warm'}, use {browser.uses})",
+                       event="browser_lease", lease_ms=round(lease_ms, 1), launched=launched,
+                       launch_ms=round(browser.launch_ms, 1), uses=browser.uses, pool=dict(self.stats))
+        try:
+            yield browser.sb
+        finally:
+            self._release(browser)
+
+    def _release(self, browser):
+        reason = None
+        if browser.options.get("user_data_dir"):
+            # The account profile's lock is released with the attempt, so the
+            # browser holding that profile cannot outlive it
+            reason = "persistent profile"
+        elif browser.uses >= self.max_uses:
+            reason = f"{browser.uses} uses"
+        else:
+            rss_mb = _descendant_rss_mb(os.getpid())
+            if rss_mb > self.max_rss_mb:
+                reason = f"{rss_mb:.0f} MB RSS"
+        if reason is None:
+            try:
+                self._reset(browser)
+            except Exception as e:
+                reason = f"reset failed: {e}"
+        if reason is not None:
+            self._discard(browser, reason)
+            return
+        with self._lock:
+            self._idle.append(browser)
+
+    def _reset(self, browser):
+        sb = browser.sb
+        handles = sb.driver.window_handles
+        for handle in handles[1:]:
+            sb.driver.switch_to.window(handle)
+            sb.driver.close()
+        sb.driver.switch_to.window(handles[0])
+        sb.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+        sb.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        for url in (os.getenv("CLUB_URL"), "https://web.foretees.com"):
+            if url:
+                parsed = urlparse(url)
+                sb.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                    "origin": f"{parsed.scheme}://{parsed.netloc}",
+                    "storageTypes": "local_storage,session_storage,indexeddb,service_workers",
+                })
+        sb.open("about:blank")
+
+    def _discard(self, browser, reason):
+        logging.info(f"Recycling pooled browser after {reason}")
+        with self._lock:
+            self.stats["recycled"] += 1
+        browser.close()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for browser in idle:
+            browser.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """This worker process's BrowserPool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+@contextmanager
+def browser_session(options, logger=None, timings=None):
+    """
+    Browser for one attempt: leased from the process pool when BROWSER_POOL=1,
+    otherwise launched and torn down with SB(...) as before.
+    """
+    if is_browser_pool_enabled():
+        with get_browser_pool().lease(options, logger, timings) as sb:
+            yield sb
+        return
+    start = time.perf_counter()
+    with SB(**options) as sb:
+        launch_ms = (time.perf_counter() - start) * 1000
+        if timings is not None:
+            timings["browser_lease_ms"] = launch_ms
+            timings["browser_launch_ms"] = launch_ms
+        if logger is not None:
+            logger.log(f"Browser launch took {launch_ms:.0f} ms", event="browser_lease",
+                       lease_ms=round(launch_ms, 1), launched=True, launch_ms=round(launch_ms, 1))
+        yield sb
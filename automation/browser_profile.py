@@ -0,0 +1,95 @@
+import os
+import logging
+
+# URL patterns blocked per site outside the captcha phase (CDP Network.setBlockedURLs
+# wildcards). Resource types are matched by extension, since setBlockedURLs only
+# takes URL patterns. Override a site's list with BLOCK_URLS_<SITE> (comma-separated).
+DEFAULT_BLOCK_PATTERNS = {
+    "club": [
+        # images and fonts
+        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico",
+        "*.woff", "*.woff2", "*.ttf", "*.otf",
+        # third-party trackers and embeds
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*youtube.com*", "*vimeo.com*",
+    ],
+    "foretees": [
+        "*.jpg", "*.jpeg", "*.gif", "*.webp",
+        "*.woff", "*.woff2", "*.ttf", "*.otf",
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    ],
+}
+
+# Reads the current document's navigation timing and resource totals
+PAGE_LOAD_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+var bytes = 0;
+resources.forEach(function (r) { bytes += r.transferSize || 0; });
+if (!nav) { return null; }
+return {
+    url: location.href,
+    dom_content_loaded_ms: Math.round(nav.domContentLoadedEventEnd),
+    load_ms: Math.round(nav.loadEventEnd),
+    document_bytes: nav.transferSize || 0,
+    resources: resources.length,
+    resource_bytes: bytes
+};
+"""
+
+def is_network_blocking_enabled():
+    """NETWORK_BLOCKING=0 turns resource blocking off, e.g. when a page breaks."""
+    return os.getenv("NETWORK_BLOCKING", "1") != "0"
+
+def get_browser_options(user_data_dir=None):
+    """
+    Keyword arguments for SB(...): undetected mode under xvfb, with the
+    page-load strategy from PAGE_LOAD_STRATEGY ("eager" by default, so
+    navigation returns at DOMContentLoaded instead of waiting for every
+    image and tracker), and an optional persistent Chrome profile.
+    """
+    strategy = os.getenv("PAGE_LOAD_STRATEGY", "eager")
+    if strategy not in ("normal", "eager", "none"):
+        logging.warning(f"Invalid PAGE_LOAD_STRATEGY={strategy!r}, using eager")
+        strategy = "eager"
+    options = {"uc": True, "xvfb": True, "page_load_strategy": strategy}
+    if user_data_dir:
+        options["user_data_dir"] = user_data_dir
+    return options
+
+def get_block_patterns(site):
+    """Blocked URL patterns for `site` ("club" or "foretees")."""
+    override = os.getenv(f"BLOCK_URLS_{site.upper()}")
+    if override is not None:
+        return [p.strip() for p in override.split(',') if p.strip()]
+    return list(DEFAULT_BLOCK_PATTERNS.get(site, []))
+
+def apply_network_blocking(sb, site, logger):
+    """
+    Block the site's non-essential resources in the current tab. Pass
+    site=None to lift all blocking (the captcha must load untouched).
+    Returns the patterns now in effect.
+    """
+    patterns = get_block_patterns(site) if site and is_network_blocking_enabled() else []
+    try:
+        sb.driver.execute_cdp_cmd("Network.enable", {})
+        sb.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        logger.log(f"Could not set blocked URLs for {site}: {e}")
+        return []
+    logger.log(f"Network blocking for {site or 'none'}: {len(patterns)} pattern(s)",
+               event="network_blocking", site=site, patterns=patterns)
+    return patterns
+
+def log_page_load(sb, phase, logger):
+    """Log the current page's load timing so phases can be compared with blocking on and off."""
+    try:
+        timing = sb.execute_script(PAGE_LOAD_SCRIPT)
+    except Exception as e:
+        logger.log(f"Could not read page load timing after {phase}: {e}")
+        return None
+    if timing:
+        logger.log(f"Page load after {phase}: DOMContentLoaded {timing['dom_content_loaded_ms']} ms, "
+                   f"load {timing['load_ms']} ms, {timing['resources']} resources",
+                   event="page_load", phase=phase, blocking=is_network_blocking_enabled(), **timing)
+    return timing
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import statistics
+import threading
+from contextlib import contextmanager
+import ntplib
+
+# No server is queried more often than this (the NTP minimum poll interval)
+MIN_POLL_SECONDS = 64
+# Back-off after a RATE kiss-o'-death, doubling up to the maximum poll interval
+MAX_BACKOFF_SECONDS = 4096
+# DENY and RSTR ask clients to stop; such a server is left alone for a day
+DENIED_BACKOFF_SECONDS = 86400
+
+class TimeSyncError(Exception):
+    """Raised when no NTP server could be sampled."""
+    pass
+
+def _kiss_code(response):
+    """The four-letter kiss code of a Kiss-o'-Death response (stratum 0), else None."""
+    if response.stratum != 0:
+        return None
+    return int(response.ref_id).to_bytes(4, "big").decode("ascii", "replace")
+
+def _parse_server(entry, default_port):
+    """Split "host" or "host:port" into (host, port)."""
+    host, _, port = entry.strip().rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return entry.strip(), default_port
+
+class ClockOffsetService:
+    """
+    Cached estimate of the local clock's offset from NTP time.
+
+    A refresh takes one sample from every configured server; the burst
+    before a registered unlock (see burst_before) takes several, keeps only
+    the samples whose round-trip delay is close to the best one seen (those
+    have the least asymmetric network delay), and takes the median of their
+    offsets. The estimate is cached for `max_age` seconds and kept fresh by
+    a background thread.
+
+    Estimates are shared through a cache file (NTP_CACHE_PATH) by every
+    process on the host, and no refresh queries the servers within
+    MIN_POLL_SECONDS of the last one, so the worker processes together poll
+    like a single client. Servers answering with a Kiss-o'-Death are backed
+    off (RATE) or dropped for a day (DENY, RSTR).
+
+    A positive offset means the local clock is behind: true time = local time + offset.
+    """
+    def __init__(self, servers=None, samples_per_server=None, max_age=None, timeout=1.0, port=123,
+                 cache_path=None, burst_window=None, burst_spacing=2.0):
+        if servers is None:
+            servers = os.getenv("NTP_SERVERS", "pool.ntp.org").split(',')
+        self.servers = [_parse_server(s, port) for s in servers if s.strip()]
+        if samples_per_server is None:
+            samples_per_server = int(os.getenv("NTP_SAMPLES_PER_SERVER", "4"))
+        if max_age is None:
+            max_age = float(os.getenv("NTP_MAX_AGE_SECONDS", "300"))
+        if cache_path is None:
+            cache_path = os.getenv("NTP_CACHE_PATH", os.path.join(tempfile.gettempdir(), "teetime_clock_offset.json"))
+        if burst_window is None:
+            burst_window = float(os.getenv("NTP_BURST_WINDOW_SECONDS", "180"))
+        self.samples_per_server = samples_per_server
+        self.max_age = max_age
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.burst_window = burst_window
+        self.burst_spacing = burst_spacing
+        self._client = ntplib.NTPClient()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._estimate = None
+        self._backoff = {}  # "host:port" -> {"until": epoch seconds, "seconds": current back-off}
+        self._unlock_at = None
+        self._thread = None
+
+    def _sample(self, burst=False):
+        samples = []
+        now = time.time()
+        for host, port in self.servers:
+            server = f"{host}:{port}"
+            if self._backoff.get(server, {}).get("until", 0) > now:
+                continue
+            for i in range(self.samples_per_server if burst else 1):
+                if i:
+                    time.sleep(self.burst_spacing)
+                try:
+                    response = self._client.request(host, version=3, port=port, timeout=self.timeout)
+                except Exception as e:
+                    logging.warning(f"NTP sample from {server} failed: {e}")
+                    continue
+                code = _kiss_code(response)
+                if code is not None:
+                    self._back_off(server, code)
+                    break
+                self._backoff.pop(server, None)
+                samples.append((response.offset, response.delay, server))
+        return samples
+
+    def _back_off(self, server, code):
+        if code in ("DENY", "RSTR"):
+            seconds = DENIED_BACKOFF_SECONDS
+        else:
+            previous = self._backoff.get(server, {}).get("seconds", MIN_POLL_SECONDS)
+            seconds = min(previous * 2, MAX_BACKOFF_SECONDS)
+        self._backoff[server] = {"until": time.time() + seconds, "seconds": seconds}
+        logging.warning(f"NTP server {server} sent kiss code {code}, not querying it for {seconds} s")
+
+    @contextmanager
+    def _cache_lock(self):
+        with open(f"{self.cache_path}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, estimate):
+        cached = {k: v for k, v in estimate.items() if k != "sampled_mono"}
+        cached["backoff"] = self._backoff
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _adopt(self, cached):
+        estimate = {k: v for k, v in cached.items() if k != "backoff"}
+        estimate["sampled_mono"] = time.monotonic() - (time.time() - cached["sampled_at"])
+        with self._lock:
+            self._estimate = estimate
+        return estimate
+
+    def refresh(self, burst=False):
+        """
+        Update the cached estimate, taking a burst of samples per server when
+        `burst` is set. Within MIN_POLL_SECONDS of the last query round (by
+        any process) the shared estimate is adopted without querying.
+
+        The cache file is locked only to read it and to claim or record a
+        round; the servers are queried without it, so a burst (several
+        seconds) does not hold up other processes, which meanwhile adopt the
+        previous estimate.
+        """
+        with self._refresh_lock:
+            with self._cache_lock():
+                cached = self._read_cache()
+                if cached is not None:
+                    self._backoff = cached.get("backoff", {})
+                    if time.time() - cached.get("queried_at", 0) < MIN_POLL_SECONDS:
+                        if "offset_s" not in cached:
+                            raise TimeSyncError(f"No NTP server answered within the last {MIN_POLL_SECONDS} s")
+                        return self._adopt(cached)
+                # Claim the round, so no other process queries while this one does
+                claimed = dict(cached or {})
+                claimed["queried_at"] = time.time()
+                self._write_cache(claimed)
+
+            samples = self._sample(burst)
+            if not samples:
+                # The failed round stays recorded, so it is not retried by every process at once
+                with self._cache_lock():
+                    self._write_cache(claimed)
+                raise TimeSyncError(f"No NTP server answered: {[h for h, _ in self.servers]}")
+
+            best_delay = min(delay for _, delay, _ in samples)
+            # Keep samples within 2x (+2 ms) of the fastest round trip
+            kept = [s for s in samples if s[1] <= best_delay * 2 + 0.002]
+            offsets = [offset for offset, _, _ in kept]
+            offset = statistics.median(offsets)
+            spread = (max(offsets) - min(offsets)) / 2 if len(offsets) > 1 else 0.0
+            estimate = {
+                "offset_s": offset,
+                # Half the best round trip bounds the asymmetric-delay error of any one sample
+                "uncertainty_s": best_delay / 2 + spread,
+                "samples": len(samples),
+                "kept": len(kept),
+                "servers": sorted({server for _, _, server in kept}),
+                "burst_for": self._unlock_at if burst else None,
+                "sampled_at": time.time(),
+                "queried_at": claimed["queried_at"],
+                "sampled_mono": time.monotonic(),
+            }
+            with self._lock:
+                self._estimate = estimate
+            with self._cache_lock():
+                self._write_cache(estimate)
+            logging.info(f"Clock offset {offset * 1000:+.1f} ms ± {estimate['uncertainty_s'] * 1000:.1f} ms "
+                         f"from {len(kept)}/{len(samples)} NTP samples{' (burst)' if burst else ''}")
+            return estimate
+
+    def burst_before(self, unlock_at):
+        """Have the background thread take one burst within the window before the epoch time `unlock_at`."""
+        self._unlock_at = unlock_at
+
+    def _burst_due(self, estimate):
+        unlock = self._unlock_at
+        if unlock is None or (estimate is not None and estimate.get("burst_for") == unlock):
+            return False
+        return unlock - self.burst_window <= time.time() < unlock
+
+    def _next_refresh_in(self, interval):
+        with self._lock:
+            estimate = self._estimate
+        age = time.time() - estimate["queried_at"] if estimate else MIN_POLL_SECONDS
+        wait = max(interval - age, MIN_POLL_SECONDS - age, 1.0)
+        unlock = self._unlock_at
+        if unlock is not None and time.time() < unlock and (estimate is None or estimate.get("burst_for") != unlock):
+            window_start = unlock - self.burst_window
+            wait = min(wait, max(window_start - time.time(), MIN_POLL_SECONDS - age, 1.0))
+        return wait
+
+    def current(self, block=True):
+        """
+        Return the cached estimate plus an "age_s"/"stale" flag.
+
+        A missing or expired estimate is refreshed synchronously when `block` is
+        True; otherwise the stale value (or None) is returned immediately.
+        """
+        with self._lock:
+            estimate = self._estimate
+        expired = estimate is None or time.monotonic() - estimate["sampled_mono"] > self.max_age
+        if expired and block:
+            try:
+                estimate = self.refresh()
+            except TimeSyncError as e:
+                logging.error(str(e))
+        if estimate is None:
+            return None
+        result = dict(estimate)
+        result["age_s"] = time.monotonic() - estimate["sampled_mono"]
+        result["stale"] = result["age_s"] > self.max_age
+        return result
+
+    def start_background(self, interval=None):
+        """
+        Refresh the estimate every `interval` seconds (NTP_REFRESH_SECONDS, at
+        least MIN_POLL_SECONDS) on a daemon thread, bursting before an unlock.
+        """
+        if self._thread is not None:
+            return
+        if interval is None:
+            interval = float(os.getenv("NTP_REFRESH_SECONDS", "300"))
+        interval = max(interval, MIN_POLL_SECONDS)
+
+        def run():
+            while True:
+                with self._lock:
+                    estimate = self._estimate
+                try:
+                    self.refresh(burst=self._burst_due(estimate))
+                except Exception as e:
+                    logging.error(f"Background NTP refresh failed: {e}")
+                time.sleep(self._next_refresh_in(interval))
+
+        self._thread = threading.Thread(target=run, name="clock-offset", daemon=True)
+        self._thread.start()
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_clock_offset_service():
+    """
+    Process-wide ClockOffsetService with its background refresh running;
+    its estimates are shared with the host's other processes.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ClockOffsetService()
+            _service.start_background()
+        return _service
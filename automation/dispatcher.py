@@ -0,0 +1,167 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Worker slots taken by jobs claimed in this process, dispatched or about to be
+_busy_slots = 0
+_slots_cond = threading.Condition()
+
+def get_max_browser_workers():
+    """Upper bound on concurrent browser processes, from MAX_BROWSER_WORKERS in .env."""
+    try:
+        return max(1, int(os.getenv("MAX_BROWSER_WORKERS", "3")))
+    except ValueError:
+        logging.warning("Invalid MAX_BROWSER_WORKERS, using default of 3")
+        return 3
+
+def acquire_worker_slots(count):
+    """
+    Reserve `count` worker slots (all or none) for jobs about to be claimed.
+    Returns False when fewer are free, so the caller leaves the work due for
+    later or for an instance with idle workers instead of queueing it here.
+    """
+    global _busy_slots
+    with _slots_cond:
+        if _busy_slots + count > get_max_browser_workers():
+            return False
+        _busy_slots += count
+        return True
+
+def release_worker_slots(count=1):
+    """Give back slots taken by acquire_worker_slots."""
+    global _busy_slots
+    with _slots_cond:
+        _busy_slots = max(0, _busy_slots - count)
+        _slots_cond.notify_all()
+
+def wait_for_worker_slot(timeout):
+    """Block until a worker slot is free or `timeout` seconds pass. Returns True if one is free."""
+    with _slots_cond:
+        return _slots_cond.wait_for(lambda: _busy_slots < get_max_browser_workers(), timeout)
+
+def _init_worker():
+    """Worker-process initializer: launch the warm browser before the first job arrives."""
+    from .browser_pool import is_browser_pool_enabled, get_browser_pool
+    from .browser_profile import get_browser_options
+    if not is_browser_pool_enabled() or os.getenv("BROWSER_POOL_PREWARM", "1") == "0":
+        return
+    try:
+        get_browser_pool().prewarm(get_browser_options())
+    except Exception as e:
+        logging.error(f"Browser pool pre-warm failed: {e}")
+
+def get_executor():
+    """Return the process-wide pool of browser worker processes, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps each worker free of the parent's sockets and threads
+            _executor = ProcessPoolExecutor(
+                max_workers=get_max_browser_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            logging.info(f"Started browser worker pool with {get_max_browser_workers()} processes")
+        return _executor
+
+def _reset_executor(broken):
+    """
+    Drop the `broken` pool so the next get_executor starts a fresh one. A pool
+    another dispatch already started in its place is left running.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def run_reservation_job(job):
+    """
+    Worker-process entry point: run one reservation attempt end to end.
+
+    Args:
+        job (dict): RowKey, date, time, time_slot_range, course, retry_count and
+                    capture_policy of a reservation already locked by the caller.
+    Returns:
+        dict: {"RowKey", "succeeded", "metrics"} plus "actual_time" (the booked
+              tee time) on success and "error" when the attempt failed. The
+              metrics carry this worker's storage latencies since its last job,
+              since /metrics is served from the dispatching process.
+    """
+    from .login import open_website, blob_service
+    from .attempt_context import AttemptContext
+    from .metrics import STORAGE_LATENCY
+
+    row_key = job["RowKey"]
+    hedge = job["hedge"] if job.get("hedges", 1) > 1 else None
+    ctx = AttemptContext(row_key, job["retry_count"], blob_service, job.get("capture_policy"), hedge=hedge)
+    if job.get("lease_owner"):
+        ctx.lease = _start_lease(job, ctx.logger)
+        if job.get("hedges", 1) > 1:
+            from .hedge import HedgeCoordinator
+            from .storage_clients import get_table_client
+            ctx.hedge = HedgeCoordinator(get_table_client(), row_key, job["lease_owner"],
+                                         job["hedge"], job["hedges"], ctx.logger)
+    try:
+        logging.info(f"Processing reservation {row_key}: {job['date']} {job['time']} with time slot range {job['time_slot_range']} for course {job['course']}"
+                     f"{' as hedge ' + str(job['hedge']) + '/' + str(job['hedges']) if ctx.hedge is not None else ''}")
+        open_website(job["date"], job["time"], job["time_slot_range"], job["course"], ctx)
+        outcome = {"RowKey": row_key, "succeeded": True, "actual_time": ctx.booked_time, "metrics": ctx.metrics()}
+    except Exception as e:
+        outcome = {"RowKey": row_key, "succeeded": False, "error": str(e), "metrics": ctx.metrics()}
+    finally:
+        if ctx.lease is not None:
+            ctx.lease.stop()
+    outcome["metrics"]["storage_latency"] = STORAGE_LATENCY.drain()
+    if ctx.hedge is not None:
+        outcome["hedge"] = ctx.hedge.result()
+    return outcome
+
+def _start_lease(job, logger):
+    """Start the heartbeat that keeps the caller's claim on the job's reservation alive."""
+    from .lease import ReservationLease
+    from .storage_clients import get_table_client
+
+    lease = ReservationLease(get_table_client(), job["PartitionKey"], job["RowKey"], job["lease_owner"],
+                             job.get("lease_seconds", 300), logger=logger)
+    lease.start()
+    return lease
+
+def dispatch_reservations(jobs, on_result):
+    """
+    Run every job in parallel on the browser worker pool and call
+    `on_result(job, outcome)` in the calling thread as each one finishes.
+    Each job holds a worker slot from acquire_worker_slots, released once its
+    result has been handled, so no job waits in the pool's queue.
+    """
+    if not jobs:
+        return
+
+    try:
+        executor = get_executor()
+        futures = {executor.submit(run_reservation_job, job): job for job in jobs}
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        executor = get_executor()
+        futures = {executor.submit(run_reservation_job, job): job for job in jobs}
+
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            outcome = future.result()
+        except BrokenProcessPool as e:
+            logging.error(f"Browser worker for reservation {job['RowKey']} died: {e}")
+            _reset_executor(executor)
+            outcome = {"RowKey": job["RowKey"], "succeeded": False, "error": f"Browser worker crashed: {e}"}
+        except Exception as e:
+            outcome = {"RowKey": job["RowKey"], "succeeded": False, "error": str(e)}
+        try:
+            on_result(job, outcome)
+        finally:
+            release_worker_slots()
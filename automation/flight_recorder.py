@@ -0,0 +1,51 @@
+import os
+import base64
+import logging
+from collections import deque
+from datetime import datetime
+
+CAPTURE_POLICIES = ("full", "flight_recorder")
+
+def get_default_capture_policy():
+    """Capture policy used when a reservation does not set one (CAPTURE_POLICY in .env)."""
+    policy = os.getenv("CAPTURE_POLICY", "full")
+    return policy if policy in CAPTURE_POLICIES else "full"
+
+class FlightRecorder:
+    """
+    Bounded in-memory ring buffer of screenshots for the unlock-critical window.
+
+    While active, frames are grabbed as low-quality JPEGs straight from the
+    DevTools protocol and kept base64-encoded in memory; nothing is decoded,
+    written or uploaded until `flush`, which runs once the booking is
+    confirmed or the attempt fails. Only the last `max_frames` frames are kept.
+    """
+    def __init__(self, max_frames=None, quality=None):
+        if max_frames is None:
+            max_frames = int(os.getenv("FLIGHT_RECORDER_FRAMES", "30"))
+        if quality is None:
+            quality = int(os.getenv("FLIGHT_RECORDER_JPEG_QUALITY", "40"))
+        self.quality = quality
+        self.frames = deque(maxlen=max_frames)
+        self.active = False
+        self.recorded = 0
+
+    def record(self, sb, name):
+        """Capture one frame into the ring buffer."""
+        result = sb.driver.execute_cdp_cmd("Page.captureScreenshot", {
+            "format": "jpeg",
+            "quality": self.quality,
+            "optimizeForSpeed": True
+        })
+        self.frames.append((name, datetime.now(), result["data"]))
+        self.recorded += 1
+
+    def flush(self, uploader):
+        """Queue every buffered frame for upload and empty the buffer."""
+        dropped = self.recorded - len(self.frames)
+        if dropped > 0:
+            logging.warning(f"Flight recorder overwrote {dropped} oldest frame(s)")
+        while self.frames:
+            name, captured_at, data = self.frames.popleft()
+            uploader.submit(base64.b64decode(data), name, extension="jpg", captured_at=captured_at)
+        self.recorded = 0
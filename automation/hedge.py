@@ -0,0 +1,89 @@
+import os
+import time
+import logging
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+# Partition of the "slot held" entities, one per claimed attempt round
+# (RowKey "<reservation RowKey>_<lease owner>"), kept as a record of who won
+HELD_PARTITION = "held"
+
+def get_default_hedges():
+    """Parallel attempts per reservation unless the reservation sets its own (HEDGES, default 1)."""
+    try:
+        return max(1, int(os.getenv("HEDGES", "1")))
+    except ValueError:
+        logging.warning("Invalid HEDGES, using 1")
+        return 1
+
+def get_max_hedges():
+    try:
+        return max(1, int(os.getenv("MAX_HEDGES", "3")))
+    except ValueError:
+        return 3
+
+class HedgeLost(Exception):
+    """Another hedge of the same reservation held a slot first; this one backs off."""
+    pass
+
+class HedgeCoordinator:
+    """
+    Arbitrates between hedged attempts racing the same reservation.
+
+    Every hedge of one claim shares the claim's lease owner. The first hedge to
+    get the "Yes, Continue" popup publishes the hold by creating the sibling
+    entity for that claim; the create is atomic, so exactly one hedge succeeds
+    and every other one gets ResourceExistsError, reads the winner's hold time
+    and raises HedgeLost before it fills or submits players. Hold times are on
+    the NTP-corrected clock so hedges on different hosts compare fairly.
+    """
+    def __init__(self, table_client, row_key, lease_owner, hedge, hedges, logger=None):
+        self.table = table_client
+        self.row_key = row_key
+        self.hedge = hedge
+        self.hedges = hedges
+        self.held_key = f"{row_key}_{lease_owner}"
+        self.logger = logger
+        self.won = None
+        self.winner = None
+        self.margin_ms = None
+
+    def claim_hold(self, slot_time, clock_offset_s=0.0):
+        """
+        Publish that this hedge holds `slot_time`. Returns when it won the race;
+        raises HedgeLost when another hedge held a slot first.
+        """
+        held_at = time.time() + clock_offset_s
+        try:
+            self.table.create_entity(entity={
+                "PartitionKey": HELD_PARTITION,
+                "RowKey": self.held_key,
+                "hedge": self.hedge,
+                "hedges": self.hedges,
+                "held_at": held_at,
+                "slot_time": slot_time or "",
+            })
+        except ResourceExistsError:
+            self.won = False
+            try:
+                held = self.table.get_entity(partition_key=HELD_PARTITION, row_key=self.held_key)
+                self.winner = held["hedge"]
+                self.margin_ms = (held_at - held["held_at"]) * 1000
+            except ResourceNotFoundError:
+                pass
+            self._log(f"Hedge {self.hedge}/{self.hedges} lost to hedge {self.winner} "
+                      f"by {self.margin_ms if self.margin_ms is not None else float('nan'):.0f} ms, backing off")
+            raise HedgeLost(f"Slot already held by hedge {self.winner}")
+        self.won = True
+        self.winner = self.hedge
+        self._log(f"Hedge {self.hedge}/{self.hedges} holds {slot_time}")
+
+    def result(self):
+        """This hedge's view of the race, reported in the attempt outcome."""
+        return {"hedge": self.hedge, "hedges": self.hedges, "won": self.won,
+                "winner": self.winner, "margin_ms": self.margin_ms}
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.log(message, event="hedge", **self.result())
+        else:
+            logging.info(message)
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import logging
+import argparse
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, parse_qsl
+import requests
+from requests.adapters import HTTPAdapter
+
+class EngineDeviation(Exception):
+    """Raised when a ForeTees response does not look like what the engine expects."""
+    pass
+
+class _SheetParser(HTMLParser):
+    """Collects tee time buttons inside rwdTr rows that show an openSlots4 slot count."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.slots = []
+        self._row_depth = None   # div depth at which the current rwdTr row started
+        self._depth = 0
+        self._row_open = False
+        self._row_buttons = []
+        self._button = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if tag == 'div':
+            self._depth += 1
+            if self._row_depth is None and 'rwdTr' in classes:
+                self._row_depth = self._depth
+                self._row_open = False
+                self._row_buttons = []
+            elif self._row_depth is not None and 'slotCount' in classes and 'openSlots4' in classes:
+                self._row_open = True
+        elif tag == 'a' and self._row_depth is not None and 'teetime_button' in classes:
+            self._button = {"attrs": attrs, "text": ""}
+
+    def handle_data(self, data):
+        if self._button is not None:
+            self._button["text"] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._button is not None:
+            self._button["time"] = self._button.pop("text").strip()
+            self._row_buttons.append(self._button)
+            self._button = None
+        elif tag == 'div':
+            if self._row_depth is not None and self._depth == self._row_depth:
+                if self._row_open:
+                    self.slots.extend(self._row_buttons)
+                self._row_depth = None
+            self._depth -= 1
+
+def parse_open_slots(html):
+    """Return [{"time": "7:30 AM", "attrs": {...}}, ...] for every open tee time button."""
+    parser = _SheetParser()
+    parser.feed(html)
+    return parser.slots
+
+class _HiddenInputParser(HTMLParser):
+    """Collects name -> value of the hidden inputs on a page (the slot page's form state)."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'input' and (attrs.get('type') or '').lower() == 'hidden' and attrs.get('name'):
+            self.fields[attrs['name']] = attrs.get('value') or ''
+
+def parse_hidden_inputs(html):
+    parser = _HiddenInputParser()
+    parser.feed(html)
+    return parser.fields
+
+class SlotExchange:
+    """
+    The request a real browser booking sent to open the slot page after
+    "Yes, Continue", recorded from a HAR export (see record_slot_exchange).
+
+    The engine never guesses the slot endpoint: it replays a tee time button
+    only as this request, to the recorded path under the ForeTees base URL,
+    with the recorded fields (including any the popup adds) overlaid by the
+    button's own. A button carrying fields the recording lacks is a deviation.
+
+    When the recording also pressed "Go Back" on the slot page, that request
+    is kept as `release` ({"method", "path", "fields"}) so a hold can be given
+    back without the browser.
+    """
+    def __init__(self, method, path, fields, release=None):
+        self.method = method.upper()
+        self.path = path
+        self.fields = dict(fields)
+        self.release = release
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["method"], data["path"], data["fields"], data.get("release"))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"method": self.method, "path": self.path, "fields": self.fields,
+                       "release": self.release}, f, indent=2)
+
+    def form_for(self, button_fields, time_text):
+        unknown = set(button_fields) - set(self.fields)
+        if unknown:
+            raise EngineDeviation(f"Tee time button {time_text} sends fields the recorded exchange lacks: {sorted(unknown)}")
+        form = dict(self.fields)
+        form.update(button_fields)
+        return form
+
+    def release_form(self, hold_form, slot_page_html):
+        """
+        The recorded Go Back fields for the slot held with `hold_form`: fields
+        the slot page's hidden inputs or the hold request carry take their
+        values from there, so the release names this hold, not the recorded one.
+        """
+        form = dict(self.release["fields"])
+        live = dict(hold_form)
+        live.update(parse_hidden_inputs(slot_page_html))
+        for name in form:
+            if name in live:
+                form[name] = live[name]
+        return form
+
+def _har_fields(request):
+    post = request.get("postData") or {}
+    if post.get("params"):
+        return {p["name"]: p.get("value", "") for p in post["params"]}
+    if post.get("text"):
+        return dict(parse_qsl(post["text"], keep_blank_values=True))
+    return {q["name"]: q.get("value", "") for q in request.get("queryString", [])}
+
+def _servlet(url):
+    return urlsplit(url).path.rsplit("/", 1)[-1]
+
+def record_slot_exchange(har_path):
+    """
+    Find the request that opened a slot page in a browser HAR export, as a
+    SlotExchange. A later request to the same servlet that led back to the
+    tee sheet (a redirect, or the sheet itself) is recorded as its release.
+    """
+    with open(har_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)["log"]["entries"]
+    for i, entry in enumerate(entries):
+        request, response = entry["request"], entry["response"]
+        if "slot_player_row_0" not in (response.get("content", {}).get("text") or ""):
+            continue
+        path = _servlet(request["url"])
+        release = None
+        for later in entries[i + 1:]:
+            later_response = later["response"]
+            back_to_sheet = (300 <= later_response.get("status", 200) < 400
+                             or "rwdTr" in (later_response.get("content", {}).get("text") or ""))
+            if _servlet(later["request"]["url"]) == path and back_to_sheet:
+                release = {"method": later["request"]["method"].upper(), "path": path,
+                           "fields": _har_fields(later["request"])}
+                break
+        return SlotExchange(request["method"], path, _har_fields(request), release)
+    raise ValueError(f"No request in {har_path} returned a slot page")
+
+def load_slot_exchange():
+    """The recorded exchange at HTTP_ENGINE_EXCHANGE, or None when it is unset or unreadable."""
+    path = os.getenv("HTTP_ENGINE_EXCHANGE")
+    if not path:
+        return None
+    try:
+        return SlotExchange.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Could not load recorded slot exchange {path}: {e}")
+        return None
+
+class DirectHttpEngine:
+    """
+    Keep-alive HTTP client that reuses the browser's authenticated ForeTees session.
+
+    Cookies and user agent are exported from the SeleniumBase driver once the
+    browser is parked on the tee sheet; the connection is then kept warm so the
+    sheet fetch and slot-hold requests at the unlock skip DNS/TCP/TLS setup.
+    Any unexpected response raises EngineDeviation so the caller can fall back
+    to the browser flow. URLs are resolved against `base_url` (the club's
+    ForeTees servlet directory, by default that of the sheet URL), and slots
+    are only held with a recorded SlotExchange.
+    """
+    def __init__(self, sheet_url, cookies, user_agent, timeout=None, base_url=None, exchange=None):
+        self.sheet_url = sheet_url
+        self.base_url = base_url or urljoin(sheet_url, ".")
+        self.exchange = exchange
+        self.timeout = timeout or float(os.getenv("HTTP_ENGINE_TIMEOUT", "3"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": user_agent, "Referer": sheet_url})
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"],
+                                     domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        self.latencies_ms = []
+        self.held = None   # (hold form, slot page HTML) of the slot last held
+
+    @classmethod
+    def from_browser(cls, sb, base_url=None):
+        """Build an engine from the browser tab currently parked on Member_sheet."""
+        return cls(sb.get_current_url(), sb.driver.get_cookies(), sb.execute_script("return navigator.userAgent;"),
+                   base_url=base_url, exchange=load_slot_exchange())
+
+    def _request(self, method, url, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        response = self.session.request(method, url, timeout=self.timeout, allow_redirects=False, **kwargs)
+        self.latencies_ms.append(round((time.perf_counter() - start) * 1000, 1))
+        if response.status_code not in expect:
+            raise EngineDeviation(f"{method} {url} returned HTTP {response.status_code}")
+        if "servlet/Login" in response.text[:2000]:
+            raise EngineDeviation("ForeTees session is no longer authenticated")
+        return response
+
+    def warm(self):
+        """Open (or keep open) the keep-alive connection to ForeTees."""
+        self._request("HEAD", self.sheet_url)
+
+    def fetch_open_slots(self):
+        """Fetch the tee sheet and return its open slots."""
+        response = self._request("GET", self.sheet_url)
+        if "rwdTr" not in response.text:
+            raise EngineDeviation("Tee sheet response has no rwdTr rows")
+        return parse_open_slots(response.text)
+
+    def hold_slot(self, slot):
+        """
+        Replay the recorded slot exchange for an open tee time, as the browser
+        does after its button and "Yes, Continue". Returns the slot page HTML.
+        """
+        if self.exchange is None:
+            raise EngineDeviation("No recorded slot exchange (HTTP_ENGINE_EXCHANGE) to hold slots with")
+        attrs = slot["attrs"]
+        if attrs.get("data-ftjson"):
+            try:
+                fields = json.loads(attrs["data-ftjson"])
+            except ValueError:
+                raise EngineDeviation(f"Unreadable data-ftjson on {slot['time']}")
+        elif attrs.get("href") and not attrs["href"].startswith(("#", "javascript:")):
+            href = urlsplit(urljoin(self.sheet_url, attrs["href"]))
+            if href.path.rsplit("/", 1)[-1] != self.exchange.path:
+                raise EngineDeviation(f"Tee time button {slot['time']} targets {href.path}, not {self.exchange.path}")
+            fields = dict(parse_qsl(href.query, keep_blank_values=True))
+        else:
+            raise EngineDeviation(f"No request target on tee time button {slot['time']}")
+        form = self.exchange.form_for(fields, slot["time"])
+        response = self._send(self.exchange.method, self.exchange.path, form)
+        if "slot_player_row_0" not in response.text:
+            raise EngineDeviation(f"Slot page for {slot['time']} has no player rows")
+        self.held = (form, response.text)
+        return response.text
+
+    def release_slot(self):
+        """
+        Give back the slot last held, replaying the recorded Go Back request.
+        Raises EngineDeviation when nothing is held or no release was recorded.
+        """
+        if self.held is None:
+            raise EngineDeviation("No slot is held")
+        if self.exchange.release is None:
+            raise EngineDeviation("The recorded exchange has no Go Back request to release slots with")
+        release = self.exchange.release
+        self._send(release["method"], release["path"], self.exchange.release_form(*self.held),
+                   expect=(200, 302, 303))
+        self.held = None
+
+    def _send(self, method, path, form, expect=(200,)):
+        url = urljoin(self.base_url, path)
+        if method == "POST":
+            return self._request("POST", url, expect=expect, data=form)
+        return self._request(method, url, expect=expect, params=form)
+
+    def hand_back_to_browser(self, sb, html):
+        """Render a held slot page in the browser tab and sync any rotated cookies back."""
+        host = urlsplit(self.base_url).hostname or ""
+        for cookie in self.session.cookies:
+            if cookie.domain and host.endswith(cookie.domain.lstrip(".")):
+                try:
+                    sb.driver.add_cookie({"name": cookie.name, "value": cookie.value,
+                                          "domain": cookie.domain, "path": cookie.path or "/"})
+                except Exception as e:
+                    logging.warning(f"Could not sync cookie {cookie.name} to browser: {e}")
+        sb.execute_script("document.open(); document.write(arguments[0]); document.close();", html)
+        sb.wait_for_element("#slot_player_row_0", timeout=5)
+
+    def close(self):
+        self.session.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record the slot request of a browser booking for the direct-HTTP engine")
+    parser.add_argument("har", help="HAR export of a booking, saved with content; press Go Back on a slot page "
+                                    "first to also record the release")
+    parser.add_argument("output", help="where to write the exchange (point HTTP_ENGINE_EXCHANGE at it)")
+    args = parser.parse_args()
+
+    exchange = record_slot_exchange(args.har)
+    exchange.save(args.output)
+    print(f"Recorded {exchange.method} {exchange.path} with fields {sorted(exchange.fields)}")
+    if exchange.release is None:
+        print("No Go Back request found: held slots can only be released from the browser")
+    else:
+        print(f"Recorded release {exchange.release['method']} {exchange.release['path']} "
+              f"with fields {sorted(exchange.release['fields'])}")
@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+import pytz
+from azure.core import MatchConditions
+from azure.data.tables import UpdateMode
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+def get_lease_heartbeat_seconds():
+    """How often a running attempt renews its reservation lease (LEASE_HEARTBEAT_SECONDS)."""
+    try:
+        return max(1.0, float(os.getenv("LEASE_HEARTBEAT_SECONDS", "60")))
+    except ValueError:
+        logging.warning("Invalid LEASE_HEARTBEAT_SECONDS, using 60")
+        return 60.0
+
+class LeaseLost(Exception):
+    """The reservation was claimed by another instance, or the lease could not be renewed in time."""
+    pass
+
+class ReservationLease:
+    """
+    Keeps an attempt's claim on its reservation alive from the worker process.
+
+    The claim itself is made by the dispatching instance with an ETag-conditional
+    update that sets status "locked", `lease_owner` and `locked_until`. A
+    heartbeat thread then re-reads the entity every `interval` seconds and, if
+    this lease still owns it, pushes `locked_until` out by `duration` seconds
+    with the same If-Match condition. The lease counts as lost when another
+    owner or status shows up, or when renewals keep failing until the last
+    confirmed `locked_until` is less than one interval away; the flow notices
+    through `check()` (AttemptContext.check_lease) and aborts.
+    """
+    def __init__(self, table_client, partition_key, row_key, owner, duration, interval=None, logger=None):
+        self.table = table_client
+        self.partition_key = partition_key
+        self.row_key = row_key
+        self.owner = owner
+        self.duration = duration
+        self.interval = get_lease_heartbeat_seconds() if interval is None else interval
+        self.logger = logger
+        self.expires = time.time() + duration  # last confirmed locked_until (epoch seconds)
+        self.renewals = 0
+        self.lost_reason = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def lost(self):
+        return self.lost_reason is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.row_key}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def check(self):
+        """Raise LeaseLost if the lease is gone."""
+        if self.lost_reason is not None:
+            raise LeaseLost(f"Lease on {self.row_key} lost: {self.lost_reason}")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.renew()
+            except Exception as e:
+                self._log(f"Lease renewal for {self.row_key} failed: {e}")
+                if time.time() > self.expires - self.interval:
+                    self._lose(f"renewals failing and lock expires in {self.expires - time.time():.0f} s")
+            if self.lost:
+                return
+
+    def renew(self):
+        """Extend locked_until if this lease still owns the reservation. Returns True on success."""
+        for _ in range(3):
+            try:
+                entity = self.table.get_entity(partition_key=self.partition_key, row_key=self.row_key)
+            except ResourceNotFoundError:
+                self._lose("reservation was deleted")
+                return False
+            if entity.get("lease_owner") != self.owner or entity.get("status") != "locked":
+                self._lose(f"now {entity.get('status')} under lease {entity.get('lease_owner')}")
+                return False
+            locked_until = datetime.now(pytz.utc) + timedelta(seconds=self.duration)
+            try:
+                self.table.update_entity(
+                    entity={"PartitionKey": self.partition_key, "RowKey": self.row_key, "locked_until": locked_until},
+                    mode=UpdateMode.MERGE,
+                    etag=entity.metadata["etag"], match_condition=MatchConditions.IfNotModified,
+                )
+            except ResourceModifiedError:
+                continue  # written between our read and update: re-check ownership
+            self.expires = locked_until.timestamp()
+            self.renewals += 1
+            return True
+        raise Exception("reservation kept changing under the heartbeat")
+
+    def _lose(self, reason):
+        self.lost_reason = reason
+        self._log(f"Lease on {self.row_key} lost: {reason}")
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.log(message, event="lease", owner=self.owner, renewals=self.renewals)
+        else:
+            logging.warning(message)
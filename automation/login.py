@@ -1,4 +1,3 @@
-from seleniumbase import SB
 import os
 from dotenv import load_dotenv
 import time
@@ -7,59 +6,43 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import sys
-from datetime import datetime
+from urllib.parse import urljoin
+from datetime import datetime, timedelta
 import logging
 from .blob_storage import BlobStorageService
-import random
 import pytz
-import ntplib
-from .attempt_logger import AttemptLogger
+from .attempt_context import AttemptContext
+from .timing import wait_until_instant, get_fire_offset_ms
+from .clock_offset import get_clock_offset_service
+from .server_clock import get_max_server_clock_uncertainty_s
+from .http_engine import DirectHttpEngine, EngineDeviation
+from .hedge import HedgeLost
+from .browser_profile import get_browser_options, apply_network_blocking, log_page_load
+from .session_store import SessionStore, is_session_reuse_enabled
+from .browser_pool import browser_session
 
 # Load environment variables
 load_dotenv()
 
-# Initialize blob storage service
+# Initialize blob storage service (stateless, shared by all attempts in this process)
 blob_service = BlobStorageService()
 
-# Initialize screenshot counter
-_screenshot_counter = 0
-
-def take_screenshot(sb, method_name):
-    """Helper function to take and save screenshots with sequential numbering"""
-    global _screenshot_counter
-    _screenshot_counter += 1
+def take_screenshot(sb, ctx, method_name):
+    """
+    Capture a screenshot in memory and queue it for background upload, with
+    sequential numbering per attempt. Never waits on blob storage. Inside a
+    flight-recorder critical window the frame is only buffered in memory.
+    """
+    number = ctx.next_screenshot_number()
     
     try:
-        # Create screenshots directory if it doesn't exist
-        screenshots_dir = os.path.join(os.path.dirname(__file__), 'screenshots', 'temp')
-        os.makedirs(screenshots_dir, exist_ok=True)
-        
-        # Generate timestamp and filename with counter
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{_screenshot_counter:03d}_{method_name}_{timestamp}.png"
-        filepath = os.path.join(screenshots_dir, filename)
-        
-        # Take and save screenshot
-        sb.save_screenshot(filepath)
-        logging.info(f"Screenshot saved temporarily: {filepath}")
-
-        # Upload to Blob Storage
-        try:
-            blob_service.upload_screenshot(filepath, f"{_screenshot_counter:03d}_{method_name}")
-            # Remove local file after successful upload
-            os.remove(filepath)
-            logging.info(f"Local file removed: {filepath}")
-        except ValueError as e:
-            logging.error(f"Failed to upload screenshot - no active reservation context: {str(e)}")
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as e:
-            logging.error(f"Failed to upload screenshot: {str(e)}")
-            if os.path.exists(filepath):
-                os.remove(filepath)
-
+        if ctx.is_recording():
+            ctx.recorder.record(sb, f"{number:03d}_{method_name}")
+            return
+        image_bytes = sb.driver.get_screenshot_as_png()
+        ctx.uploader.submit(image_bytes, f"{number:03d}_{method_name}")
     except Exception as e:
-        logging.error(f"Failed to save or upload screenshot: {str(e)}")
+        logging.error(f"Failed to capture screenshot: {str(e)}")
 
 # Use credentials from .env
 LOGIN_CREDENTIALS = {
@@ -67,6 +50,15 @@ LOGIN_CREDENTIALS = {
     "password": os.getenv("CLUB_PASSWORD")
 }
 
+# The club's ForeTees servlet directory; every ForeTees URL is resolved against it
+FORETEES_BASE_URL = os.getenv("FORETEES_BASE_URL", "https://web.foretees.com/v5/capitalcityclub_golf_m56/")
+FORETEES_MEMBER_SELECT_URL = urljoin(FORETEES_BASE_URL, "Member_select")
+FORETEES_SHEET_URL = urljoin(FORETEES_BASE_URL, "Member_sheet")
+
+# "Go Back" on the slot page leaves it without booking and frees the held tee time
+SLOT_GO_BACK_XPATH = ("//*[self::a or self::button or self::input]"
+                      "[contains(@class, 'go_back') or normalize-space(.)='Go Back' or @value='Go Back']")
+
 def manage_tabs(sb):
     """Close any extra tabs and switch to the main tab"""
     try:
@@ -81,52 +73,55 @@ def manage_tabs(sb):
     except Exception as e:
         print(f"Error managing tabs: {str(e)}")
 
-def click_member_login(sb, max_attempts=3):
+def click_member_login(sb, ctx, max_attempts=3):
     """Try to find and click the Member Login link"""
     
-    # wait for the DOM to render, then a human‐like pause:
-    time.sleep(random.uniform(1.2, 2.5))
-
     selector = ".member-login-large"
+
+    # wait for the DOM to render, then a human‐like pause:
+    ctx.wait.element(sb, selector, timeout=10)
+    ctx.wait.pause("settle")
     
     for attempt in range(max_attempts):
         manage_tabs(sb)  # Ensure we're on the right tab        
         
         try:
             # Wait for element to be present and visible
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, selector, timeout=5)
+            ctx.wait.pause()
             if sb.is_element_present(selector):
                 print(f"Found login element with selector: {selector}")
-                take_screenshot(sb, "found_login_element")
+                take_screenshot(sb, ctx, "found_login_element")
                 # Try different click methods
                 try:
                     sb.click(selector)
-                    take_screenshot(sb, "after_login_click")
+                    take_screenshot(sb, ctx, "after_login_click")
                 except:
                     continue
                 
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
                 return True
         except Exception as e:
             print(f"Failed to click {selector}: {str(e)}")
-            take_screenshot(sb, "click_member_login")
+            take_screenshot(sb, ctx, "click_member_login")
             continue
     
     if attempt < max_attempts - 1:
         print(f"Click attempt {attempt + 1} failed, refreshing page...")
         sb.refresh()
-        time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+        ctx.wait.pause("retry")
     
     return False
 
-def handle_login(sb, max_attempts=3):
+def handle_login(sb, ctx, max_attempts=3):
     """Handle the login process by entering credentials and clicking sign in"""
     for attempt in range(max_attempts):
         try:
             print("Attempting to log in...")
             
-            # wait for the DOM to render, then a human‐like pause:
-            time.sleep(random.uniform(1.2, 2.5))
+            # wait for the login page to render, then a human‐like pause:
+            ctx.wait.url(sb, '/login', timeout=10)
+            ctx.wait.pause("settle")
             
             # Verify we're on the login page
             current_url = sb.get_current_url()
@@ -134,68 +129,72 @@ def handle_login(sb, max_attempts=3):
             
             if '/login' not in current_url:
                 print("Failed to reach login page")
-                take_screenshot(sb, "handle_login")
+                take_screenshot(sb, ctx, "handle_login")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
             # Wait for username field and enter credentials
             username_selector = "#_58_login"
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, username_selector, timeout=5)
+            ctx.wait.pause()
             if sb.is_element_present(username_selector):
                 sb.type(username_selector, LOGIN_CREDENTIALS["username"])
-                take_screenshot(sb, "after_username_entered")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                take_screenshot(sb, ctx, "after_username_entered")
+                ctx.wait.pause()
             
             # Wait for password field and enter credentials
             password_selector = "#_58_password"
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, password_selector, timeout=5)
+            ctx.wait.pause()
             if sb.is_element_present(password_selector):
                 sb.type(password_selector, LOGIN_CREDENTIALS["password"])
-                take_screenshot(sb, "after_password_entered")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                take_screenshot(sb, ctx, "after_password_entered")
+                ctx.wait.pause()
             
             # Click the sign in button
             sign_in_selector = "button.btn-sign-in"
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, sign_in_selector, timeout=5)
+            ctx.wait.pause()
             if sb.is_element_present(sign_in_selector):
                 sb.click(sign_in_selector)
-                take_screenshot(sb, "after_sign_in_click")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                take_screenshot(sb, ctx, "after_sign_in_click")
+                ctx.wait.pause()
             
-            # Wait for the login process
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            # Wait for the login process to leave the login page
+            ctx.wait.until(lambda: '/login' not in sb.get_current_url(), timeout=10, kind="url")
             
             # Verify we're logged in (URL should change)
             current_url = sb.get_current_url()
             if '/login' not in current_url:
                 print("Successfully logged in!")
-                take_screenshot(sb, "login_successful")
+                take_screenshot(sb, ctx, "login_successful")
                 return True
                 
             if attempt < max_attempts - 1:
                 print(f"Login attempt {attempt + 1} failed. Retrying...")
                 sb.refresh()
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 
         except Exception as e:
             print(f"Login attempt {attempt + 1} failed with error: {str(e)}")
-            take_screenshot(sb, "handle_login")
+            take_screenshot(sb, ctx, "handle_login")
             if attempt < max_attempts - 1:
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 
     return False
 
-def click_fore_tees(sb, max_attempts=3):
+def click_fore_tees(sb, ctx, max_attempts=3):
     """Click the Fore Tees link and handle the new tab"""
     fore_tees_link = "a[href*='fore-tees']"
     
     for attempt in range(max_attempts):
         try:
             print("Waiting for home page to load...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.url(sb, "group/pages/home", timeout=10)
+            ctx.wait.pause()
             
             # Verify we're on the correct page
             current_url = sb.get_current_url()
@@ -203,12 +202,12 @@ def click_fore_tees(sb, max_attempts=3):
                 print(f"Unexpected URL: {current_url}")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
             print("Attempting to click Fore Tees link...")
-            take_screenshot(sb, "found_fore_tees_link")
+            take_screenshot(sb, ctx, "found_fore_tees_link")
             
             # Store the current window handle
             main_window = sb.driver.current_window_handle
@@ -217,55 +216,46 @@ def click_fore_tees(sb, max_attempts=3):
             # Try to click using JavaScript
             try:
                 sb.js_click(fore_tees_link)
-                take_screenshot(sb, "after_fore_tees_click")      
+                take_screenshot(sb, ctx, "after_fore_tees_click")      
             except Exception as e:
                 print(f"JavaScript click failed: {str(e)}")
-                take_screenshot(sb, "click_fore_tees")
+                take_screenshot(sb, ctx, "click_fore_tees")
                 if attempt < max_attempts - 1:
                     continue
                 return False
             
             # Wait for new tab
             print("Waiting for new tab to open...")
-            start_time = time.time()
-            while time.time() - start_time < 10:
-                current_handles = set(sb.driver.window_handles)
-                new_handles = current_handles - initial_handles
-                if new_handles:
-                    # Switch to the new tab
-                    new_tab = list(new_handles)[0]
-                    sb.driver.switch_to.window(new_tab)
-                    take_screenshot(sb, "new_tab_opened")
-                    print("Successfully switched to Fore Tees tab")
-                    
-                    # Wait for ForeTees login page to load
-                    start_time_inner = time.time()
-                    while time.time() - start_time_inner < 10:
-                        current_url = sb.get_current_url()
-                        if "foretees.com/v5/servlet/Login" in current_url:
-                            print(f"Confirmed ForeTees login page loaded: {current_url}")
-                            take_screenshot(sb, "foretees_page_loaded")
-                            return True
-                        time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
-                    
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            new_handles = ctx.wait.until(lambda: set(sb.driver.window_handles) - initial_handles, timeout=10)
+            if new_handles:
+                # Switch to the new tab
+                new_tab = list(new_handles)[0]
+                sb.driver.switch_to.window(new_tab)
+                take_screenshot(sb, ctx, "new_tab_opened")
+                print("Successfully switched to Fore Tees tab")
+                
+                # Wait for ForeTees login page to load
+                if ctx.wait.url(sb, "foretees.com/v5/servlet/Login", timeout=10):
+                    print(f"Confirmed ForeTees login page loaded: {sb.get_current_url()}")
+                    take_screenshot(sb, ctx, "foretees_page_loaded")
+                    return True
             
             print("New tab not detected")
             if attempt < max_attempts - 1:
                 print("Retrying...")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             
         except Exception as e:
             print(f"Error clicking Fore Tees link: {str(e)}")
-            take_screenshot(sb, "click_fore_tees")
+            take_screenshot(sb, ctx, "click_fore_tees")
             if attempt < max_attempts - 1:
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             
     return False
 
-def handle_foretees_navigation(sb, max_attempts=3):
+def handle_foretees_navigation(sb, ctx, max_attempts=3):
     """Handle ForeTees login and navigation"""
     try:
         # Make sure we're in the ForeTees tab
@@ -278,61 +268,58 @@ def handle_foretees_navigation(sb, max_attempts=3):
                 break
         else:
             print("Could not find ForeTees tab")
-            take_screenshot(sb, "handle_foretees_navigation")
+            take_screenshot(sb, ctx, "handle_foretees_navigation")
             return False
 
         # Wait for Alex Western button
         print("Waiting for Alex Western button...")
         alex_button = "a.standard_button[alt='Alex Western']"
-        time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+        ctx.wait.element(sb, alex_button, timeout=10)
+        ctx.wait.pause()
         if sb.is_element_present(alex_button):
             # Store current tab handle to maintain focus
             foretees_handle = sb.driver.current_window_handle
-            take_screenshot(sb, "before_clicking_Alex_Western_button")
+            take_screenshot(sb, ctx, "before_clicking_Alex_Western_button")
             # Click Alex Western button
             print("Clicking Alex Western button...")
             sb.click(alex_button)
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             # Make sure we stay in the ForeTees tab
             sb.driver.switch_to.window(foretees_handle)
             
             # Wait for URL to change to Member_msg or Member_announce
             print("Waiting for page transition after clicking Alex Western...")
-            start_time = time.time()
-            while time.time() - start_time < 15:  # 15 second timeout
-                current_url = sb.get_current_url()
-                print(f"Current URL: {current_url}")  # Debug logging
-                if "Member_msg" in current_url or "Member_announce" in current_url:
-                    print(f"Successfully reached page: {current_url}")
-                    take_screenshot(sb, "after_clicking_Alex_Western_button")
-                    break
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            reached = ctx.wait.url(sb, "Member_msg", "Member_announce", timeout=15)  # 15 second timeout
+            current_url = sb.get_current_url()
+            if reached:
+                print(f"Successfully reached page: {current_url}")
+                take_screenshot(sb, ctx, "after_clicking_Alex_Western_button")
             else:
                 print(f"Timeout waiting for Member page. Current URL: {current_url}")
                 return False
                 
             # Give the page time to fully load
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause("settle")
             
-            take_screenshot(sb, "waiting_for_continue_button")
+            take_screenshot(sb, ctx, "waiting_for_continue_button")
             print("Hover over the parent element using SeleniumBase's hover")
             parent_selector = "a[href='#'] span.topnav_item:contains('Tee Times')"
             sb.hover(parent_selector)  # Built-in hover method
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             
             print("Wait for dropdown to become visible")
             dropdown_xpath = "//a[@href='Member_select']/span[contains(., 'Make, Change, or View Tee Times')]"
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, dropdown_xpath, timeout=5)
             if sb.is_element_present(dropdown_xpath):
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
                 
                 print("Clicking Make, Change, or View Tee Times...")   
                 
-                take_screenshot(sb, "before_clicking_Make_Change_or_View_Tee_Times")     
+                take_screenshot(sb, ctx, "before_clicking_Make_Change_or_View_Tee_Times")     
                 sb.click_xpath(dropdown_xpath)
-                take_screenshot(sb, "after_clicking_Make_Change_or_View_Tee_Times")
+                take_screenshot(sb, ctx, "after_clicking_Make_Change_or_View_Tee_Times")
                 # Wait for navigation to complete
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
                 
                 return True
             else:
@@ -341,10 +328,10 @@ def handle_foretees_navigation(sb, max_attempts=3):
        
     except Exception as e:
         print(f"Error in ForeTees navigation: {str(e)}")
-        take_screenshot(sb, "handle_foretees_navigation")
+        take_screenshot(sb, ctx, "handle_foretees_navigation")
         return False
 
-def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
+def navigate_to_tee_sheet(sb, ctx, reservation_date, course, max_attempts=3):
     """
     Navigates directly to the tee sheet for a specific date and course.
     Ensures the ForeTees tab is active and verifies the starting URL.
@@ -358,8 +345,8 @@ def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
         bool: True if navigation was successful, False otherwise.
     """
     logging.info(f"Attempting to navigate to tee sheet for date: {reservation_date}, course: {course}")
-    member_select_url = "https://web.foretees.com/v5/capitalcityclub_golf_m56/Member_select"
-    base_sheet_url = "https://web.foretees.com/v5/capitalcityclub_golf_m56/Member_sheet"
+    member_select_url = FORETEES_MEMBER_SELECT_URL
+    base_sheet_url = FORETEES_SHEET_URL
 
     for attempt in range(max_attempts):
         logging.info(f"Navigate_to_tee_sheet attempt {attempt + 1}/{max_attempts}")
@@ -394,22 +381,22 @@ def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
 
             if not foretees_tab_found:
                 logging.error("Failed to find or switch to a ForeTees tab.")
-                take_screenshot(sb, "navigate_tee_sheet_no_ft_tab")
+                take_screenshot(sb, ctx, "navigate_tee_sheet_no_ft_tab")
                 if attempt < max_attempts - 1:
                     logging.info("Retrying to find ForeTees tab...")
-                    time.sleep(random.uniform(1.0, 2.0))
+                    ctx.wait.pause("retry")
                     if sb.driver: sb.refresh() # Refresh current page before retrying tab search
                     continue
                 return False
 
-            time.sleep(random.uniform(0.5, 1.0)) # Brief pause after ensuring tab
+            ctx.wait.pause() # Brief pause after ensuring tab
             current_url_on_ft_tab = sb.get_current_url()
             logging.info(f"Confirmed on ForeTees tab. Current URL: {current_url_on_ft_tab}")
 
             # 2. Check if on member_select_url (optional, as we navigate directly anyway)
             if member_select_url not in current_url_on_ft_tab:
                 logging.warning(f"Not on the expected '{member_select_url}'. Current URL: {current_url_on_ft_tab}. Proceeding with direct navigation to tee sheet.")
-                take_screenshot(sb, "navigate_tee_sheet_not_on_announce")
+                take_screenshot(sb, ctx, "navigate_tee_sheet_not_on_announce")
 
             # 3. Parse reservation_date and construct URL
             logging.info(f"Parsing reservation date: {reservation_date}")
@@ -441,8 +428,9 @@ def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
             # 4. Open the target URL
             logging.info(f"Opening target tee sheet URL...")
             sb.open(target_url)
-            # Increased wait time for the page to fully load and any JS to execute
-            time.sleep(random.uniform(3.0, 5.0)) 
+            # Wait for the sheet rows to render, then let any JS settle
+            ctx.wait.element(sb, "div.rwdTr", timeout=15)
+            ctx.wait.pause("settle")
 
             # 5. Verify navigation
             final_url = sb.get_current_url()
@@ -453,11 +441,11 @@ def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
             
             if "Member_sheet" in final_url and expected_date_param_for_verification in final_url and course in final_url:
                 logging.info(f"Successfully navigated to the correct tee sheet. URL: {final_url}")
-                take_screenshot(sb, "navigate_tee_sheet_success")
+                take_screenshot(sb, ctx, "navigate_tee_sheet_success")
                 return True
             else:
                 logging.error(f"Failed to verify navigation to target tee sheet. Final URL: {final_url}. Expected date parameter containing '{expected_date_param_for_verification}' and course '{course}'. Note: sb.open() was called with URL-encoded date.")
-                take_screenshot(sb, "navigate_tee_sheet_nav_fail")
+                take_screenshot(sb, ctx, "navigate_tee_sheet_nav_fail")
                 if attempt < max_attempts - 1:
                     logging.info("Retrying tee sheet navigation...")
                     # As a precaution, could navigate to member_select_url first if retrying complex nav
@@ -468,13 +456,13 @@ def navigate_to_tee_sheet(sb, reservation_date, course, max_attempts=3):
 
         except Exception as e:
             logging.error(f"Exception during navigate_to_tee_sheet (attempt {attempt + 1}/{max_attempts}): {str(e)}", exc_info=True)
-            take_screenshot(sb, "navigate_tee_sheet_exception")
+            take_screenshot(sb, ctx, "navigate_tee_sheet_exception")
             if sb.driver and attempt < max_attempts - 1:
                 try:
                     current_url_on_error = sb.get_current_url()
                     logging.info(f"Refreshing page ({current_url_on_error}) before retry...")
                     sb.refresh()
-                    time.sleep(random.uniform(1.5, 2.5))
+                    ctx.wait.pause("settle")
                 except Exception as e_refresh:
                     logging.error(f"Failed to refresh browser during exception handling: {e_refresh}")
             if attempt == max_attempts - 1:
@@ -496,87 +484,57 @@ def time_to_minutes(time_str):
     except ValueError:
         return None
 
-def wait_until_refresh_time(target_time_est):
-    """Wait until target EST time, checking up to 4×/sec."""
-    tz = pytz.timezone('America/New_York')
-    while True:
-        now = datetime.now(tz)
-        if now >= target_time_est:
-            return
-        delta = (target_time_est - now).total_seconds()
-        time.sleep(min(delta, 0.25))
+def wait_until_refresh_time(target_time_est, offset_ms=0.0, clock_offset_s=0.0):
+    """
+    Wait until target EST time (plus offset_ms) using the monotonic sleep/spin waiter,
+    corrected by the estimated clock offset.
+    Returns the measured firing error (see timing.wait_until_instant).
+    """
+    return wait_until_instant(target_time_est, offset_ms, clock_offset_s=clock_offset_s)
 
-def handle_tee_time_popup(sb, logger, max_wait=2):
+def handle_tee_time_popup(sb, ctx, max_wait=2, candidate=None):
     """
-    Poll every 50 ms for either popup button, click it via the exact
-    absolute XPath, and return (True, 'continue') or (True, 'go_back').
+    Wait in-page for either popup button, found by its text ("Yes, Continue"
+    or "Go Back") in the visible dialog, click it, and return (True, 'continue')
+    or (True, 'go_back').
+    With `candidate`, first clicks that index of the ranked slots (see
+    __tt.rankSlots) in the same round trip; (False, 'missing') means the
+    slot element is gone. Returns (False, 'error') on timeout.
     """
+    logger = ctx.logger
     logger.log("START: handle_tee_time_popup")
 
-    # Debug‐log whether our XPaths actually match anything
-    yes_seen = sb.execute_script("""
-        return Boolean(
-          document.evaluate(
-            "/html/body/div[5]/div[4]/div/button[2]",
-            document, null,
-            XPathResult.BOOLEAN_TYPE,
-            null
-          ).booleanValue
-        );
-    """)
-    back_seen = sb.execute_script("""
-        return Boolean(
-          document.evaluate(
-            "/html/body/div[5]/div[4]/div/button",
-            document, null,
-            XPathResult.BOOLEAN_TYPE,
-            null
-          ).booleanValue
-        );
-    """)
-    logger.log(f"DEBUG popup-init – YesContinue seen? {yes_seen}  GoBack seen? {back_seen}")
-
-    deadline = time.time() + max_wait
-    while time.time() < deadline:
-        result = sb.execute_script("""
-            // 1) Try your exact XPath for “Yes, Continue”
-            var yes = document.evaluate(
-              "/html/body/div[5]/div[4]/div/button[2]",
-              document, null,
-              XPathResult.FIRST_ORDERED_NODE_TYPE,
-              null
-            ).singleNodeValue;
-            if (yes) { yes.click(); return 'continue'; }
-
-            // 2) Then try your XPath for “Go Back”
-            var back = document.evaluate(
-              "/html/body/div[5]/div[4]/div/button",
-              document, null,
-              XPathResult.FIRST_ORDERED_NODE_TYPE,
-              null
-            ).singleNodeValue;
-            if (back) { back.click(); return 'go_back'; }
-
-            return null;
-        """)
-        if result in ('continue', 'go_back'):
-            logger.log(f"Popup handled with status: {result}")
-            logger.log("END: handle_tee_time_popup")
-            return True, result
-
-        time.sleep(0.05)
+    try:
+        result = ctx.page_lib.call(sb, "awaitPopup", int(max_wait * 1000), candidate,
+                                   async_script=True, timeout=max_wait + 5)
+    except Exception as e:
+        logger.log(f"Popup wait script failed: {e}")
+        logger.log("END: handle_tee_time_popup")
+        return False, 'error'
 
-    logger.log("Popup handling timed out")
+    status = result["status"]
+    logger.log(f"Popup wait finished with {status} after {result['elapsed_ms']} ms in page",
+               event="popup", status=status, elapsed_ms=result["elapsed_ms"])
     logger.log("END: handle_tee_time_popup")
+    if status == 'continue':
+        ctx.page_lib.invalidate()  # continuing navigates to the slot page
+    if status in ('continue', 'go_back'):
+        return True, status
+    if status == 'missing':
+        return False, 'missing'
+    logger.log("Popup handling timed out")
     return False, 'error'
 
-def select_tee_time(sb, desired_time, time_slot_range, refresh_time_est, logger):
+def select_tee_time(sb, ctx, desired_time, time_slot_range, refresh_time_est, fire_offset_ms=0.0):
     """
-    1) Wait until refresh_time_est
-    2) JS-reload + wait for rows
-    3) Try exact-time click
-    4) Fallback to range-based loop
+    1) Wait until refresh_time_est (+ fire_offset_ms; negative fires early)
+    2) Refresh the sheet: JS-reload + wait for rows, or in "fetch" mode
+       (SHEET_REFRESH_MODE=fetch) poll the sheet HTML in-page and swap the rows
+       in as soon as open slots appear, falling back to a reload
+    3) Extract and rank open slots in one pass (exact time first, then by
+       distance within range) and click them in order until one is held
     """
+    logger = ctx.logger
     logger.log(f"START: select_tee_time for {desired_time} (+{time_slot_range})")
     target_min = time_to_minutes(desired_time)
     if target_min is None:
@@ -591,109 +549,246 @@ def select_tee_time(sb, desired_time, time_slot_range, refresh_time_est, logger)
         "//a[contains(@class, 'teetime_button')]"
     )
     
-    # exact match by text
-    exact_xpath = f"{fast_xpath}[normalize-space(text())='{desired_time}']"
-
-    # fallback range-based uses the same fast_xpath
-    range_xpath = fast_xpath
+    refresh_mode = get_sheet_refresh_mode()
+    if refresh_mode == "fetch":
+        # Start polling slightly before the unlock so the first open sheet is caught
+        fire_offset_ms -= float(os.getenv("FETCH_POLL_LEAD_MS", "300"))
+    elif refresh_mode == "http":
+        if ctx.http_engine is None:
+            refresh_mode = "reload"
+        else:
+            fire_offset_ms -= float(os.getenv("FETCH_POLL_LEAD_MS", "300"))
+            try:
+                ctx.http_engine.warm()  # keep the connection hot for the unlock
+            except Exception as e:
+                logger.log(f"Direct-HTTP warm-up failed, using browser flow: {e}")
+                refresh_mode = "reload"
 
     # 1) Wait for unlock time
-    logger.log(f"Waiting until {refresh_time_est.strftime('%H:%M:%S')} EST")
-    wait_until_refresh_time(refresh_time_est)
+    logger.log(f"Waiting until {refresh_time_est.strftime('%H:%M:%S')} EST (offset {fire_offset_ms:+.0f} ms)")
+    clock = get_clock_offset_service().current(block=False)
+    clock_offset_s = clock["offset_s"] if clock else 0.0
+    if clock:
+        ctx.timings["clock_offset_ms"] = clock_offset_s * 1000
+        ctx.timings["clock_uncertainty_ms"] = clock["uncertainty_s"] * 1000
+        logger.log(f"NTP clock offset {clock_offset_s * 1000:+.1f} ms "
+                   f"(± {clock['uncertainty_s'] * 1000:.1f} ms, age {clock['age_s']:.0f} s)",
+                   event="clock_offset", offset_ms=clock_offset_s * 1000,
+                   uncertainty_ms=clock['uncertainty_s'] * 1000, stale=clock['stale'])
+
+    # Prefer the ForeTees server clock estimated while parked, when it is tight enough
+    release_clock = "ntp"
+    server = ctx.server_clock.estimate()
+    if server and os.getenv("SERVER_CLOCK_ENABLED", "1") != "0" and server["uncertainty_s"] <= get_max_server_clock_uncertainty_s():
+        release_clock = "foretees"
+        clock_offset_s = server["offset_s"]
+    ctx.timings["release_clock"] = release_clock
+    logger.log(f"Scheduling reload against {release_clock} clock, offset {clock_offset_s * 1000:+.1f} ms",
+               event="release_clock", release_clock=release_clock, offset_ms=clock_offset_s * 1000)
+    firing = wait_until_refresh_time(refresh_time_est, fire_offset_ms, clock_offset_s)
+    unlock_start = time.time()
+    ctx.timings["fire_error_ms"] = firing["fire_error_ms"]
+    logger.log(f"Fired with error {firing['fire_error_ms']:.3f} ms (wall clock {firing['wall_error_ms']:.3f} ms)",
+               event="fire", **firing)
+
+    # 2) Refresh the sheet
+    if refresh_mode == "http":
+        result = _http_fast_path(sb, ctx, desired_time, target_min, max_min, unlock_start)
+        if result is not None:
+            return result
+        logger.log("Direct-HTTP fast path did not hold a slot, falling back to browser flow")
+    elif refresh_mode == "fetch":
+        polled = poll_tee_sheet(sb, ctx)
+        if polled.get("swapped"):
+            result = _click_open_slot(sb, ctx, desired_time, target_min, max_min, fast_xpath,
+                                      unlock_start, stop_if_inert=True)
+            if result is not None:
+                return result
+            logger.log("Swapped-in sheet rows did not respond, falling back to JS reload")
+        else:
+            logger.log("No open slots seen while polling, falling back to JS reload")
+
+    reload_tee_sheet(sb, ctx)
+    return _click_open_slot(sb, ctx, desired_time, target_min, max_min, fast_xpath, unlock_start)
+
+def get_sheet_refresh_mode():
+    """How select_tee_time refreshes the sheet at the unlock: "reload" (default), "fetch" or "http"."""
+    mode = os.getenv("SHEET_REFRESH_MODE", "reload")
+    return mode if mode in ("reload", "fetch", "http") else "reload"
+
+def _rank_slots(slots, desired_time, target_min, max_min):
+    """Open slots within range: the exact desired time first, then earliest first."""
+    ranked = []
+    for slot in slots:
+        minutes = time_to_minutes(slot["time"])
+        if minutes is None or not (target_min <= minutes <= max_min):
+            continue
+        ranked.append((slot["time"] != desired_time, minutes, slot))
+    ranked.sort(key=lambda r: (r[0], r[1]))
+    return [slot for _, _, slot in ranked]
 
-    # 2) JS reload + wait for sheet rows
+def _http_fast_path(sb, ctx, desired_time, target_min, max_min, unlock_start):
+    """
+    Poll the sheet and hold a slot over the direct-HTTP engine, trying the
+    ranked candidates in order, then render the held slot page in the browser.
+    Returns (True, time), or None when no candidate could be held. A slot held
+    over HTTP that cannot be handed to the browser is released before
+    returning (see _release_http_hold), so the browser fallback starts
+    without a hold.
+    """
+    logger = ctx.logger
+    engine = ctx.http_engine
+    window_s = int(os.getenv("FETCH_POLL_WINDOW_MS", "5000")) / 1000
+    interval_s = int(os.getenv("FETCH_POLL_INTERVAL_MS", "150")) / 1000
+    poll_start = time.time()
+    try:
+        candidates = []
+        polls = 0
+        while True:
+            polls += 1
+            candidates = _rank_slots(engine.fetch_open_slots(), desired_time, target_min, max_min)
+            if candidates or time.time() - poll_start >= window_s:
+                break
+            time.sleep(interval_s)
+        logger.log_duration("Direct-HTTP sheet polling", poll_start, time.time(),
+                            f"polls={polls} candidates={[c['time'] for c in candidates]}")
+        for slot in candidates:
+            hold_start = time.time()
+            try:
+                html = engine.hold_slot(slot)
+            except EngineDeviation as e:
+                logger.log(f"Direct-HTTP hold of {slot['time']} failed: {e}")
+                continue
+            logger.log_duration(f"Direct-HTTP hold {slot['time']}", hold_start, time.time())
+            ctx.timings["unlock_to_click_seconds"] = time.time() - unlock_start
+            try:
+                engine.hand_back_to_browser(sb, html)
+            except Exception as e:
+                logger.log(f"Could not hand the held slot {slot['time']} to the browser, releasing it: {e}")
+                _release_http_hold(sb, ctx, engine)
+                return None
+            logger.log("END: select_tee_time (direct HTTP)")
+            return True, slot["time"]
+    except EngineDeviation as e:
+        logger.log(f"Direct-HTTP engine deviation: {e}")
+    except Exception as e:
+        logger.log(f"Direct-HTTP engine error: {e}")
+    finally:
+        logger.log("Direct-HTTP request latencies (ms)", event="http_engine", latencies_ms=engine.latencies_ms)
+    return None
+
+def _release_http_hold(sb, ctx, engine):
+    """
+    Give back a slot held over HTTP: by replaying the recorded Go Back request,
+    or else through the browser's Go Back, but only once the tab is confirmed
+    on the slot page (a hand-back can fail before the page was written, and
+    the tee sheet has no Go Back). Returns False if the hold is left to lapse.
+    """
+    logger = ctx.logger
+    try:
+        engine.release_slot()
+        logger.log("Released the held slot over HTTP")
+        return True
+    except Exception as e:
+        logger.log(f"Could not release the held slot over HTTP: {e}")
+    if sb.is_element_present("#slot_player_row_0"):
+        return release_held_slot(sb, ctx)
+    logger.log("Browser is not on the slot page; the held slot stays held until ForeTees times it out")
+    return False
+
+def reload_tee_sheet(sb, ctx):
+    """Full JS reload of the tee sheet, waiting for the rows to render."""
+    logger = ctx.logger
     logger.log("Performing JS reload")
     reload_start = time.time()
     sb.execute_script("location.reload(true);") 
+    ctx.page_lib.invalidate()
     sb.wait_for_element("div.rwdTr", timeout=2)
     time.sleep(0.1)  
     logger.log_duration("JS reload + wait_for_element", reload_start, time.time())
 
-    # Direct‐click attempt
+def poll_tee_sheet(sb, ctx):
+    """
+    Fast-availability refresh: poll the sheet HTML via in-page fetch() without
+    re-rendering until open slots appear (or FETCH_POLL_WINDOW_MS elapses).
+    Returns the script's summary: open times, whether rows were swapped in,
+    poll count and per-fetch latency.
+    """
+    logger = ctx.logger
+    window_ms = int(os.getenv("FETCH_POLL_WINDOW_MS", "5000"))
+    interval_ms = int(os.getenv("FETCH_POLL_INTERVAL_MS", "150"))
+    poll_start = time.time()
     try:
-        click_start = time.time()
-        sb.execute_script(
-            "var el = document.evaluate("
-            "arguments[0], document, null, "
-            "XPathResult.FIRST_ORDERED_NODE_TYPE, null"
-            ").singleNodeValue; if(el) el.click();",
-            exact_xpath
-        )
-        # give the browser a brief moment to show the popup
-        time.sleep(0.1)
-
-        success, status = handle_tee_time_popup(sb, logger)
-        logger.log_duration(f"Direct click {desired_time}", click_start, time.time())
-        if success and status == 'continue':
-            logger.log("END: select_tee_time (exact)")
-            return True, desired_time
+        result = ctx.page_lib.call(sb, "pollSheet", sb.get_current_url(), window_ms, interval_ms,
+                                   async_script=True, timeout=window_ms / 1000 + 10)
     except Exception as e:
-        logger.log(f"Direct-click attempt failed: {e}")
+        logger.log(f"In-page sheet polling failed: {e}")
+        return {"open": [], "swapped": False}
+    logger.log_duration("In-page fetch polling", poll_start, time.time(),
+                        f"polls={result['polls']} open={len(result['open'])} swapped={result['swapped']}")
+    logger.log("Fetch poll summary", event="fetch_poll", **result)
+    return result
+
+def _click_open_slot(sb, ctx, desired_time, target_min, max_min, slot_xpath, unlock_start, stop_if_inert=False):
+    """
+    Extract all open slots within range in a single script call, ranked with the
+    desired time first and then by distance from it, and try them in order with
+    one click-and-await-popup round trip per candidate.
+    When a candidate's element has been detached (the sheet re-rendered after a
+    "Go Back" or a popup timeout) or the list runs out, the slots are ranked
+    again without the times already tried; NoSlotWithinRange is raised only
+    once a fresh ranking has no untried slot left.
+    With stop_if_inert, returns None when the first click produces no popup at all
+    (e.g. swapped-in rows without event handlers) so the caller can reload instead.
+    """
+    logger = ctx.logger
+    tried = set()
+    max_rankings = 10  # bound on re-rankings of a sheet that keeps re-rendering
 
-    # Fallback: range-based
-    logger.log("Falling back to range-based slot selection")
+    for ranking in range(max_rankings):
+        if ranking:
+            try:
+                ctx.wait.element(sb, "div.rwdTr", timeout=2)
+            except Exception as e:
+                logger.log(f"Sheet rows did not come back before re-ranking: {e}")
+        rank_start = time.time()
+        candidates = ctx.page_lib.call(sb, "rankSlots", slot_xpath, target_min, max_min)
+        logger.log_duration("Ranked slot extraction", rank_start, time.time(),
+                            f"candidates={candidates} tried={sorted(tried)}")
+        if not any(chosen not in tried for chosen in candidates):
+            break
+
+        for index, chosen in enumerate(candidates):
+            if chosen in tried:
+                continue
+            click_start = time.time()
+            success, status = handle_tee_time_popup(sb, ctx, candidate=index)
+            if status == 'missing':
+                logger.log(f"Slot {chosen} is no longer on the page, re-ranking the sheet")
+                break
+            tried.add(chosen)
+            logger.log_duration(f"Click {chosen}", click_start, time.time(), f"popup={status}")
+            if success and status == 'continue':
+                ctx.timings["unlock_to_click_seconds"] = time.time() - unlock_start
+                kind = "exact" if chosen == desired_time else "fallback"
+                logger.log(f"END: select_tee_time ({kind})")
+                return True, chosen
+            if not success and stop_if_inert:
+                return None
+            # The page reacted to a click, so the rows are live
+            stop_if_inert = False
+    else:
+        # Untried slots were still listed: not a "no tee times" failure, so it stays retryable
+        raise Exception(f"Tee sheet kept re-rendering after {max_rankings} rankings, "
+                        f"tried {sorted(tried)}")
+
+    logger.log("No valid slots found in ranked candidates → raising NoSlotWithinRange")
+    raise NoSlotWithinRange(
+        f"All slots between {desired_time} and "
+        f"{max_min//60}:{max_min%60:02d} were unavailable"
+    )
 
-    tried = set()
-    while True:
-        click_script = """
-            var xpath = arguments[0], targ = arguments[1], maxm = arguments[2], tried = arguments[3];
-            var snapshot = document.evaluate(
-              xpath, document, null,
-              XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
-            );
-            var best = null, bestMin = Infinity, bestText = null;
-            for (var i = 0; i < snapshot.snapshotLength; i++) {
-                var el = snapshot.snapshotItem(i);
-                var txt = el.textContent.trim();
-                // parse "H:MM AM/PM"
-                var m = txt.match(/(\\d+):(\\d+)\\s*(AM|PM)/i);
-                if (!m) { continue; }
-                var h = parseInt(m[1],10), mm = parseInt(m[2],10), ap = m[3].toUpperCase();
-                if (ap === 'PM' && h < 12) { h += 12; }
-                if (ap === 'AM' && h === 12) { h = 0; }
-                var minutes = h*60 + mm;
-                if (
-                  minutes >= targ &&
-                  minutes <= maxm &&
-                  minutes < bestMin &&
-                  tried.indexOf(txt) === -1
-                ) {
-                    bestMin = minutes;
-                    best = el;
-                    bestText = txt;
-                }
-            }
-            if (best) {
-              best.click();
-              return bestText;
-            }
-            return null;
-        """
-        # run one JS pass to pick & click the best slot
-        chosen = sb.execute_script(
-            click_script,
-            range_xpath, target_min, max_min, list(tried)
-        )
-        logger.log(f"Fallback JS click returned: {chosen}")
-
-        if not chosen:
-            logger.log("No valid slots found in JS fallback → raising NoSlotWithinRange")
-            raise NoSlotWithinRange(
-                f"All slots between {desired_time} and "
-                f"{max_min//60}:{max_min%60:02d} were unavailable"
-            )
-
-        tried.add(chosen)
-        # give the modal a moment to render
-        time.sleep(0.05)
-
-        success, status = handle_tee_time_popup(sb, logger)
-        if success and status == 'continue':
-            logger.log("END: select_tee_time (fallback)")
-            return True, chosen
-        # otherwise loop again, JS will skip this one via our 'tried' array
-
-def set_slot_as_tbd_with_walk(sb, slot_number, max_attempts=3):
+def set_slot_as_tbd_with_walk(sb, ctx, slot_number, max_attempts=3):
     """Helper function to set a specific slot as TBD and set transport to WLK"""
     for attempt in range(max_attempts):
         try:
@@ -704,21 +799,21 @@ def set_slot_as_tbd_with_walk(sb, slot_number, max_attempts=3):
                 print("Could not find TBD tab")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             sb.execute_script("arguments[0].click();", tbd_tab)
-            take_screenshot(sb, "found_slot")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            take_screenshot(sb, ctx, "found_slot")
+            ctx.wait.pause()
             
             # Wait for the TBD content to be visible
             print(f"Waiting for TBD content for slot {slot_number}...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, ".ftMs-block.ftMs-guestTbd.active", timeout=5)
             if not sb.is_element_present(".ftMs-block.ftMs-guestTbd.active"):
                 print("TBD content not visible")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
@@ -729,20 +824,20 @@ def set_slot_as_tbd_with_walk(sb, slot_number, max_attempts=3):
                 print("Could not find X element")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             sb.execute_script("arguments[0].click();", x_element)
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             
             # Wait for the TBD row to be updated
             print(f"Waiting for TBD row {slot_number} to be updated...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, f"#slot_player_row_{slot_number}.playerTypeGuestTbd", timeout=5)
             if not sb.is_element_present(f"#slot_player_row_{slot_number}.playerTypeGuestTbd"):
                 print("TBD row not updated")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
@@ -753,44 +848,89 @@ def set_slot_as_tbd_with_walk(sb, slot_number, max_attempts=3):
                 print(f"Could not find transport cell in TBD row {slot_number}")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             sb.execute_script("arguments[0].click();", tbd_transport_cell)
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             
             # Wait for the dropdown to be visible and select WLK
             print(f"Selecting WLK from dropdown in TBD row {slot_number}...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, f"#slot_player_row_{slot_number}.playerTypeGuestTbd .transport_type", timeout=5)
             if not sb.is_element_present(f"#slot_player_row_{slot_number}.playerTypeGuestTbd .transport_type"):
                 print("Transport dropdown not visible")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             sb.select_option_by_text(f"#slot_player_row_{slot_number}.playerTypeGuestTbd .transport_type", "WLK")
-            take_screenshot(sb, "after_tbd_set")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            take_screenshot(sb, ctx, "after_tbd_set")
+            ctx.wait.pause()
             
             print(f"Successfully set slot {slot_number} as TBD with WLK transport")
             return True
             
         except Exception as e:
             print(f"Error setting slot {slot_number} as TBD (attempt {attempt + 1}): {str(e)}")
-            take_screenshot(sb, "set_slot_as_tbd_with_walk")
+            take_screenshot(sb, ctx, "set_slot_as_tbd_with_walk")
             if attempt < max_attempts - 1:
                 print("Retrying...")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             return False
 
-def modify_player_slot(sb, max_attempts=3):
-    """Modify the first player slot's transport type to WLK and set players as TBD"""
+def get_player_fill_mode():
+    """How modify_player_slot fills the form: "batch" (default) or "steps" (PLAYER_FILL_MODE)."""
+    mode = os.getenv("PLAYER_FILL_MODE", "batch")
+    return mode if mode in ("batch", "steps") else "batch"
+
+def fill_player_slots_batched(sb, ctx, rows=4, step_timeout=3):
+    """
+    Fill every player row in a single injected script and verify the result:
+    row 0 keeps the member with WLK, rows 1.. are TBD with WLK.
+    Returns True only if the read-back form state matches.
+    """
+    logger = ctx.logger
+    fill_start = time.time()
+    try:
+        result = ctx.page_lib.call(sb, "fillPlayers", rows, int(step_timeout * 1000),
+                                   async_script=True, timeout=rows * 4 * step_timeout + 5)
+    except Exception as e:
+        logger.log(f"Batched player fill script failed: {e}")
+        return False
+    verified = result["error"] is None and all(
+        r["transport"] == "WLK" and (r["tbd"] or r["row"] == 0) for r in result["rows"]
+    )
+    logger.log_duration("Batched player fill", fill_start, time.time(),
+                        f"verified={verified} error={result['error']}")
+    logger.log("Batched player fill state", event="player_fill", verified=verified, **result)
+    return verified
+
+def modify_player_slot(sb, ctx, max_attempts=3):
+    """
+    Modify the first player slot's transport type to WLK and set players as TBD.
+    Tries the batched single-script fill first (PLAYER_FILL_MODE=batch) and
+    falls back to the step-by-step flow if its result does not verify.
+    """
+    if get_player_fill_mode() == "batch":
+        try:
+            ctx.wait.element(sb, "#slot_player_row_0", timeout=5)
+            take_screenshot(sb, ctx, "found_player_slot")
+            if fill_player_slots_batched(sb, ctx):
+                print("Successfully modified all player slots (batched)")
+                take_screenshot(sb, ctx, "after_player_modification")
+                if submit_player_request(sb, ctx):
+                    return True
+        except Exception as e:
+            print(f"Error in batched player fill: {str(e)}")
+            take_screenshot(sb, ctx, "modify_player_slot_batched")
+        print("Batched player fill did not complete, falling back to step-by-step flow")
+
     for attempt in range(max_attempts):
         try:
             print("Waiting for player slots to load...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, "#slot_player_row_0", timeout=5)
             
             # Find the first player slot row
             first_slot = sb.find_element("#slot_player_row_0")
@@ -798,11 +938,11 @@ def modify_player_slot(sb, max_attempts=3):
                 print("Could not find first player slot")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
-            take_screenshot(sb, "found_player_slot")
+            take_screenshot(sb, ctx, "found_player_slot")
             
             # Find and click the transport cell
             transport_cell = first_slot.find_element(By.CSS_SELECTOR, ".ftS-trasportCell")
@@ -810,79 +950,114 @@ def modify_player_slot(sb, max_attempts=3):
                 print("Could not find transport cell")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
             # Click the transport cell
             print("Clicking transport cell...")
             sb.execute_script("arguments[0].click();", transport_cell)
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             
             # Wait for the dropdown to be visible and select WLK
             print("Selecting WLK from dropdown...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, ".transport_type", timeout=5)
             if not sb.is_element_present(".transport_type"):
                 print("Transport dropdown not visible")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             sb.select_option_by_text(".transport_type", "WLK")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.pause()
             
             # Wait for the member select dialog to appear
             print("Waiting for member select dialog...")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            ctx.wait.element(sb, ".ftMs-memberSelect", timeout=5)
             if not sb.is_element_present(".ftMs-memberSelect"):
                 print("Member select dialog not visible")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
             
             # Set slots 1, 2, and 3 as TBD with WLK transport
             for slot_number in range(1, 4):  # This will handle slots 1, 2, and 3
-                if not set_slot_as_tbd_with_walk(sb, slot_number):
+                if not set_slot_as_tbd_with_walk(sb, ctx, slot_number):
                     print(f"Failed to set slot {slot_number} as TBD")
                     if attempt < max_attempts - 1:
                         print("Retrying...")
-                        time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                        ctx.wait.pause("retry")
                         continue
                     return False
                 # Add a small delay between slots
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
             
             print("Successfully modified all player slots")
-            take_screenshot(sb, "after_player_modification")
+            take_screenshot(sb, ctx, "after_player_modification")
             
-            # Click the Submit Request button
-            print("Clicking Submit Request button...")
-            submit_button = sb.find_element(".submit_request_button")
-            if not submit_button:
-                print("Could not find Submit Request button")
+            if not submit_player_request(sb, ctx):
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
-            sb.execute_script("arguments[0].click();", submit_button)
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
             
             return True
             
         except Exception as e:
             print(f"Error modifying player slot (attempt {attempt + 1}): {str(e)}")
-            take_screenshot(sb, "modify_player_slot")
+            take_screenshot(sb, ctx, "modify_player_slot")
             if attempt < max_attempts - 1:
                 print("Retrying...")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             return False
 
-def handle_confirmation_popup(sb, reservation_time=None, max_attempts=3):
+def submit_player_request(sb, ctx):
+    """Click the Submit Request button on the slot page"""
+    print("Clicking Submit Request button...")
+    submit_button = sb.find_element(".submit_request_button")
+    if not submit_button:
+        print("Could not find Submit Request button")
+        return False
+    sb.execute_script("arguments[0].click();", submit_button)
+    ctx.page_lib.invalidate()
+    ctx.wait.pause()
+    return True
+
+def release_held_slot(sb, ctx):
+    """
+    Leave the slot page through its "Go Back" button so ForeTees releases the
+    tee time this attempt holds. Returns False if the button was not found.
+    """
+    logger = ctx.logger
+    try:
+        button = sb.find_element(SLOT_GO_BACK_XPATH, by=By.XPATH, timeout=2)
+    except Exception as e:
+        logger.log(f"Could not find Go Back on the slot page: {e}")
+        return False
+    sb.execute_script("arguments[0].click();", button)
+    ctx.page_lib.invalidate()
+    logger.log("Released the held slot")
+    return True
+
+def claim_hedge_hold(sb, ctx, actual_time):
+    """
+    Publish that this hedge holds `actual_time` (see HedgeCoordinator.claim_hold).
+    A hedge that lost the race gives its own slot back before HedgeLost
+    propagates, so only the winner's tee time stays held.
+    """
+    try:
+        ctx.hedge.claim_hold(actual_time, (ctx.timings.get("clock_offset_ms") or 0.0) / 1000)
+    except HedgeLost:
+        with ctx.logger.context("release_held_slot"):
+            release_held_slot(sb, ctx)
+        raise
+
+def handle_confirmation_popup(sb, ctx, reservation_time=None, max_attempts=3):
     """Handle the confirmation popup that appears after submitting the request
     Optionally centers the reservation time row and takes a screenshot before final confirmation.
     """
@@ -900,7 +1075,7 @@ def handle_confirmation_popup(sb, reservation_time=None, max_attempts=3):
                 print("Could not find ForeTees tab")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
 
@@ -908,7 +1083,7 @@ def handle_confirmation_popup(sb, reservation_time=None, max_attempts=3):
             # Use XPath to find the Continue button
             button = sb.find_element("//button[.//span[text()='Continue']]")
             
-            take_screenshot(sb, "confirmation_popup_appeared")
+            take_screenshot(sb, ctx, "confirmation_popup_appeared")
             
             # Click the button using JavaScript
             print("Clicking Continue button...")
@@ -916,37 +1091,33 @@ def handle_confirmation_popup(sb, reservation_time=None, max_attempts=3):
 
             # Center the reservation time row and take a screenshot before final confirmation
             if reservation_time:
+                # Continue returns to the tee sheet, a fresh page for __tt
+                ctx.page_lib.invalidate()
+                ctx.wait.element(sb, "div.rwdTr", timeout=10)
                 try:
-                    # Universal XPath for any slot state
-                    row_xpath = (
-                        f"//div[contains(@class, 'rwdTr')]"
-                        f"//*[self::a or self::div[contains(@class, 'time_slot')]]"
-                        f"[normalize-space(text())='{reservation_time}']"
-                        f"/ancestor::div[contains(@class, 'rwdTr')]"
-                    )
-                    parent_row = sb.find_element(row_xpath, by='xpath')
+                    centered = ctx.page_lib.call(sb, "scrollToTime", reservation_time)
                 except Exception:
-                    parent_row = None
-                if parent_row:
-                    sb.driver.execute_script("arguments[0].scrollIntoView({behavior: 'instant', block: 'center'});", parent_row)
-                take_screenshot(sb, "time_slots_around_reservation_time")
+                    centered = False
+                if not centered:
+                    print(f"Could not find the {reservation_time} row to center")
+                take_screenshot(sb, ctx, "time_slots_around_reservation_time")
 
-            take_screenshot(sb, "after_confirmation_handling")
-            time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+            take_screenshot(sb, ctx, "after_confirmation_handling")
+            ctx.wait.pause()
             
             print("Successfully handled confirmation popup")           
             return True
             
         except Exception as e:
             print(f"Error handling confirmation popup (attempt {attempt + 1}): {str(e)}")
-            take_screenshot(sb, "handle_confirmation_popup")
+            take_screenshot(sb, ctx, "handle_confirmation_popup")
             if attempt < max_attempts - 1:
                 print("Retrying...")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             return False
 
-def handle_logout(sb, max_attempts=3):
+def handle_logout(sb, ctx, max_attempts=3):
     """Handle the logout process across multiple pages"""
     for attempt in range(max_attempts):
         try:
@@ -956,12 +1127,12 @@ def handle_logout(sb, max_attempts=3):
             if exit_link:
                 print("Clicking Exit link...")
                 sb.execute_script("arguments[0].click();", exit_link)
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
             else:
                 print("Could not find Exit link")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
 
@@ -971,12 +1142,12 @@ def handle_logout(sb, max_attempts=3):
             if return_button:
                 print("Clicking RETURN button...")
                 sb.execute_script("arguments[0].click();", return_button)
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause()
             else:
                 print("Could not find RETURN button")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
 
@@ -992,7 +1163,7 @@ def handle_logout(sb, max_attempts=3):
                 print("Could not find Capital City Club tab")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
 
@@ -1000,35 +1171,46 @@ def handle_logout(sb, max_attempts=3):
             print("Looking for Logout link...")
             logout_link = sb.find_element("//a[@href='/c/portal/logout']")
             
-            take_screenshot(sb, "found_logout_button")
+            take_screenshot(sb, ctx, "found_logout_button")
             
             if logout_link:
                 print("Clicking Logout link...")
                 sb.execute_script("arguments[0].click();", logout_link)
-                take_screenshot(sb, "after_logout_click")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                take_screenshot(sb, ctx, "after_logout_click")
+                ctx.wait.pause()
                 
                 # Verify logout
                 if "home" in sb.get_current_url():  # or "capitalcityclub.org/web/pages/home"
-                    take_screenshot(sb, "logout_successful")
+                    take_screenshot(sb, ctx, "logout_successful")
                     return True
             else:
                 print("Could not find Logout link")
                 if attempt < max_attempts - 1:
                     print("Retrying...")
-                    time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                    ctx.wait.pause("retry")
                     continue
                 return False
 
         except Exception as e:
             print(f"Error during logout process (attempt {attempt + 1}): {str(e)}")
-            take_screenshot(sb, "handle_logout")
+            take_screenshot(sb, ctx, "handle_logout")
             if attempt < max_attempts - 1:
                 print("Retrying...")
-                time.sleep(random.uniform(0.8, 1.5))  # Random delay between 800-1500ms
+                ctx.wait.pause("retry")
                 continue
             return False
 
+def notify_attempt_result(ctx, reservation_date, reservation_time, actual_time=None, success=True):
+    """
+    Email this attempt's result, unless it is one hedge of several: the
+    reservation then gets a single email once every hedge has finished and
+    their outcomes are merged (see record_outcome in app.py).
+    """
+    if ctx.hedge is not None:
+        ctx.logger.log(f"Hedged attempt, leaving the {'success' if success else 'failure'} email to the dispatcher")
+        return
+    send_email(reservation_date, reservation_time, actual_time, success=success)
+
 def send_email(reservation_date, reservation_time, actual_time=None, success=True):
     sender_email = os.getenv('SENDER_EMAIL')
     app_password = os.getenv('APP_PASSWORD')     
@@ -1093,17 +1275,6 @@ def send_email(reservation_date, reservation_time, actual_time=None, success=Tru
     except Exception as e:
         logging.error(f"Error sending email: {e}")
 
-class TimeSyncError(Exception):
-    pass
-
-def verify_time_sync():
-    client = ntplib.NTPClient()
-    response = client.request('pool.ntp.org')
-    server_time = datetime.fromtimestamp(response.tx_time, pytz.utc)
-    local_time = datetime.now(pytz.utc)
-    if abs((server_time - local_time).total_seconds()) > 1:
-        raise TimeSyncError("Server time out of sync with NTP")
-
 def calculate_refresh_time():
     """
     Calculate the precise refresh time using current date and configured unlock time from .env file.
@@ -1111,8 +1282,12 @@ def calculate_refresh_time():
     Returns:
         datetime: Refresh time localized to EST timezone
     """
-    # Verify system time is accurate
-    verify_time_sync()
+    # Warm the NTP clock-offset estimate; the unlock waiter corrects for it
+    clock = get_clock_offset_service().current()
+    if clock is None:
+        print("WARNING: no NTP clock-offset estimate available, using the local clock as-is")
+    else:
+        print(f"Clock offset vs NTP: {clock['offset_s'] * 1000:+.1f} ms ± {clock['uncertainty_s'] * 1000:.1f} ms")
     
     # Get unlock time from .env file
     unlock_time_str = os.getenv('UNLOCK_TIME_EST', "07:30")
@@ -1149,10 +1324,13 @@ def calculate_refresh_time():
     print(f"Target refresh time (EST): {refresh_time.strftime('%Y-%m-%d %H:%M:%S %Z%z')}")
     print(f"Current time (EST): {now_est.strftime('%Y-%m-%d %H:%M:%S %Z%z')}")
     print(f"Time until refresh: {time_diff} seconds")
+
+    # Sharpen the offset estimate with one NTP burst shortly before the unlock
+    get_clock_offset_service().burst_before(refresh_time.timestamp())
     
     return refresh_time
 
-def verify_captcha_success(sb, url, max_attempts=3):
+def verify_captcha_success(sb, ctx, url, max_attempts=3):
     """Verify if the captcha was successfully solved by checking for either:
     1. The presence of the club URL in the current URL
     2. The absence of Cloudflare elements
@@ -1163,138 +1341,389 @@ def verify_captcha_success(sb, url, max_attempts=3):
             # Initial connection and captcha handling
             if attempt == 0:
                 sb.uc_open_with_reconnect(url, 6)
-                take_screenshot(sb, "initial_page_load")
+                take_screenshot(sb, ctx, "initial_page_load")
             
             sb.uc_gui_click_captcha()
-            take_screenshot(sb, f"after_captcha_attempt_{attempt + 1}")
+            take_screenshot(sb, ctx, f"after_captcha_attempt_{attempt + 1}")
             
             # Wait for page to stabilize
-            time.sleep(random.uniform(1.2, 2.5))                     
+            ctx.wait.pause("settle")                     
                 
             # Check for Cloudflare elements
             cloudflare_elements = sb.find_elements("a[href*='cloudflare.com']")
             if not cloudflare_elements:
                 print("Captcha verification successful - no Cloudflare elements found")
-                take_screenshot(sb, f"no_Cloudflare_element_found_{attempt + 1}")
+                take_screenshot(sb, ctx, f"no_Cloudflare_element_found_{attempt + 1}")
                 return True
                 
             print(f"Captcha verification failed - attempt {attempt + 1}")
             if attempt < max_attempts - 1:
                 print("Retrying captcha...")
-                time.sleep(random.uniform(1.2, 2.5))
+                ctx.wait.pause("retry")
                 continue
                 
             return False
             
         except Exception as e:
             print(f"Error during captcha verification (attempt {attempt + 1}): {str(e)}")
-            take_screenshot(sb, f"captcha_verification_error_{attempt + 1}")
+            take_screenshot(sb, ctx, f"captcha_verification_error_{attempt + 1}")
             if attempt < max_attempts - 1:
-                time.sleep(random.uniform(1.2, 2.5))
+                ctx.wait.pause("retry")
                 continue
             return False
 
-def open_website(reservation_date, reservation_time, time_slot_range, course):
+def get_prestage_lead_seconds():
+    """
+    Lead time (seconds before the unlock instant) at which the pre-stage phase
+    launches the browser. Configured with PRESTAGE_LEAD_SECONDS in .env.
+    """
+    try:
+        return max(0, int(os.getenv('PRESTAGE_LEAD_SECONDS', "300")))
+    except ValueError:
+        print("Invalid PRESTAGE_LEAD_SECONDS, using default of 300 seconds")
+        return 300
+
+def wait_until_prestage_start(refresh_time, lead_seconds, logger):
+    """
+    Sleep until `lead_seconds` before the unlock instant. Returns immediately if
+    that moment has already passed (e.g. on a retry after the unlock).
+    """
+    prestage_start = refresh_time - timedelta(seconds=lead_seconds)
+    now = datetime.now(refresh_time.tzinfo)
+    logger.log(f"Pre-stage lead time: {lead_seconds} s, pre-stage start: {prestage_start.strftime('%H:%M:%S')} EST")
+    if now >= prestage_start:
+        logger.log("Pre-stage start already reached, launching browser immediately")
+        return
+    logger.log(f"Sleeping {(prestage_start - now).total_seconds():.1f} s until pre-stage start")
+    wait_until_refresh_time(prestage_start)
+
+def _record_readiness(readiness, phase, refresh_time, logger):
+    """Record how many seconds before the unlock instant a phase completed."""
+    seconds_before_unlock = (refresh_time - datetime.now(refresh_time.tzinfo)).total_seconds()
+    readiness[phase] = round(seconds_before_unlock, 3)
+    logger.log(f"READY: {phase} completed {seconds_before_unlock:.3f} s before unlock")
+
+def resume_saved_session(sb, ctx, store):
+    """
+    Restore the account's saved cookies and open ForeTees Member_select directly.
+    The session is valid if ForeTees serves the page instead of redirecting to
+    its login servlet. Returns True when captcha and login can be skipped.
+    """
+    logger = ctx.logger
+    start = time.time()
+    try:
+        restored = store.restore_cookies(sb)
+        if not restored:
+            logger.log("No saved session to resume")
+            return False
+        apply_network_blocking(sb, "foretees", logger)
+        sb.open(FORETEES_MEMBER_SELECT_URL)
+        ctx.wait.url(sb, "Member_", "servlet/Login", timeout=10)
+        current_url = sb.get_current_url()
+        valid = "Member_" in current_url and "servlet/Login" not in current_url
+    except Exception as e:
+        logger.log(f"Saved session check failed: {e}")
+        valid = False
+    logger.log_duration("Saved session check", start, time.time(), f"valid={valid}")
+    if valid:
+        take_screenshot(sb, ctx, "resumed_saved_session")
+    else:
+        forget_saved_session(sb, ctx, store)
+    return valid
+
+def forget_saved_session(sb, ctx, store):
+    """
+    Drop a saved session that stopped working: from the jar (unless another
+    attempt saved a newer one) and from the browser, so the cold login that
+    follows starts without its cookies.
+    """
+    if store.restored is not None:
+        store.clear(stale=store.restored)
+    try:
+        sb.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    except Exception as e:
+        ctx.logger.log(f"Could not clear the browser's cookies: {e}")
+
+def _login_to_foretees(sb, ctx, url, reservation_date, reservation_time, refresh_time, readiness):
+    """Cold start of the pre-stage: captcha, club login and ForeTees navigation."""
+    logger = ctx.logger
+    logger.log(f"Attempting to navigate to: {url}")
+    # The captcha page loads untouched; blocking starts once it is solved
+    apply_network_blocking(sb, None, logger)
+    with logger.context("verify_captcha_success"):
+        if not verify_captcha_success(sb, ctx, url):
+            logger.log("Captcha verification failed")
+            notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+            raise Exception("Failed to solve captcha after multiple attempts")
+    _record_readiness(readiness, "verify_captcha_success", refresh_time, logger)
+    log_page_load(sb, "verify_captcha_success", logger)
+    apply_network_blocking(sb, "club", logger)
+    logger.log("Page loaded successfully. Looking for Member Login link...")
+    take_screenshot(sb, ctx, "main_page_loaded")
+    with logger.context("click_member_login"):
+        if not click_member_login(sb, ctx):
+            logger.log("Failed to click Member Login link")
+            notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+            raise Exception("Failed to click Member Login link after multiple attempts")
+    _record_readiness(readiness, "click_member_login", refresh_time, logger)
+    log_page_load(sb, "click_member_login", logger)
+    logger.log("Proceeding with login...")
+    with logger.context("handle_login"):
+        if not handle_login(sb, ctx):
+            logger.log("Failed to complete login process")
+            notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+            raise Exception("Failed to complete login process")
+    _record_readiness(readiness, "handle_login", refresh_time, logger)
+    log_page_load(sb, "handle_login", logger)
+    logger.log("Login successful. Proceeding to Fore Tees...")
+    with logger.context("click_fore_tees"):
+        if not click_fore_tees(sb, ctx):
+            logger.log("Failed to navigate to Fore Tees")
+            notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+            raise Exception("Failed to navigate to Fore Tees")
+    _record_readiness(readiness, "click_fore_tees", refresh_time, logger)
+    log_page_load(sb, "click_fore_tees", logger)
+    # ForeTees opened in a new tab, which needs its own block list
+    apply_network_blocking(sb, "foretees", logger)
+    logger.log("Proceeding with ForeTees navigation...")
+    with logger.context("handle_foretees_navigation"):
+        if not handle_foretees_navigation(sb, ctx):
+            logger.log("Failed to complete ForeTees navigation")
+            notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+            raise Exception("Failed to complete ForeTees navigation")
+    _record_readiness(readiness, "handle_foretees_navigation", refresh_time, logger)
+    log_page_load(sb, "handle_foretees_navigation", logger)
+
+def _navigate_prestaged(sb, ctx, reservation_date, course):
+    logger = ctx.logger
+    logger.log(f"Navigating directly to tee sheet for date: {reservation_date}, course: {course}")
+    with logger.context("navigate_to_tee_sheet"):
+        return navigate_to_tee_sheet(sb, ctx, reservation_date, course)
+
+def prestage_session(sb, ctx, url, reservation_date, reservation_time, course, refresh_time, store=None):
+    """
+    Pre-stage phase: solve the captcha, log in and walk through ForeTees until the
+    browser is parked on the tee sheet, ready for the selection step.
+    With a SessionStore whose saved session is still valid, captcha and login
+    are skipped and only the tee sheet navigation runs; if that navigation
+    fails, the saved session is dropped and the cold login runs after all.
+
+    Returns:
+        dict: phase name -> seconds before the unlock instant it completed
+              (negative values mean the phase finished after the unlock).
+    """
+    logger = ctx.logger
+    readiness = {}
+
+    resumed = False
+    if store is not None:
+        with logger.context("resume_saved_session"):
+            resumed = resume_saved_session(sb, ctx, store)
+        _record_readiness(readiness, "resume_saved_session", refresh_time, logger)
+    parked = False
+    if resumed:
+        logger.log("Saved session is valid, skipping captcha and login")
+        parked = _navigate_prestaged(sb, ctx, reservation_date, course)
+        if not parked:
+            # Member_select answered, but the session did not get as far as the sheet
+            logger.log("Resumed session could not reach the tee sheet, falling back to a cold login")
+            forget_saved_session(sb, ctx, store)
+    if not parked:
+        _login_to_foretees(sb, ctx, url, reservation_date, reservation_time, refresh_time, readiness)
+        parked = _navigate_prestaged(sb, ctx, reservation_date, course)
+    if not parked:
+        # Detailed logging and screenshots are handled within navigate_to_tee_sheet
+        logger.log(f"Failed to navigate directly to tee sheet for date: {reservation_date}, course: {course}. Check previous logs for details.")
+        notify_attempt_result(ctx, reservation_date, reservation_time, success=False) # Consistent with other failure emails
+        raise Exception(f"Failed to navigate directly to tee sheet. Date: {reservation_date}, Course: {course}")
+    _record_readiness(readiness, "navigate_to_tee_sheet", refresh_time, logger)
+    log_page_load(sb, "navigate_to_tee_sheet", logger)
+    logger.log("Successfully navigated to tee sheet.")
+
+    if store is not None:
+        try:
+            saved = store.save_cookies(sb)
+            logger.log(f"Saved {saved} cookies for session reuse")
+        except Exception as e:
+            logger.log(f"Could not save session cookies: {e}")
+
+    return readiness
+
+def sample_server_clock(sb, ctx):
+    """Take one batch of ForeTees Date-header samples and log the refined server-clock estimate."""
+    try:
+        estimate = ctx.server_clock.sample(sb)
+    except Exception as e:
+        ctx.logger.log(f"Server clock sampling failed: {e}")
+        return None
+    if estimate:
+        ctx.timings["server_clock_offset_ms"] = estimate["offset_s"] * 1000
+        ctx.logger.log(f"ForeTees clock offset {estimate['offset_s'] * 1000:+.1f} ms "
+                       f"± {estimate['uncertainty_s'] * 1000:.1f} ms from {estimate['samples']} samples",
+                       event="server_clock", offset_ms=estimate["offset_s"] * 1000,
+                       uncertainty_ms=estimate["uncertainty_s"] * 1000,
+                       samples=estimate["samples"], consistent=estimate["consistent"])
+    return estimate
+
+def park_on_tee_sheet(sb, ctx, reservation_date, course, refresh_time, check_interval=30):
+    """
+    Keep the pre-staged browser parked on the tee sheet until shortly before the
+    unlock instant, re-navigating if the session drifts off Member_sheet.
+    While parked, the ForeTees server clock is sampled on every check so
+    select_tee_time can schedule its reload against it.
+    The final stretch is left to select_tee_time's own waiter.
+    """
+    logger = ctx.logger
+    tz = refresh_time.tzinfo
+    handoff_margin = 5  # seconds before unlock at which control passes to select_tee_time
+    if (refresh_time - datetime.now(tz)).total_seconds() > handoff_margin + 5:
+        sample_server_clock(sb, ctx)
+    while True:
+        remaining = (refresh_time - datetime.now(tz)).total_seconds()
+        if remaining <= handoff_margin + check_interval:
+            break
+        time.sleep(check_interval)
+        ctx.check_lease()
+        try:
+            current_url = sb.get_current_url()
+        except Exception as e:
+            logger.log(f"Parked session check failed: {e}")
+            current_url = ""
+        if "Member_sheet" not in current_url:
+            logger.log(f"Parked session left the tee sheet ({current_url}), re-navigating")
+            with logger.context("navigate_to_tee_sheet (re-park)"):
+                if not navigate_to_tee_sheet(sb, ctx, reservation_date, course):
+                    raise Exception(f"Failed to re-park on tee sheet. Date: {reservation_date}, Course: {course}")
+        sample_server_clock(sb, ctx)
+        if ctx.http_engine is not None:
+            try:
+                ctx.http_engine.warm()
+            except Exception as e:
+                logger.log(f"Direct-HTTP keep-alive failed, disabling engine: {e}")
+                ctx.http_engine = None
+
+    remaining = (refresh_time - datetime.now(tz)).total_seconds()
+    logger.log(f"Handing parked session to select_tee_time {remaining:.3f} s before unlock")
+
+def end_session(sb, ctx, store=None):
+    """
+    Log out after a booking, unless SESSION_REUSE keeps the account's session.
+
+    With a SessionStore the server session is shared: its cookies are in the
+    jar that concurrent attempts (parallel dispatch, hedges) and later ones
+    restore, so logging out would end their session mid-flow. The session is
+    then left to expire on its own. Returns False if the logout failed.
+    """
+    logger = ctx.logger
+    if store is not None:
+        logger.log("Session reuse is on, keeping the shared session instead of logging out")
+        return True
+    logger.log("Proceeding with logout...")
+    with logger.context("handle_logout"):
+        if not handle_logout(sb, ctx):
+            logger.log("Failed to complete logout process")
+            return False
+    return True
+
+def open_website(reservation_date, reservation_time, time_slot_range, course, ctx=None):
     """
     Main function to handle the tee time reservation process.
     When called from app.py, all parameters are required and come from the database.
-    """
-    # Reset screenshot counter for each attempt
-    global _screenshot_counter
-    _screenshot_counter = 0
 
-    # Calculate the refresh time using the utility function
-    refresh_time = calculate_refresh_time()
+    The browser is pre-staged PRESTAGE_LEAD_SECONDS before the unlock instant:
+    captcha, login and ForeTees navigation complete ahead of time and the session
+    is parked on the tee sheet, so only select_tee_time runs at the unlock.
+    With SESSION_REUSE=1 a still-valid session saved by an earlier attempt
+    skips captcha and login altogether, and no attempt logs out (see end_session).
+    If the attempt's reservation lease (ctx.lease) is lost to another
+    instance, the flow stops with LeaseLost at the next phase boundary.
+    A hedged attempt (ctx.hedge) that reaches the "Yes, Continue" popup after
+    another hedge of the same reservation releases its slot and stops with
+    HedgeLost before modify_player_slot.
 
-    # Get reservation context for logging
-    reservation_folder = blob_service.current_reservation_folder
-    attempt = blob_service.current_attempt
-    logger = AttemptLogger(reservation_folder, attempt, blob_service)
+    Args:
+        ctx (AttemptContext): Per-attempt state (blob folder, attempt number,
+            screenshot counter, logger). Defaults to attempt 1 of the
+            "<date>_<time>" folder when run directly.
+    """
+    if ctx is None:
+        ctx = AttemptContext(f"{reservation_date}_{reservation_time}", 1, blob_service)
+    logger = ctx.logger
+    store = SessionStore(LOGIN_CREDENTIALS["username"]) if is_session_reuse_enabled() else None
 
     try:
+        # Calculate the refresh time using the utility function
+        refresh_time = calculate_refresh_time()
+
         url = os.getenv('CLUB_URL')
-        logger.log(f"Attempting to navigate to: {url}")
-        with SB(uc=True, xvfb=True) as sb:
-            with logger.context("verify_captcha_success"):
-                if not verify_captcha_success(sb, url):
-                    logger.log("Captcha verification failed")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to solve captcha after multiple attempts")
-            logger.log("Page loaded successfully. Looking for Member Login link...")
-            take_screenshot(sb, "main_page_loaded")
-            with logger.context("click_member_login"):
-                if not click_member_login(sb):
-                    logger.log("Failed to click Member Login link")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to click Member Login link after multiple attempts")
-            logger.log("Proceeding with login...")
-            with logger.context("handle_login"):
-                if not handle_login(sb):
-                    logger.log("Failed to complete login process")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to complete login process")
-            logger.log("Login successful. Proceeding to Fore Tees...")
-            with logger.context("click_fore_tees"):
-                if not click_fore_tees(sb):
-                    logger.log("Failed to navigate to Fore Tees")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to navigate to Fore Tees")
-            logger.log("Proceeding with ForeTees navigation...")
-            with logger.context("handle_foretees_navigation"):
-                if not handle_foretees_navigation(sb):
-                    logger.log("Failed to complete ForeTees navigation")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to complete ForeTees navigation")
-            
-            # Call the new function to navigate directly to the tee sheet
-            logger.log(f"Navigating directly to tee sheet for date: {reservation_date}, course: {course}")
-            with logger.context("navigate_to_tee_sheet"):
-                if not navigate_to_tee_sheet(sb, reservation_date, course):
-                    # Detailed logging and screenshots are handled within navigate_to_tee_sheet
-                    logger.log(f"Failed to navigate directly to tee sheet for date: {reservation_date}, course: {course}. Check previous logs for details.")
-                    send_email(reservation_date, reservation_time, success=False) # Consistent with other failure emails
-                    raise Exception(f"Failed to navigate directly to tee sheet. Date: {reservation_date}, Course: {course}")
-            logger.log("Successfully navigated to tee sheet.")
-            time.sleep(random.uniform(1.0, 2.0)) # Pause for page to settle after navigation
-
-            logger.log("Proceeding with tee time selection...")
-            try:
-                with logger.context("select_tee_time"):
-                    success, actual_time = select_tee_time(sb, reservation_time, time_slot_range, refresh_time, logger)
-                if not success:
-                    logger.log("Failed to select tee time")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to select tee time")
-            except NoSlotWithinRange as e:
-                logger.log(f"No available tee times within the allowed range: {str(e)}")
-                send_email(reservation_date, reservation_time, success=False)
-                raise Exception(f"No available tee times within the allowed range: {str(e)}")
-            logger.log("Proceeding with player slot modification...")
-            with logger.context("modify_player_slot"):
-                if not modify_player_slot(sb):
-                    logger.log("Failed to modify player slot")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to modify player slot")
-            logger.log("Proceeding with confirmation popup...")
-            with logger.context("handle_confirmation_popup"):
-                if not handle_confirmation_popup(sb, reservation_time):
-                    logger.log("Failed to handle confirmation popup")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to handle confirmation popup")
-            logger.log("Proceeding with logout...")
-            with logger.context("handle_logout"):
-                if not handle_logout(sb):
-                    logger.log("Failed to complete logout process")
-                    send_email(reservation_date, reservation_time, success=False)
-                    raise Exception("Failed to complete logout process")
+        lead_seconds = get_prestage_lead_seconds()
+        wait_until_prestage_start(refresh_time, lead_seconds, logger)
+        ctx.check_lease()
+        profile_dir = store.acquire_profile() if store is not None else None
+        with browser_session(get_browser_options(profile_dir), logger, ctx.timings) as sb:
+            with logger.context("prestage_session"):
+                readiness = prestage_session(sb, ctx, url, reservation_date, reservation_time, course, refresh_time, store)
+            logger.log(f"Pre-stage readiness (s before unlock, lead {lead_seconds} s): {readiness}")
+            ctx.check_lease()
+            if readiness["navigate_to_tee_sheet"] < 0:
+                logger.log("WARNING: pre-stage finished after the unlock instant; consider a larger PRESTAGE_LEAD_SECONDS")
+
+            if get_sheet_refresh_mode() == "http":
+                try:
+                    ctx.http_engine = DirectHttpEngine.from_browser(sb, FORETEES_BASE_URL)
+                    logger.log("Exported browser session to the direct-HTTP engine")
+                except Exception as e:
+                    logger.log(f"Could not start direct-HTTP engine, using browser flow: {e}")
+
+            park_on_tee_sheet(sb, ctx, reservation_date, course, refresh_time)
+            ctx.check_lease()
+
+            # Unlock-critical window: from the unlock wait to the confirmed booking
+            with ctx.critical_window():
+                logger.log("Proceeding with tee time selection...")
+                try:
+                    with logger.context("select_tee_time"):
+                        success, actual_time = select_tee_time(sb, ctx, reservation_time, time_slot_range, refresh_time, get_fire_offset_ms(course))
+                    if not success:
+                        logger.log("Failed to select tee time")
+                        notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+                        raise Exception("Failed to select tee time")
+                except NoSlotWithinRange as e:
+                    logger.log(f"No available tee times within the allowed range: {str(e)}")
+                    notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+                    raise Exception(f"No available tee times within the allowed range: {str(e)}")
+                # Last point at which another instance's claim, or a faster
+                # hedge of this one, can stop us before a booking is submitted
+                ctx.check_lease()
+                if ctx.hedge is not None:
+                    claim_hedge_hold(sb, ctx, actual_time)
+                logger.log("Proceeding with player slot modification...")
+                with logger.context("modify_player_slot"):
+                    if not modify_player_slot(sb, ctx):
+                        logger.log("Failed to modify player slot")
+                        notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+                        raise Exception("Failed to modify player slot")
+                logger.log("Proceeding with confirmation popup...")
+                with logger.context("handle_confirmation_popup"):
+                    if not handle_confirmation_popup(sb, ctx, reservation_time):
+                        logger.log("Failed to handle confirmation popup")
+                        notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+                        raise Exception("Failed to handle confirmation popup")
+            if not end_session(sb, ctx, store):
+                notify_attempt_result(ctx, reservation_date, reservation_time, success=False)
+                raise Exception("Failed to complete logout process")
             logger.log("Successfully completed all navigation steps")
             sb.wait_for_element_present("body", timeout=2)  # Brief pause before closing
-            send_email(reservation_date, reservation_time, actual_time, success=True)
+            ctx.booked_time = actual_time
+            notify_attempt_result(ctx, reservation_date, reservation_time, actual_time, success=True)
     except Exception as e:
         logger.log(f"An error occurred: {str(e)} | Error type: {type(e).__name__}")
         raise
     finally:
-        logger.close_and_upload()
+        if store is not None:
+            store.release_profile()
+        # Drains queued screenshot uploads before the attempt log is uploaded
+        ctx.close()
 
 # This section is only for testing the script directly
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+import threading
+
+# Bucket upper bounds in seconds; wide enough for both sub-second clicks and multi-minute logins
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge:
+    """Last-value gauge with a fixed set of label names."""
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def drain(self):
+        """
+        Remove and return every series observed so far, as picklable dicts
+        ("labels", "counts", "sum", "count") that merge() adds to a histogram
+        in another process.
+        """
+        with self._lock:
+            series, self._series = self._series, {}
+        return [{"labels": list(key), **s} for key, s in sorted(series.items())]
+
+    def merge(self, drained):
+        """Add series returned by another process's drain() of the same histogram."""
+        key = tuple(str(v) for v in drained["labels"])
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            series["counts"] = [a + b for a, b in zip(series["counts"], drained["counts"])]
+            series["sum"] += drained["sum"]
+            series["count"] += drained["count"]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = _format_labels(self.labelnames, key)
+                for bound, count in zip(self.buckets, series["counts"]):
+                    bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {series['count']}")
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class Registry:
+    """Process-wide collection of metrics rendered in the Prometheus text format."""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+PHASE_DURATION = REGISTRY.register(Histogram(
+    "teetime_phase_duration_seconds",
+    "Duration of each booking phase timed by AttemptLogger.context",
+    ("phase", "course", "outcome")))
+UNLOCK_TO_CLICK = REGISTRY.register(Histogram(
+    "teetime_unlock_to_click_seconds",
+    "Time from the unlock instant to the accepted tee time click",
+    ("course", "outcome")))
+IDLE_TIME = REGISTRY.register(Histogram(
+    "teetime_attempt_idle_seconds",
+    "Time an attempt spent in WaitPolicy pauses and condition waits",
+    ("course", "profile")))
+BROWSER_LEASE = REGISTRY.register(Histogram(
+    "teetime_browser_lease_seconds",
+    "Time to obtain a browser for an attempt, by whether it had to be launched",
+    ("launched",)))
+SCHEDULER_LATENESS = REGISTRY.register(Histogram(
+    "teetime_scheduler_wake_lateness_seconds",
+    "How late the activation scheduler woke relative to a reservation's wake time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+SCHEDULER_QUEUE = REGISTRY.register(Gauge(
+    "teetime_scheduler_pending",
+    "Reservations currently scheduled by the activation scheduler"))
+HEDGE_MARGIN = REGISTRY.register(Histogram(
+    "teetime_hedge_margin_seconds",
+    "How far the winning hedge held its slot ahead of the closest losing hedge",
+    ("course",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+STORAGE_LATENCY = REGISTRY.register(Histogram(
+    "teetime_storage_operation_seconds",
+    "Latency of Azure Table and Blob operations, retries included",
+    ("service", "method", "status"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)))
+SCREENSHOT_UPLOAD = REGISTRY.register(Histogram(
+    "teetime_screenshot_upload_seconds",
+    "Blob upload time of each screenshot"))
+ATTEMPTS = REGISTRY.register(Counter(
+    "teetime_reservation_attempts_total",
+    "Reservation attempts by course and outcome",
+    ("course", "outcome")))
+RETRIES = REGISTRY.register(Counter(
+    "teetime_reservation_retries_total",
+    "Failed attempts that were re-queued for another try",
+    ("course",)))
+FAILURES = REGISTRY.register(Counter(
+    "teetime_reservation_failures_total",
+    "Failed attempts by reason",
+    ("reason",)))
+CLOCK_OFFSET = REGISTRY.register(Gauge(
+    "teetime_clock_offset_ms",
+    "Latest NTP clock-offset estimate reported by an attempt (true = local + offset)"))
+CLOCK_UNCERTAINTY = REGISTRY.register(Gauge(
+    "teetime_clock_offset_uncertainty_ms",
+    "Uncertainty of the latest NTP clock-offset estimate"))
+SERVER_CLOCK_OFFSET = REGISTRY.register(Gauge(
+    "teetime_foretees_clock_offset_ms",
+    "Latest ForeTees server-clock offset estimated from Date headers (server = local + offset)"))
+
+# Error-message fragments (from open_website) mapped to a failure reason label
+FAILURE_REASONS = (
+    ("No available tee times", "no_slot"),
+    ("captcha", "captcha"),
+    ("Member Login", "member_login"),
+    ("login process", "login"),
+    ("Fore Tees", "fore_tees"),
+    ("ForeTees navigation", "foretees_navigation"),
+    ("tee sheet", "tee_sheet"),
+    ("select tee time", "select_tee_time"),
+    ("player slot", "modify_player_slot"),
+    ("confirmation popup", "confirmation_popup"),
+    ("logout", "logout"),
+    ("worker crashed", "worker_crash"),
+    ("held by hedge", "hedge_lost"),
+)
+
+def classify_failure(error_message):
+    """Map an attempt's error message to a low-cardinality failure reason."""
+    lowered = (error_message or "").lower()
+    for fragment, reason in FAILURE_REASONS:
+        if fragment.lower() in lowered:
+            return reason
+    return "other"
+
+def record_attempt(course, outcome, metrics, error_message=None):
+    """
+    Record the metrics reported by one finished attempt.
+
+    Args:
+        course (str): Reservation course.
+        outcome (str): Final status for the attempt ("executed", "pending", "failed").
+        metrics (dict): "phases" [[label, seconds], ...], optional
+            "unlock_to_click_seconds", "clock_offset_ms", "clock_uncertainty_ms",
+            "server_clock_offset_ms", "screenshot_upload_ms" [ms, ...] and
+            "idle" (WaitPolicy.stats()), "browser_lease_ms", "browser_launch_ms",
+            "hedge_margin_ms" and "storage_latency" (the worker's drained
+            STORAGE_LATENCY series).
+    """
+    ATTEMPTS.inc(course=course, outcome=outcome)
+    for label, seconds in metrics.get("phases", []):
+        PHASE_DURATION.observe(seconds, phase=label, course=course, outcome=outcome)
+    if metrics.get("unlock_to_click_seconds") is not None:
+        UNLOCK_TO_CLICK.observe(metrics["unlock_to_click_seconds"], course=course, outcome=outcome)
+    if metrics.get("clock_offset_ms") is not None:
+        CLOCK_OFFSET.set(metrics["clock_offset_ms"])
+        CLOCK_UNCERTAINTY.set(metrics["clock_uncertainty_ms"])
+    if metrics.get("server_clock_offset_ms") is not None:
+        SERVER_CLOCK_OFFSET.set(metrics["server_clock_offset_ms"])
+    if metrics.get("idle"):
+        IDLE_TIME.observe(metrics["idle"]["idle_s"], course=course, profile=metrics["idle"]["profile"])
+    if metrics.get("browser_lease_ms") is not None:
+        launched = "true" if metrics.get("browser_launch_ms") else "false"
+        BROWSER_LEASE.observe(metrics["browser_lease_ms"] / 1000, launched=launched)
+    if metrics.get("hedge_margin_ms") is not None:
+        HEDGE_MARGIN.observe(metrics["hedge_margin_ms"] / 1000, course=course)
+    for upload_ms in metrics.get("screenshot_upload_ms", []):
+        SCREENSHOT_UPLOAD.observe(upload_ms / 1000)
+    for series in metrics.get("storage_latency", []):
+        STORAGE_LATENCY.merge(series)
+    if outcome != "executed":
+        FAILURES.inc(reason=classify_failure(error_message))
+    if outcome == "pending":
+        RETRIES.inc(course=course)
@@ -0,0 +1,307 @@
+import time
+import hashlib
+import statistics
+
+# Helper functions installed once per ForeTees page load as window.__tt.
+# Each entry is the source of one function; `this` is the library object,
+# async functions take the WebDriver callback as their last parameter.
+LIBRARY_FUNCTIONS = {
+    # Extract every open tee time in range in one pass, ranked exact match
+    # first and then by distance, and keep the elements for awaitPopup.
+    "rankSlots": """function (xpath, targ, maxm) {
+    var snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var found = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) {
+        var el = snapshot.snapshotItem(i);
+        var txt = el.textContent.trim();
+        var minutes = this.toMinutes(txt);
+        if (minutes !== null && minutes >= targ && minutes <= maxm) {
+            found.push({el: el, text: txt, distance: minutes - targ, order: i});
+        }
+    }
+    found.sort(function (a, b) { return (a.distance - b.distance) || (a.order - b.order); });
+    this.candidates = found.map(function (c) { return c.el; });
+    return found.map(function (c) { return c.text; });
+}""",
+
+    # parse "H:MM AM/PM" into minutes since midnight
+    "toMinutes": """function (txt) {
+    var m = txt.match(/(\\d+):(\\d+)\\s*(AM|PM)/i);
+    if (!m) { return null; }
+    var h = parseInt(m[1], 10), mm = parseInt(m[2], 10), ap = m[3].toUpperCase();
+    if (ap === 'PM' && h < 12) { h += 12; }
+    if (ap === 'AM' && h === 12) { h = 0; }
+    return h * 60 + mm;
+}""",
+
+    # Resolve as soon as the "Yes, Continue" / "Go Back" dialog appears:
+    # check once, then wait on a MutationObserver. Buttons are matched by
+    # their text among the visible buttons of a jQuery UI dialog, so the
+    # dialog's position in the page does not matter. With a candidate index
+    # the ranked slot is clicked first, in the same call.
+    "awaitPopup": """function (maxWait, candidate, done) {
+    var t0 = performance.now(), finished = false, observer = null, timer = null;
+    function find(pattern) {
+        var buttons = document.querySelectorAll('.ui-dialog button, .ui-dialog [role="button"]');
+        for (var i = 0; i < buttons.length; i++) {
+            var b = buttons[i];
+            if (b.getClientRects().length && pattern.test(b.textContent.replace(/\\s+/g, ' ').trim())) { return b; }
+        }
+        return null;
+    }
+    function finish(status) {
+        if (finished) { return; }
+        finished = true;
+        if (observer) { observer.disconnect(); }
+        if (timer) { clearTimeout(timer); }
+        done({status: status, elapsed_ms: Math.round((performance.now() - t0) * 10) / 10});
+    }
+    function check() {
+        var yes = find(/^yes,? continue$/i);
+        if (yes) { yes.click(); finish('continue'); return true; }
+        var back = find(/^go back$/i);
+        if (back) { back.click(); finish('go_back'); return true; }
+        return false;
+    }
+    if (candidate !== null) {
+        var el = (this.candidates || [])[candidate];
+        if (!el || !el.isConnected) { finish('missing'); return; }
+        el.click();
+    }
+    if (check()) { return; }
+    observer = new MutationObserver(function () { check(); });
+    observer.observe(document.body, {childList: true, subtree: true, attributes: true,
+                                     attributeFilter: ['style', 'class']});
+    timer = setTimeout(function () { finish('timeout'); }, maxWait);
+}""",
+
+    # Poll the sheet URL with fetch(), parse it off-DOM and, once any row has
+    # open slots, swap the fetched rows into the live page: every element
+    # holding rows is replaced by its counterpart (the sheet may split its
+    # rows over several containers), or nothing is swapped if they differ.
+    "pollSheet": """function (url, windowMs, intervalMs, done) {
+    var start = performance.now(), polls = 0, fetchMs = [];
+    function rowContainers(root) {
+        var out = [];
+        root.querySelectorAll('div.rwdTr').forEach(function (row) {
+            if (row.parentNode && out.indexOf(row.parentNode) === -1) { out.push(row.parentNode); }
+        });
+        return out;
+    }
+    function openTimes(root) {
+        var out = [];
+        root.querySelectorAll('div.rwdTr').forEach(function (row) {
+            if (!row.querySelector('div.slotCount.openSlots4')) { return; }
+            row.querySelectorAll('a.teetime_button').forEach(function (a) { out.push(a.textContent.trim()); });
+        });
+        return out;
+    }
+    function finish(open, swapped) {
+        done({open: open, swapped: swapped, polls: polls, fetch_ms: fetchMs,
+              elapsed_ms: Math.round(performance.now() - start)});
+    }
+    function next() {
+        if (performance.now() - start >= windowMs) { finish([], false); return; }
+        setTimeout(poll, intervalMs);
+    }
+    function poll() {
+        var t0 = performance.now();
+        polls += 1;
+        fetch(url, {cache: 'no-store', credentials: 'same-origin'})
+            .then(function (r) { return r.text(); })
+            .then(function (html) {
+                fetchMs.push(Math.round(performance.now() - t0));
+                var doc = new DOMParser().parseFromString(html, 'text/html');
+                var open = openTimes(doc);
+                if (!open.length) { next(); return; }
+                var live = rowContainers(document), fetched = rowContainers(doc);
+                var swapped = false;
+                if (live.length && live.length === fetched.length) {
+                    for (var i = 0; i < live.length; i++) { live[i].innerHTML = fetched[i].innerHTML; }
+                    swapped = true;
+                }
+                finish(open, swapped);
+            })
+            .catch(function (e) { fetchMs.push(-1); next(); });
+    }
+    poll();
+}""",
+
+    # Fill the held slot form: WLK for row 0, then for rows 1.. the TBD tab,
+    # its X entry and WLK. Each step waits for the DOM change it expects and
+    # the final form state is read back for verification.
+    "fillPlayers": """function (rows, stepTimeout, done) {
+    var t0 = performance.now(), steps = [];
+    function q(sel) { return document.querySelector(sel); }
+    function waitFor(check, label) {
+        return new Promise(function (resolve, reject) {
+            var start = performance.now();
+            (function poll() {
+                var found = check();
+                if (found) { steps.push([label, Math.round(performance.now() - start)]); resolve(found); return; }
+                if (performance.now() - start > stepTimeout) { reject(new Error('timeout: ' + label)); return; }
+                setTimeout(poll, 20);
+            })();
+        });
+    }
+    function tbdX() {
+        var spans = document.querySelectorAll('.ftMs-guestTbd .ftMs-listItem span');
+        for (var i = 0; i < spans.length; i++) {
+            if (spans[i].textContent.indexOf('X') !== -1) { return spans[i]; }
+        }
+        return null;
+    }
+    function selectWalk(row) {
+        var rowSel = '#slot_player_row_' + row;
+        return waitFor(function () { return q(rowSel + ' .ftS-trasportCell'); }, 'transport cell ' + row)
+            .then(function (cell) {
+                cell.click();
+                return waitFor(function () { return q(rowSel + ' .transport_type'); }, 'transport select ' + row);
+            })
+            .then(function (select) {
+                var option = Array.prototype.find.call(select.options, function (o) { return o.text.trim() === 'WLK'; });
+                if (!option) { throw new Error('no WLK option in row ' + row); }
+                select.value = option.value;
+                select.dispatchEvent(new Event('input', {bubbles: true}));
+                select.dispatchEvent(new Event('change', {bubbles: true}));
+            });
+    }
+    function setTbd(row) {
+        return waitFor(function () { return q("div[data-fttab='.ftMs-guestTbd']"); }, 'tbd tab ' + row)
+            .then(function (tab) {
+                tab.click();
+                return waitFor(function () { return q('.ftMs-block.ftMs-guestTbd.active') && tbdX(); }, 'tbd entry ' + row);
+            })
+            .then(function (x) {
+                x.click();
+                return waitFor(function () { return q('#slot_player_row_' + row + '.playerTypeGuestTbd'); }, 'tbd row ' + row);
+            })
+            .then(function () { return selectWalk(row); });
+    }
+    function state() {
+        var out = [];
+        for (var row = 0; row < rows; row++) {
+            var el = q('#slot_player_row_' + row);
+            var select = el && el.querySelector('.transport_type');
+            var chosen = select && select.selectedIndex >= 0 ? select.options[select.selectedIndex].text.trim() : null;
+            out.push({row: row, tbd: !!(el && el.classList.contains('playerTypeGuestTbd')), transport: chosen});
+        }
+        return out;
+    }
+    var chain = selectWalk(0).then(function () {
+        return waitFor(function () { return q('.ftMs-memberSelect'); }, 'member select');
+    });
+    for (var r = 1; r < rows; r++) {
+        (function (row) { chain = chain.then(function () { return setTbd(row); }); })(r);
+    }
+    chain.then(function () { return null; }, function (e) { return e.message; }).then(function (error) {
+        done({error: error, rows: state(), steps: steps, elapsed_ms: Math.round(performance.now() - t0)});
+    });
+}""",
+
+    # Center the sheet row of a tee time (in any slot state) in the viewport.
+    "scrollToTime": """function (reservationTime) {
+    var rows = document.querySelectorAll('div.rwdTr');
+    for (var i = 0; i < rows.length; i++) {
+        var cells = rows[i].querySelectorAll('a, div.time_slot');
+        for (var j = 0; j < cells.length; j++) {
+            if (cells[j].textContent.trim() === reservationTime) {
+                rows[i].scrollIntoView({behavior: 'instant', block: 'center'});
+                return true;
+            }
+        }
+    }
+    return false;
+}""",
+}
+
+# Library functions another one calls, counted in its standalone size
+LIBRARY_DEPENDENCIES = {"rankSlots": ("toMinutes",)}
+
+LIBRARY_VERSION = hashlib.sha1("".join(LIBRARY_FUNCTIONS.values()).encode("utf-8")).hexdigest()[:10]
+
+INSTALL_SCRIPT = "window.__tt = {version: '%s', candidates: []%s};\n" % (
+    LIBRARY_VERSION,
+    "".join(f",\n{name}: {source}" for name, source in LIBRARY_FUNCTIONS.items()),
+)
+
+# Short per-call stubs; they report a missing or outdated library instead of failing
+CALL_SCRIPT = (
+    "var tt = window.__tt;"
+    "if (!tt || tt.version !== '%s') { return {__tt_missing: true}; }"
+    "return tt.%%s.apply(tt, arguments);" % LIBRARY_VERSION
+)
+ASYNC_CALL_SCRIPT = (
+    "var tt = window.__tt, done = arguments[arguments.length - 1];"
+    "if (!tt || tt.version !== '%s') { done({__tt_missing: true}); return; }"
+    "tt.%%s.apply(tt, arguments);" % LIBRARY_VERSION
+)
+
+class PageLibrary:
+    """
+    Calls into window.__tt, the helper library installed in the ForeTees tab.
+
+    Calls are short stubs naming a library function. The library is sent along
+    with the call whenever the page is known to be fresh (after `invalidate`)
+    and re-sent automatically when a stub finds it missing, i.e. navigation
+    cleared it. Every call records the bytes sent and its round-trip time so
+    the saving over sending the full function source each time can be reported.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self._installed = False
+        self.calls = {}  # name -> {"bytes": [...], "ms": [...], "injected_ms": [...]}
+
+    def invalidate(self):
+        """Mark the page as reloaded or navigated: the next call re-installs the library."""
+        self._installed = False
+
+    def call(self, sb, name, *args, async_script=False, timeout=None):
+        """
+        Invoke window.__tt.<name>(*args). Async functions get the WebDriver
+        callback as their last parameter; `timeout` sets the script timeout.
+        """
+        if timeout is not None:
+            sb.driver.set_script_timeout(timeout)
+        stub = (ASYNC_CALL_SCRIPT if async_script else CALL_SCRIPT) % name
+        execute = sb.driver.execute_async_script if async_script else sb.driver.execute_script
+        for retry in (False, True):
+            inject = retry or not self._installed
+            script = INSTALL_SCRIPT + stub if inject else stub
+            start = time.perf_counter()
+            result = execute(script, *args)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if isinstance(result, dict) and result.get("__tt_missing"):
+                self._installed = False
+                continue
+            self._installed = True
+            self._record(name, len(script), elapsed_ms, inject)
+            return result
+        raise RuntimeError(f"window.__tt.{name} unavailable after re-injection")
+
+    def _record(self, name, sent_bytes, elapsed_ms, injected):
+        entry = self.calls.setdefault(name, {"bytes": [], "ms": [], "injected_ms": []})
+        entry["bytes"].append(sent_bytes)
+        (entry["injected_ms"] if injected else entry["ms"]).append(elapsed_ms)
+        self.logger.log(f"__tt.{name} sent {sent_bytes} bytes in {elapsed_ms:.1f} ms"
+                        + (" (with library)" if injected else ""),
+                        event="page_lib", name=name, bytes=sent_bytes, ms=round(elapsed_ms, 2), injected=injected)
+
+    def summary(self):
+        """
+        Per function: calls, average bytes sent against the standalone source
+        size, and median call time with and without the library attached.
+        """
+        report = {}
+        for name, entry in self.calls.items():
+            standalone = sum(len(LIBRARY_FUNCTIONS[n]) for n in (name,) + LIBRARY_DEPENDENCIES.get(name, ()))
+            stub = min(entry["bytes"])
+            report[name] = {
+                "calls": len(entry["bytes"]),
+                "avg_bytes_sent": round(statistics.mean(entry["bytes"])),
+                "standalone_bytes": standalone,
+                "bytes_saved_per_stub_call": standalone - stub,
+                "median_ms": round(statistics.median(entry["ms"]), 2) if entry["ms"] else None,
+                "median_ms_with_library": round(statistics.median(entry["injected_ms"]), 2) if entry["injected_ms"] else None,
+            }
+        return report
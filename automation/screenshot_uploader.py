@@ -0,0 +1,108 @@
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+
+_STOP = object()
+
+class ScreenshotUploader:
+    """
+    Background uploader for in-memory screenshots of a single attempt.
+
+    `submit` only enqueues the image bytes, so the browser flow never waits on
+    Azure Blob. The queue is bounded: when it is full `submit` blocks for up to
+    `put_timeout` seconds (back-pressure) and then drops the frame. `drain`
+    uploads everything still queued before the attempt finishes.
+    Frames of a hedged attempt are named "h<hedge>_..." so sibling hedges
+    sharing the attempt folder never overwrite each other's uploads.
+    """
+    def __init__(self, blob_service, reservation_folder, attempt, max_queue=None, put_timeout=5.0, hedge=None):
+        self.blob_service = blob_service
+        self.reservation_folder = reservation_folder
+        self.attempt = attempt
+        self.name_prefix = f"h{hedge}_" if hedge is not None else ""
+        if max_queue is None:
+            max_queue = int(os.getenv("SCREENSHOT_QUEUE_SIZE", "32"))
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.upload_ms = []   # wall time of each blob upload
+        self.queued_ms = []   # time from submit to upload finished
+        self.failed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=f"screenshot-uploader-{reservation_folder}", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_bytes, method_name, extension="png", captured_at=None):
+        """Queue an image for upload. Returns False if the frame had to be dropped."""
+        item = (image_bytes, method_name, extension, captured_at or datetime.now(), time.perf_counter())
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logging.error(f"Screenshot upload queue full, dropped {method_name}")
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                image_bytes, method_name, extension, captured_at, submitted = item
+                start = time.perf_counter()
+                try:
+                    self.blob_service.upload_screenshot(image_bytes, self.name_prefix + method_name, self.reservation_folder, self.attempt, captured_at, extension)
+                    end = time.perf_counter()
+                    with self._lock:
+                        self.upload_ms.append((end - start) * 1000)
+                        self.queued_ms.append((end - submitted) * 1000)
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    logging.error(f"Failed to upload screenshot {method_name}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def drain(self, timeout=60):
+        """
+        Wait for every queued screenshot to be uploaded, then stop the worker.
+        Returns True if the queue emptied within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logging.error("Screenshot upload queue did not accept stop marker before timeout")
+            return False
+        self._thread.join(max(0, deadline - time.monotonic()))
+        drained = not self._thread.is_alive()
+        if not drained:
+            logging.error(f"Screenshot uploads still pending after {timeout} s")
+        return drained
+
+    def stats(self):
+        """Summary of upload latencies (ms) and counts for this attempt."""
+        with self._lock:
+            upload_ms = sorted(self.upload_ms)
+            queued_ms = sorted(self.queued_ms)
+            failed, dropped = self.failed, self.dropped
+
+        def pct(values, p):
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(len(values) * p))], 1)
+
+        return {
+            "uploaded": len(upload_ms),
+            "failed": failed,
+            "dropped": dropped,
+            "upload_ms_p50": pct(upload_ms, 0.5),
+            "upload_ms_max": pct(upload_ms, 1.0),
+            "queued_ms_p50": pct(queued_ms, 0.5),
+            "queued_ms_max": pct(queued_ms, 1.0),
+        }
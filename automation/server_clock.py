@@ -0,0 +1,99 @@
+import os
+import logging
+import statistics
+from email.utils import parsedate_to_datetime
+
+# Runs in the ForeTees tab: sequential same-origin requests, each bracketed by
+# local Date.now() readings, returning [sent_ms, received_ms, Date header].
+SAMPLE_SCRIPT = """
+var url = arguments[0], count = arguments[1], intervalMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var samples = [];
+function one(i) {
+    if (i >= count) { done(samples); return; }
+    var t0 = Date.now();
+    fetch(url, {method: 'HEAD', cache: 'no-store', credentials: 'same-origin'})
+        .then(function (r) {
+            var t1 = Date.now();
+            samples.push([t0, t1, r.headers.get('Date')]);
+        })
+        .catch(function (e) { samples.push([t0, Date.now(), null]); })
+        .then(function () { setTimeout(function () { one(i + 1); }, intervalMs); });
+}
+one(0);
+"""
+
+class ServerClockEstimator:
+    """
+    Estimate of the ForeTees server clock relative to the local clock.
+
+    The HTTP Date header only has one-second resolution, but it bounds the
+    offset: a header reading D received for a request sent at local t0 and
+    answered by t1 means D <= local + offset < D + 1 for some local time in
+    [t0, t1], i.e. D - t1 < offset < D + 1 - t0. Intersecting those intervals
+    over samples taken at varied sub-second phases narrows the estimate well
+    below one second. Offsets follow ClockOffsetService: server = local + offset.
+    """
+    def __init__(self):
+        self.samples = []   # (t0_s, t1_s, date_epoch_s)
+        self.history = []   # estimate after each sampling batch
+
+    def sample(self, sb, url=None, count=None, interval_ms=None):
+        """Collect a batch of samples from the browser tab and update the estimate."""
+        if count is None:
+            count = int(os.getenv("SERVER_CLOCK_SAMPLES", "12"))
+        if interval_ms is None:
+            # Deliberately not a divisor of 1000 so samples land at varied sub-second phases
+            interval_ms = int(os.getenv("SERVER_CLOCK_INTERVAL_MS", "137"))
+        if url is None:
+            url = sb.get_current_url()
+        # The batch outlasts the usual script timeout; later async scripts get theirs back
+        previous_timeout = sb.driver.timeouts.script
+        sb.driver.set_script_timeout(max(30, count * (interval_ms + 2000) / 1000))
+        try:
+            raw = sb.driver.execute_async_script(SAMPLE_SCRIPT, url, count, interval_ms)
+        finally:
+            sb.driver.set_script_timeout(previous_timeout)
+        for t0_ms, t1_ms, date_header in raw:
+            if not date_header:
+                continue
+            try:
+                date_epoch = parsedate_to_datetime(date_header).timestamp()
+            except (TypeError, ValueError):
+                logging.warning(f"Unparseable Date header from ForeTees: {date_header!r}")
+                continue
+            self.samples.append((t0_ms / 1000.0, t1_ms / 1000.0, date_epoch))
+        estimate = self.estimate()
+        if estimate:
+            self.history.append(estimate)
+        return estimate
+
+    def estimate(self):
+        """
+        Current estimate as {"offset_s", "uncertainty_s", "samples", "consistent"},
+        or None before any usable sample.
+        """
+        if not self.samples:
+            return None
+        lo = max(date - t1 for t0, t1, date in self.samples)
+        hi = min(date + 1 - t0 for t0, t1, date in self.samples)
+        if lo <= hi:
+            return {
+                "offset_s": (lo + hi) / 2,
+                "uncertainty_s": (hi - lo) / 2,
+                "samples": len(self.samples),
+                "consistent": True,
+            }
+        # Bounds disagree (server clock stepped or a proxy rewrote Date):
+        # fall back to the median of per-sample midpoints with a wide error bar.
+        mids = [date + 0.5 - (t0 + t1) / 2 for t0, t1, date in self.samples]
+        return {
+            "offset_s": statistics.median(mids),
+            "uncertainty_s": 0.5 + max(t1 - t0 for t0, t1, _ in self.samples) / 2,
+            "samples": len(self.samples),
+            "consistent": False,
+        }
+
+def get_max_server_clock_uncertainty_s():
+    """Largest server-clock uncertainty still trusted over NTP (SERVER_CLOCK_MAX_UNCERTAINTY_MS)."""
+    return float(os.getenv("SERVER_CLOCK_MAX_UNCERTAINTY_MS", "250")) / 1000.0
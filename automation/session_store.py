@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+
+def is_session_reuse_enabled():
+    """SESSION_REUSE=1 keeps a cookie jar (and Chrome profile) per club account across attempts."""
+    return os.getenv("SESSION_REUSE", "0") == "1"
+
+class SessionStore:
+    """
+    Saved browser session for one club account.
+
+    The cookie jar holds every cookie of the parked browser (session cookies
+    included, which a Chrome profile alone would drop on restart) and is
+    written atomically after a successful pre-stage, under an exclusive lock
+    since concurrent attempts on the account share it. The optional persistent
+    Chrome user-data directory is guarded by an exclusive lock, since Chrome
+    refuses to share a profile between two running instances; a concurrent
+    attempt for the same account simply launches without it.
+    """
+    def __init__(self, account, base_dir=None, max_age=None):
+        if base_dir is None:
+            base_dir = os.getenv("SESSION_DIR", "/app/browser_data")
+        if max_age is None:
+            max_age = float(os.getenv("SESSION_MAX_AGE_SECONDS", "3600"))
+        self.account = account or "default"
+        self.dir = os.path.join(base_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', self.account))
+        self.jar_path = os.path.join(self.dir, "cookies.json")
+        self.profile_dir = os.path.join(self.dir, "profile")
+        self.max_age = max_age
+        self.restored = None   # cookies last loaded into a browser by restore_cookies
+        self._lock_file = None
+        os.makedirs(self.dir, exist_ok=True)
+
+    def load_cookies(self):
+        """Saved cookies, or None when there is no jar or it is older than max_age."""
+        try:
+            with open(self.jar_path, 'r') as f:
+                jar = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - jar.get("saved_at", 0) > self.max_age:
+            logging.info(f"Saved session for {self.account} is older than {self.max_age:.0f} s, ignoring")
+            return None
+        return jar.get("cookies") or None
+
+    def save_cookies(self, sb):
+        """Write all cookies of the running browser to the jar. Returns the number saved."""
+        cookies = sb.driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        self.write_jar(cookies)
+        return len(cookies)
+
+    def write_jar(self, cookies):
+        """Replace the jar with `cookies`, serialized against other writers of this account."""
+        tmp_path = f"{self.jar_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._jar_lock():
+            with open(tmp_path, 'w') as f:
+                json.dump({"saved_at": time.time(), "cookies": cookies}, f)
+            os.replace(tmp_path, self.jar_path)
+
+    @contextmanager
+    def _jar_lock(self):
+        with open(os.path.join(self.dir, "cookies.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def restore_cookies(self, sb):
+        """Load the jar into the running browser. Returns the number restored (0 if none)."""
+        cookies = self.load_cookies()
+        if not cookies:
+            return 0
+        # Network.setCookies takes CookieParam, a subset of the Cookie fields getAllCookies returns
+        allowed = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+        params = []
+        for cookie in cookies:
+            param = {k: cookie[k] for k in allowed if k in cookie}
+            if cookie.get("session"):
+                param.pop("expires", None)
+            params.append(param)
+        sb.driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+        self.restored = cookies
+        return len(params)
+
+    def clear(self, stale=None):
+        """
+        Forget the saved cookies (e.g. after they stopped working). With
+        `stale`, only if the jar still holds those cookies, so a session another
+        attempt saved meanwhile is kept.
+        """
+        with self._jar_lock():
+            if stale is not None:
+                try:
+                    with open(self.jar_path, 'r') as f:
+                        if json.load(f).get("cookies") != stale:
+                            return
+                except (OSError, ValueError):
+                    pass
+            try:
+                os.remove(self.jar_path)
+            except FileNotFoundError:
+                pass
+
+    def acquire_profile(self):
+        """
+        Lock and return the persistent user-data directory when
+        SESSION_USER_DATA_DIR=1, or None if disabled or in use by another attempt.
+        """
+        if os.getenv("SESSION_USER_DATA_DIR", "0") != "1":
+            return None
+        lock_file = open(os.path.join(self.dir, "profile.lock"), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logging.info(f"Chrome profile for {self.account} is in use, launching without it")
+            return None
+        self._lock_file = lock_file
+        os.makedirs(self.profile_dir, exist_ok=True)
+        return self.profile_dir
+
+    def release_profile(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
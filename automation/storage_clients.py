@@ -0,0 +1,202 @@
+import os
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from requests.adapters import HTTPAdapter
+import requests
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+from azure.core.pipeline.transport import RequestsTransport
+from azure.data.tables import TableClient
+from azure.storage.blob import BlobServiceClient
+from .metrics import STORAGE_LATENCY
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid {name}, using {default}")
+        return default
+
+def is_async_storage_enabled():
+    """STORAGE_ASYNC=1 issues batches of point reads concurrently on the shared aio Table client."""
+    return os.getenv("STORAGE_ASYNC", "0") == "1"
+
+class StorageLatencyPolicy(SansIOHTTPPolicy):
+    """
+    Times storage operations and records them in
+    teetime_storage_operation_seconds. On table clients it runs per call
+    (retries included); the blob pipeline takes no extra policies, so there it
+    runs through its raw_request_hook/raw_response_hook and times each try.
+    Operations slower than STORAGE_SLOW_MS are logged at INFO, the rest at DEBUG.
+    """
+    def __init__(self, service):
+        self.service = service
+        self.slow_ms = _env_number("STORAGE_SLOW_MS", 250)
+
+    def on_request(self, request):
+        request.context["storage_start"] = time.perf_counter()
+
+    def on_response(self, request, response):
+        self._record(request, str(response.http_response.status_code))
+
+    def on_exception(self, request):
+        self._record(request, "error")
+
+    def on_raw_response(self, response):
+        # raw_response_hook form of on_response; the response shares the request's context
+        self._record(response, str(response.http_response.status_code))
+
+    def _record(self, request, status):
+        start = request.context.get("storage_start")
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        method = request.http_request.method
+        STORAGE_LATENCY.observe(elapsed_ms / 1000, service=self.service, method=method, status=status)
+        path = request.http_request.url.split('?', 1)[0]
+        logging.log(logging.INFO if elapsed_ms >= self.slow_ms else logging.DEBUG,
+                    f"Storage {self.service} {method} {path} -> {status} in {elapsed_ms:.1f} ms")
+
+def _build_transport(session=None):
+    """
+    A RequestsTransport over one shared requests.Session whose connection pool
+    is sized by STORAGE_POOL_CONNECTIONS (hosts) and STORAGE_POOL_MAXSIZE
+    (connections per host), with STORAGE_CONNECTION_TIMEOUT and
+    STORAGE_READ_TIMEOUT in seconds.
+    """
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=_env_number("STORAGE_POOL_CONNECTIONS", 4, int),
+            pool_maxsize=_env_number("STORAGE_POOL_MAXSIZE", 32, int),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)  # Azurite
+    return RequestsTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=_env_number("STORAGE_CONNECTION_TIMEOUT", 5),
+        read_timeout=_env_number("STORAGE_READ_TIMEOUT", 30),
+    )
+
+_clients = {}
+_clients_lock = threading.RLock()  # factories may fetch the shared transport
+
+def _shared(name, factory):
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+def get_storage_transport():
+    """This process's pooled transport, shared by every table and blob client."""
+    return _shared("transport", _build_transport)
+
+def build_table_client(table_name, transport):
+    # Built directly rather than through TableServiceClient.get_table_client,
+    # which rebuilds the pipeline without per_call_policies
+    return TableClient.from_connection_string(
+        conn_str=os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
+        table_name=table_name,
+        transport=transport,
+        per_call_policies=[StorageLatencyPolicy("table")],
+    )
+
+def build_blob_service_client(transport):
+    # The blob pipeline ignores per_call_policies; its raw request/response
+    # hooks run on every try and stay on the pipeline that the container and
+    # blob clients derived from it share. Transport errors are not timed there.
+    timer = StorageLatencyPolicy("blob")
+    return BlobServiceClient.from_connection_string(
+        os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
+        transport=transport,
+        raw_request_hook=timer.on_request,
+        raw_response_hook=timer.on_raw_response,
+    )
+
+def get_table_client(table_name=None):
+    """Shared TableClient for `table_name` (default AZURE_STORAGE_TABLE_NAME); safe to use from any thread."""
+    table_name = table_name or os.getenv("AZURE_STORAGE_TABLE_NAME")
+    return _shared(f"table:{table_name}", lambda: build_table_client(table_name, get_storage_transport()))
+
+def get_blob_service_client():
+    """This process's BlobServiceClient, reusing pooled connections across uploads and reads."""
+    return _shared("blob_service", lambda: build_blob_service_client(get_storage_transport()))
+
+class _AsyncTables:
+    """
+    The process's aio Table clients, on an event loop that runs in its own
+    thread for the life of the process. An aio client's aiohttp session is
+    bound to its loop, so keeping the loop keeps the session and its
+    connections warm across batches instead of opening them for each one.
+    """
+    def __init__(self):
+        from azure.data.tables.aio import TableClient as AsyncTableClient  # ImportError without aiohttp
+        self._client_class = AsyncTableClient
+        self._clients = {}
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="storage-aio", daemon=True).start()
+        atexit.register(self.close)
+
+    def client(self, table_name):
+        # Only called on the loop thread, so it needs no lock
+        if table_name not in self._clients:
+            self._clients[table_name] = self._client_class.from_connection_string(
+                conn_str=os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
+                table_name=table_name,
+                per_call_policies=[StorageLatencyPolicy("table")],
+            )
+        return self._clients[table_name]
+
+    def run(self, coroutine):
+        """Run `coroutine` on the loop from any other thread and return its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        """Close every client's session and stop the loop."""
+        async def close_all():
+            for client in self._clients.values():
+                await client.close()
+            self._clients.clear()
+        if self.loop.is_running():
+            self.run(close_all())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+def get_entities(keys, table_name=None):
+    """
+    Point-read every (partition_key, row_key) in `keys`, returning entities (None
+    when missing) in the same order. With STORAGE_ASYNC=1 the reads run
+    concurrently on the shared aio TableClient (aiohttp is in requirements.txt);
+    if the aio client cannot be imported they fall back to reading one after
+    another on the shared client, as they do with STORAGE_ASYNC unset.
+    """
+    keys = list(keys)
+    table_name = table_name or os.getenv("AZURE_STORAGE_TABLE_NAME")
+    if len(keys) > 1 and is_async_storage_enabled():
+        try:
+            tables = _shared("aio_tables", _AsyncTables)
+        except ImportError as e:
+            logging.warning(f"Async storage client unavailable, reading sequentially: {e}")
+        else:
+            return tables.run(_get_entities_async(tables, keys, table_name))
+    client = get_table_client(table_name)
+    entities = []
+    for partition_key, row_key in keys:
+        try:
+            entities.append(client.get_entity(partition_key=partition_key, row_key=row_key))
+        except ResourceNotFoundError:
+            entities.append(None)
+    return entities
+
+async def _get_entities_async(tables, keys, table_name):
+    client = tables.client(table_name)
+
+    async def get_one(partition_key, row_key):
+        try:
+            return await client.get_entity(partition_key=partition_key, row_key=row_key)
+        except ResourceNotFoundError:
+            return None
+    return await asyncio.gather(*(get_one(pk, rk) for pk, rk in keys))
@@ -0,0 +1,65 @@
+import os
+import time
+import logging
+
+# Last stretch (ms) before the deadline that is busy-waited instead of slept
+DEFAULT_SPIN_MS = 5.0
+
+def get_fire_offset_ms(course):
+    """
+    Firing offset in milliseconds for a course: negative fires early, positive late.
+    Reads FIRE_OFFSET_MS_<COURSE> (e.g. FIRE_OFFSET_MS_BROOKHAVEN), then FIRE_OFFSET_MS.
+    """
+    for key in (f"FIRE_OFFSET_MS_{str(course).upper()}", "FIRE_OFFSET_MS"):
+        value = os.getenv(key)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                logging.warning(f"Invalid {key}={value!r}, ignoring")
+    return 0.0
+
+def get_spin_ms():
+    try:
+        return float(os.getenv("UNLOCK_SPIN_MS", DEFAULT_SPIN_MS))
+    except ValueError:
+        return DEFAULT_SPIN_MS
+
+def wait_until_instant(target, offset_ms=0.0, spin_ms=None, clock_offset_s=0.0):
+    """
+    Block until the aware datetime `target` plus `offset_ms`.
+
+    `clock_offset_s` is the estimated offset of the reference clock from the
+    local clock (reference = local + offset, see ClockOffsetService); the
+    local deadline is shifted by it so the fire moment is on the reference clock.
+
+    The remaining wall-clock time is converted once into a perf_counter
+    deadline, so wall-clock adjustments during the wait do not move the fire
+    moment. The wait coarse-sleeps until `spin_ms` before the deadline and
+    busy-waits the rest to avoid scheduler oversleep.
+
+    Returns:
+        dict: "fire_error_ms" (monotonic lateness vs the deadline) and
+              "wall_error_ms" (local wall-clock lateness vs the corrected deadline).
+    """
+    if spin_ms is None:
+        spin_ms = get_spin_ms()
+    target_epoch = target.timestamp() + offset_ms / 1000.0 - clock_offset_s
+    deadline = time.perf_counter() + (target_epoch - time.time())
+    spin = spin_ms / 1000.0
+
+    while True:
+        left = deadline - time.perf_counter()
+        if left <= spin:
+            break
+        time.sleep(min(left - spin, 1.0))
+
+    while time.perf_counter() < deadline:
+        pass
+
+    fired = time.perf_counter()
+    fired_wall = time.time()
+    return {
+        "fire_error_ms": round((fired - deadline) * 1000, 3),
+        "wall_error_ms": round((fired_wall - target_epoch) * 1000, 3),
+    }
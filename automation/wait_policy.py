@@ -0,0 +1,113 @@
+import os
+import time
+import random
+import logging
+import threading
+
+# Named wait profiles. Each pause kind is a (min, max) range in seconds of
+# randomized jitter taken on top of the condition waits; "poll" is how often
+# a condition is re-checked.
+WAIT_PROFILES = {
+    # Human-like pacing, the timings the flow has always used
+    "stealth": {
+        "pause": (0.8, 1.5),    # between steps on a page
+        "settle": (1.2, 2.5),   # after a page or widget has rendered
+        "retry": (0.8, 1.5),    # before retrying a failed step
+        "poll": 0.25,
+    },
+    # Condition waits with only a token amount of jitter
+    "fast": {
+        "pause": (0.05, 0.15),
+        "settle": (0.1, 0.3),
+        "retry": (0.2, 0.5),
+        "poll": 0.05,
+    },
+}
+
+def get_default_wait_profile():
+    """Wait profile for the navigation steps (WAIT_PROFILE, default "stealth")."""
+    profile = os.getenv("WAIT_PROFILE", "stealth")
+    return profile if profile in WAIT_PROFILES else "stealth"
+
+def get_hold_wait_profile():
+    """
+    Wait profile for the steps after a slot is held (HOLD_WAIT_PROFILE),
+    defaulting to the navigation profile.
+    """
+    profile = os.getenv("HOLD_WAIT_PROFILE")
+    return profile if profile in WAIT_PROFILES else get_default_wait_profile()
+
+class WaitPolicy:
+    """
+    Central wait layer for the browser flow.
+
+    `until`/`element`/`url` return as soon as their condition holds (or the
+    timeout passes); `pause` adds the profile's randomized jitter on top and
+    can be switched off with WAIT_JITTER=0. Every second spent waiting is
+    accumulated per kind, so an attempt can report how long it sat idle.
+    """
+    def __init__(self, profile=None, jitter=None):
+        if jitter is None:
+            jitter = os.getenv("WAIT_JITTER", "1") != "0"
+        self.jitter = jitter
+        self.idle_s = 0.0
+        self.by_kind = {}
+        self._lock = threading.Lock()
+        self.use(profile or get_default_wait_profile())
+
+    def use(self, profile):
+        """Switch to another named profile."""
+        if profile not in WAIT_PROFILES:
+            logging.warning(f"Unknown wait profile {profile!r}, using stealth")
+            profile = "stealth"
+        self.profile = profile
+        self._settings = WAIT_PROFILES[profile]
+
+    def _account(self, kind, seconds):
+        with self._lock:
+            self.idle_s += seconds
+            self.by_kind[kind] = self.by_kind.get(kind, 0.0) + seconds
+
+    def pause(self, kind="pause"):
+        """Sleep for the profile's jitter range of `kind`. Returns the seconds slept."""
+        if not self.jitter:
+            return 0.0
+        low, high = self._settings[kind]
+        seconds = random.uniform(low, high)
+        time.sleep(seconds)
+        self._account(kind, seconds)
+        return seconds
+
+    def until(self, condition, timeout=10, kind="condition"):
+        """
+        Poll `condition()` until it returns a truthy value or `timeout` seconds
+        pass. Exceptions from the condition count as not ready.
+        Returns the last value of the condition.
+        """
+        start = time.monotonic()
+        while True:
+            try:
+                value = condition()
+            except Exception:
+                value = None
+            if value or time.monotonic() - start >= timeout:
+                break
+            time.sleep(self._settings["poll"])
+        self._account(kind, time.monotonic() - start)
+        return value
+
+    def element(self, sb, selector, timeout=10):
+        """Wait until `selector` is present on the page."""
+        return self.until(lambda: sb.is_element_present(selector), timeout, kind="element")
+
+    def url(self, sb, *fragments, timeout=10):
+        """Wait until the current URL contains any of `fragments`."""
+        return self.until(lambda: any(f in sb.get_current_url() for f in fragments), timeout, kind="url")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "profile": self.profile,
+                "idle_s": round(self.idle_s, 3),
+                "by_kind": {kind: round(seconds, 3) for kind, seconds in self.by_kind.items()},
+            }
@@ -0,0 +1,64 @@
+# migrate_reservations.py
+"""
+Move reservations out of the legacy single "reservations" partition into
+activation-date partitions, indexing the pending ones as due work.
+
+    python migrate_reservations.py [--dry-run] [--keep-legacy]
+
+Safe to re-run, with or without --keep-legacy: a reservation already in its
+new partition is left as it is (it may have been claimed or rescheduled
+since), and the legacy row is only deleted once the new one exists.
+"""
+import argparse
+import logging
+from azure.core.exceptions import ResourceExistsError
+from automation.storage_clients import get_table_client
+from dotenv import load_dotenv
+from reservation_store import ReservationStore, LEGACY_PARTITION, reservation_partition, due_row_key, due_time
+
+def migrate(store, dry_run=False, keep_legacy=False):
+    moved = indexed = skipped = 0
+    for entity in store.table.query_entities(f"PartitionKey eq '{LEGACY_PARTITION}'"):
+        row_key = entity["RowKey"]
+        migrated = dict(entity)
+        migrated["PartitionKey"] = reservation_partition(entity["utc_activation_time"])
+        migrated["due_key"] = ""
+        if entity.get("status") == "pending":
+            migrated["due_key"] = due_row_key(due_time(entity), row_key)
+        if dry_run:
+            logging.info(f"{row_key}: {LEGACY_PARTITION} -> {migrated['PartitionKey']}"
+                         f"{' (due ' + migrated['due_key'] + ')' if migrated['due_key'] else ''}")
+            moved += 1
+            indexed += bool(migrated["due_key"])
+            continue
+        try:
+            store.table.create_entity(entity=migrated)
+        except ResourceExistsError:
+            # Migrated by an earlier run; the copy there is the live one
+            logging.info(f"{row_key}: already in {migrated['PartitionKey']}, skipping")
+            skipped += 1
+        else:
+            logging.info(f"{row_key}: {LEGACY_PARTITION} -> {migrated['PartitionKey']}"
+                         f"{' (due ' + migrated['due_key'] + ')' if migrated['due_key'] else ''}")
+            moved += 1
+            if migrated["due_key"]:
+                try:
+                    store.table.create_entity(entity=store.index_entry(migrated))
+                except ResourceExistsError:
+                    pass
+                indexed += 1
+        if not keep_legacy:
+            store.table.delete_entity(partition_key=LEGACY_PARTITION, row_key=row_key)
+    logging.info(f"{'Would migrate' if dry_run else 'Migrated'} {moved} reservation(s), {indexed} pending"
+                 f"{f', {skipped} already migrated' if skipped else ''}")
+    return moved, indexed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move reservations into activation-date partitions")
+    parser.add_argument("--dry-run", action="store_true", help="only log what would move")
+    parser.add_argument("--keep-legacy", action="store_true", help="copy without deleting the legacy rows")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate(ReservationStore(get_table_client()), dry_run=args.dry_run, keep_legacy=args.keep_legacy)
@@ -0,0 +1,220 @@
+# reservation_store.py
+import logging
+from datetime import datetime
+import pytz
+from azure.core import MatchConditions
+from azure.data.tables import UpdateMode
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from automation.storage_clients import get_entities
+
+# Reservations are partitioned by the UTC date of their activation time, so a
+# day's claims and listings never touch history. Pending and locked
+# reservations also get an entry in the compact DUE_PARTITION, whose RowKey
+# starts with the time the reservation is next due (for a locked one, when its
+# lease expires); claiming due work is a range query on that prefix.
+RESERVATION_PARTITION_PREFIX = "res_"
+DUE_PARTITION = "due"
+LEGACY_PARTITION = "reservations"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+# Fields an attempt's outcome writes back onto its reservation
+OUTCOME_FIELDS = ("status", "locked_until", "retry_count", "screenshot_folder_url",
+                  "hedge_winner", "hedge_margin_ms")
+
+def reservation_partition(utc_activation_time):
+    """PartitionKey of a reservation activating at the aware datetime `utc_activation_time`."""
+    return f"{RESERVATION_PARTITION_PREFIX}{utc_activation_time.astimezone(pytz.utc):%Y%m%d}"
+
+def _due_prefix(due):
+    return f"{due.astimezone(pytz.utc):%Y%m%dT%H%M%SZ}"
+
+def due_row_key(due, row_key):
+    """RowKey of a due-index entry: sortable due time, then the reservation's RowKey."""
+    return f"{_due_prefix(due)}_{row_key}"
+
+def due_time(entity):
+    """
+    When a reservation is next due: its activation time, or its lock expiry
+    for a retry or for taking over a lease that was not renewed.
+    """
+    return max(entity["utc_activation_time"], entity.get("locked_until") or EPOCH)
+
+class ReservationStore:
+    """
+    Reservation entities in date partitions plus the due-work index.
+
+    Each reservation records the RowKey of its index entry in `due_key`
+    ("" once it is executed or failed), so scheduling, claiming and deleting
+    are point operations. Index entries carry the reservation's keys and due
+    time. A claimed reservation stays indexed at its lock expiry: if the
+    worker holding it dies, the lease heartbeat stops and the reservation
+    comes due again for any instance to take over.
+    """
+    def __init__(self, table_client):
+        self.table = table_client
+
+    def create(self, entity):
+        """Insert a new pending reservation and index it (raises ResourceExistsError on duplicates)."""
+        entity["PartitionKey"] = reservation_partition(entity["utc_activation_time"])
+        entity["due_key"] = due_row_key(due_time(entity), entity["RowKey"])
+        self.table.create_entity(entity=entity)
+        self.table.upsert_entity(entity=self.index_entry(entity))
+        return entity
+
+    def get(self, partition_key, row_key):
+        """A reservation by its keys, or None."""
+        try:
+            return self.table.get_entity(partition_key=partition_key, row_key=row_key)
+        except ResourceNotFoundError:
+            return None
+
+    def find(self, row_key, utc_activation_time):
+        """A reservation by RowKey and activation time, or None."""
+        return self.get(reservation_partition(utc_activation_time), row_key)
+
+    def update(self, entity, etag=None):
+        """MERGE `entity`; with `etag`, only if it is unchanged since it was read (else ResourceModifiedError)."""
+        if etag is None:
+            self.table.update_entity(entity=entity, mode=UpdateMode.MERGE)
+        else:
+            self.table.update_entity(entity=entity, mode=UpdateMode.MERGE,
+                                     etag=etag, match_condition=MatchConditions.IfNotModified)
+
+    def claim(self, entity, owner, locked_until):
+        """
+        Lock a due reservation (pending, or locked under an expired lease) for
+        `owner` with an ETag-conditional update, re-indexing it at `locked_until`.
+        Returns False when another instance changed it first (and so owns it).
+        """
+        old_key = entity.get("due_key")
+        entity["status"] = "locked"
+        entity["lease_owner"] = owner
+        entity["locked_until"] = locked_until
+        entity["due_key"] = due_row_key(locked_until, entity["RowKey"])
+        try:
+            self.update(entity, etag=entity.metadata["etag"])
+        except ResourceModifiedError:
+            return False
+        self.table.upsert_entity(entity=self.index_entry(entity))
+        self._drop_index(old_key)
+        return True
+
+    def complete(self, entity, owner):
+        """
+        Write an attempt's outcome (OUTCOME_FIELDS of `entity`) if `owner` still
+        holds the lease, re-indexing the reservation when it goes back to pending.
+        Returns False, writing nothing, when the lease was lost to another instance.
+        """
+        for _ in range(3):
+            current = self.get(entity["PartitionKey"], entity["RowKey"])
+            if current is None or current.get("lease_owner") != owner or current.get("status") != "locked":
+                return False
+            update = {"PartitionKey": entity["PartitionKey"], "RowKey": entity["RowKey"], "lease_owner": "",
+                      "due_key": ""}
+            for field in OUTCOME_FIELDS:
+                if field in entity:
+                    update[field] = entity[field]
+            if update["status"] == "pending":
+                # a heartbeat may have pushed the lock out; the retry is due when it expires
+                update["locked_until"] = current.get("locked_until")
+                update["utc_activation_time"] = current["utc_activation_time"]
+                update["due_key"] = due_row_key(due_time(update), entity["RowKey"])
+            try:
+                self.update(update, etag=current.metadata["etag"])
+            except ResourceModifiedError:
+                continue  # a heartbeat renewal landed in between
+            if update["status"] == "pending":
+                self.table.upsert_entity(entity=self.index_entry(update))
+            if current.get("due_key") != update["due_key"]:
+                self._drop_index(current.get("due_key"))  # the lease-expiry entry
+            entity.update(update)
+            return True
+        return False
+
+    def delete(self, entity):
+        """Delete a reservation and its index entry."""
+        self._drop_index(entity.get("due_key"))
+        self.table.delete_entity(partition_key=entity["PartitionKey"], row_key=entity["RowKey"])
+
+    def due(self, as_of):
+        """
+        Reservations due at or before `as_of`, as (index entry, reservation)
+        pairs: pending ones, and locked ones whose lease expired without being
+        renewed (their worker is gone). An entry of a reservation whose
+        heartbeat renewed its lease is moved to the current lock expiry; stale
+        entries (reservation gone, finished or re-indexed) are dropped.
+        """
+        query = f"PartitionKey eq '{DUE_PARTITION}' and RowKey lt '{_due_prefix(as_of)}~'"
+        entries = list(self.table.query_entities(query))
+        # The point reads are independent, so they may run concurrently (STORAGE_ASYNC=1)
+        entities = get_entities([(entry["reservation_partition"], entry["reservation_key"]) for entry in entries],
+                                self.table.table_name)
+        due = []
+        for entry, entity in zip(entries, entities):
+            if entity is None or entity.get("due_key") != entry["RowKey"] or entity.get("status") not in ("pending", "locked"):
+                logging.info(f"Dropping stale due entry {entry['RowKey']}")
+                self._drop_index(entry["RowKey"])
+                continue
+            if entity["status"] == "locked":
+                if (entity.get("locked_until") or EPOCH) > as_of:
+                    self._follow_lease(entity)
+                    continue
+                logging.warning(f"Lease {entity.get('lease_owner')} on {entity['RowKey']} expired at "
+                                f"{entity.get('locked_until')}, reservation is due for takeover")
+            due.append((entry, entity))
+        return due
+
+    def _follow_lease(self, entity):
+        """Move a locked reservation's index entry to its renewed lock expiry."""
+        old_key = entity["due_key"]
+        new_key = due_row_key(entity["locked_until"], entity["RowKey"])
+        try:
+            self.update({"PartitionKey": entity["PartitionKey"], "RowKey": entity["RowKey"], "due_key": new_key},
+                        etag=entity.metadata["etag"])
+        except ResourceModifiedError:
+            return  # a heartbeat or the outcome landed first; the entry is looked at again when due
+        entity["due_key"] = new_key
+        self.table.upsert_entity(entity=self.index_entry(entity))
+        self._drop_index(old_key)
+
+    def pending(self):
+        """
+        (RowKey, due time) of every indexed reservation, including locked ones
+        at their lock expiry; reads only the due partition.
+        """
+        return [(entry["reservation_key"], entry["due_time"])
+                for entry in self.table.query_entities(
+                    f"PartitionKey eq '{DUE_PARTITION}'",
+                    select=["reservation_key", "due_time"])]
+
+    def list_reservations(self, activation_from=None, select=None):
+        """
+        Reservations activating on or after the date `activation_from` (every
+        date partition when None), as a range over partition keys.
+        """
+        start = RESERVATION_PARTITION_PREFIX
+        if activation_from is not None:
+            start = f"{RESERVATION_PARTITION_PREFIX}{activation_from:%Y%m%d}"
+        # '`' sorts right after '_', closing the range over the "res_" prefix
+        end = RESERVATION_PARTITION_PREFIX[:-1] + "`"
+        return list(self.table.query_entities(
+            f"PartitionKey ge '{start}' and PartitionKey lt '{end}'", select=select))
+
+    def index_entry(self, entity):
+        """Due-index entity for a pending or locked reservation with `due_key` set."""
+        return {
+            "PartitionKey": DUE_PARTITION,
+            "RowKey": entity["due_key"],
+            "reservation_partition": entity["PartitionKey"],
+            "reservation_key": entity["RowKey"],
+            "due_time": due_time(entity),
+        }
+
+    def _drop_index(self, due_key):
+        if not due_key:
+            return
+        try:
+            self.table.delete_entity(partition_key=DUE_PARTITION, row_key=due_key)
+        except ResourceNotFoundError:
+            pass
@@ -0,0 +1,13 @@
+import os
+
+# Modules that build storage clients at import time need a connection string;
+# the Azurite development account is never contacted by these tests.
+os.environ.setdefault(
+    "AZURE_STORAGE_CONNECTION_STRING",
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+    "TableEndpoint=http://127.0.0.1:10002/devstoreaccount1;",
+)
+os.environ.setdefault("AZURE_STORAGE_BLOB_CONTAINER_NAME", "screenshots")
+os.environ.setdefault("AZURE_STORAGE_TABLE_NAME", "reservations")
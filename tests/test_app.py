@@ -0,0 +1,103 @@
+import importlib
+
+import pytest
+
+from automation import dispatcher
+from automation.metrics import STORAGE_LATENCY, Histogram
+
+class FakeStore:
+    """ReservationStore stand-in: hands out `entities` as due and records claims and outcomes."""
+    def __init__(self, entities):
+        self.entities = entities
+        self.claimed = []
+        self.completed = []
+
+    def due(self, as_of):
+        return [({"RowKey": e["RowKey"]}, e) for e in self.entities]
+
+    def claim(self, entity, owner, locked_until):
+        self.claimed.append(entity["RowKey"])
+        return True
+
+    def complete(self, entity, owner):
+        self.completed.append(dict(entity))
+        return True
+
+def reservation(row_key, hedges=1):
+    date, time = row_key.split("_")
+    return {"PartitionKey": "res_20260104", "RowKey": row_key, "date": date, "time": time,
+            "course": "Main", "hedges": hedges, "retry_count": 0, "screenshot_folder_url": "folder"}
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # app.py logs to reservation_logs.log in the working directory
+    monkeypatch.setenv("MAX_BROWSER_WORKERS", "3")
+    monkeypatch.setattr(dispatcher, "_busy_slots", 0)
+    return importlib.import_module("app")
+
+def run(app_module, monkeypatch, store, outcomes):
+    """Run process_due_reservations with each job finishing as `outcomes(job)` says."""
+    import automation.login
+    emails = []
+    monkeypatch.setattr(app_module, "get_reservation_store", lambda: store)
+    monkeypatch.setattr(automation.login, "send_email",
+                        lambda date, time, actual_time=None, success=True: emails.append((date, time, actual_time, success)))
+
+    def dispatch(jobs, on_result):
+        for job in jobs:
+            on_result(job, outcomes(job))
+            dispatcher.release_worker_slots()
+
+    monkeypatch.setattr(app_module, "dispatch_reservations", dispatch)
+    return app_module.process_due_reservations(), emails
+
+def hedge_outcome(job, won, succeeded):
+    outcome = {"RowKey": job["RowKey"], "succeeded": succeeded, "metrics": {},
+               "hedge": {"hedge": job["hedge"], "hedges": job["hedges"], "won": won,
+                         "winner": 1, "margin_ms": None if won else 40.0}}
+    if succeeded:
+        outcome["actual_time"] = "07:30"
+    else:
+        outcome["error"] = "Slot already held by hedge 1"
+    return outcome
+
+def test_hedged_reservation_sends_one_email(app_module, monkeypatch):
+    store = FakeStore([reservation("2026-01-08_07:30 AM", hedges=3)])
+    results, emails = run(app_module, monkeypatch, store,
+                          lambda job: hedge_outcome(job, won=job["hedge"] == 1, succeeded=job["hedge"] == 1))
+    assert [r["status"] for r in results] == ["executed"]
+    assert emails == [("2026-01-08", "07:30 AM", "07:30", True)]
+
+def test_claims_only_as_many_reservations_as_there_are_free_workers(app_module, monkeypatch):
+    store = FakeStore([reservation("2026-01-08_07:30 AM"), reservation("2026-01-08_07:40 AM", hedges=2),
+                       reservation("2026-01-08_07:50 AM")])
+    results, _ = run(app_module, monkeypatch, store,
+                     lambda job: {"RowKey": job["RowKey"], "succeeded": True, "metrics": {}})
+    assert store.claimed == ["2026-01-08_07:30 AM", "2026-01-08_07:40 AM"]
+    assert {r["RowKey"]: r["status"] for r in results} == {
+        "2026-01-08_07:30 AM": "executed", "2026-01-08_07:40 AM": "executed", "2026-01-08_07:50 AM": "deferred"}
+    assert dispatcher._busy_slots == 0
+
+def test_busy_workers_defer_every_reservation(app_module, monkeypatch):
+    assert dispatcher.acquire_worker_slots(3)  # another run holds every worker
+    store = FakeStore([reservation("2026-01-08_07:30 AM")])
+    results, _ = run(app_module, monkeypatch, store, lambda job: pytest.fail("nothing should run"))
+    assert store.claimed == []
+    assert results == [{"RowKey": "2026-01-08_07:30 AM", "status": "deferred"}]
+    assert not dispatcher.wait_for_worker_slot(timeout=0)
+
+def test_worker_storage_latencies_reach_the_metrics_endpoint(app_module, monkeypatch):
+    worker = Histogram("worker", "storage latency in a worker process", STORAGE_LATENCY.labelnames,
+                       buckets=STORAGE_LATENCY.buckets)
+
+    def outcome(job):
+        worker.observe(0.02, service="table", method="MERGE", status="204")
+        result = hedge_outcome(job, won=job["hedge"] == 1, succeeded=job["hedge"] == 1)
+        result["metrics"]["storage_latency"] = worker.drain()
+        return result
+
+    before = (STORAGE_LATENCY._series.get(("table", "MERGE", "204")) or {}).get("count", 0)
+    run(app_module, monkeypatch, FakeStore([reservation("2026-01-08_07:30 AM", hedges=2)]), outcome)
+    body = app_module.app.test_client().get("/metrics").get_data(as_text=True)
+    line = 'teetime_storage_operation_seconds_count{service="table",method="MERGE",status="204"}'
+    assert f"{line} {before + 2}" in body  # one observation from each hedge's worker
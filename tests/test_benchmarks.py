@@ -0,0 +1,198 @@
+"""
+Timing comparisons of the unlock-time fast paths against the paths they
+replace, run in a real browser against a local fixture of the ForeTees tee
+sheet. They are skipped where Chrome is not installed; run them with
+`python -m pytest -s tests/test_benchmarks.py` to see the medians.
+"""
+import shutil
+import statistics
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from automation import login
+from automation.http_engine import DirectHttpEngine, SlotExchange
+from automation.page_library import CALL_SCRIPT, LIBRARY_FUNCTIONS, PageLibrary
+
+CHROME = next(filter(None, map(shutil.which, ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser"))), None)
+needs_chrome = pytest.mark.skipif(CHROME is None, reason="Chrome is not installed")
+
+ROUNDS = 5
+ASSET_DELAY_S = 0.05   # per stylesheet/script, as a reload fetches the sheet's assets again
+OPEN_SLOT = "div.rwdTr div.slotCount.openSlots4"
+
+def sheet_html(open_slots):
+    rows = []
+    for minutes in range(7 * 60, 17 * 60, 10):
+        h, m = divmod(minutes, 60)
+        label = f"{(h - 1) % 12 + 1}:{m:02d} {'AM' if h < 12 else 'PM'}"
+        rows.append(f"<div class='rwdTr'><div class='slotCount {'openSlots4' if open_slots else 'openSlots0'}'></div>"
+                    f"<a class='teetime_button' href='Member_slot?stime={h:02d}{m:02d}&ttdata=t{minutes}'>{label}</a></div>")
+    assets = "".join(f"<link rel='stylesheet' href='assets/sheet{i}.css'><script src='assets/sheet{i}.js'></script>"
+                     for i in range(4))
+    return f"<html><head>{assets}</head><body><div class='rwdTbody'>{''.join(rows)}</div></body></html>"
+
+SLOT_PAGE = "<html><body><form><div id='slot_player_row_0'></div></form></body></html>"
+
+class TeeSheetFixture(BaseHTTPRequestHandler):
+    """Member_sheet (all slots open once `unlocked` is set), its assets, and Member_slot."""
+    unlocked = False
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.endswith("/Member_sheet"):
+            self._send(sheet_html(TeeSheetFixture.unlocked))
+        elif path.endswith("/Member_slot"):
+            self._send(SLOT_PAGE)
+        elif "/assets/" in path:
+            time.sleep(ASSET_DELAY_S)
+            self._send("/* asset */", "text/css" if path.endswith(".css") else "application/javascript")
+        else:
+            self._send("not found", status=404)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _send(self, text, content_type="text/html", status=200):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class BenchLogger:
+    def log(self, message, **fields):
+        pass
+
+    def log_duration(self, label, start, end, extra=None):
+        pass
+
+    def context(self, label):
+        return nullcontext()
+
+class BenchCtx:
+    def __init__(self):
+        self.logger = BenchLogger()
+        self.page_lib = PageLibrary(self.logger)
+        self.timings = {}
+
+def report(title, **series):
+    print(f"\n{title} (median of {len(next(iter(series.values())))}, ms): "
+          + ", ".join(f"{name} {statistics.median(values):.1f}" for name, values in series.items()))
+
+@pytest.fixture(scope="module")
+def sheet_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TeeSheetFixture)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v5/club/Member_sheet"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(scope="module")
+def sb():
+    from seleniumbase import SB
+    with SB(headless=True) as sb:
+        yield sb
+
+def park_on_sheet(sb, sheet_url):
+    """Load the still-closed sheet and install the page library, as the attempt does before the unlock."""
+    TeeSheetFixture.unlocked = False
+    sb.open(sheet_url)
+    sb.wait_for_element("div.rwdTr", timeout=5)
+    ctx = BenchCtx()
+    ctx.page_lib.call(sb, "toMinutes", "7:30 AM")
+    TeeSheetFixture.unlocked = True
+    return ctx
+
+@needs_chrome
+def test_fetch_polling_sees_open_slots_before_a_reload(sb, sheet_url):
+    reload_ms, poll_ms = [], []
+    for _ in range(ROUNDS):
+        ctx = park_on_sheet(sb, sheet_url)
+        start = time.perf_counter()
+        login.reload_tee_sheet(sb, ctx)
+        assert sb.is_element_present(OPEN_SLOT)
+        reload_ms.append((time.perf_counter() - start) * 1000)
+
+        ctx = park_on_sheet(sb, sheet_url)
+        start = time.perf_counter()
+        assert login.poll_tee_sheet(sb, ctx)["swapped"]
+        assert sb.is_element_present(OPEN_SLOT)
+        poll_ms.append((time.perf_counter() - start) * 1000)
+    report("Unlock to open slots in the live sheet", reload=reload_ms, fetch_poll=poll_ms)
+    assert statistics.median(poll_ms) < statistics.median(reload_ms)
+
+@needs_chrome
+def test_direct_http_holds_a_slot_before_the_browser(sb, sheet_url):
+    base_url = sheet_url.rsplit("/", 1)[0] + "/"
+    browser_ms, http_ms = [], []
+    for _ in range(ROUNDS):
+        ctx = park_on_sheet(sb, sheet_url)
+        start = time.perf_counter()
+        login.reload_tee_sheet(sb, ctx)
+        sb.click("div.rwdTr a.teetime_button")
+        sb.wait_for_element("#slot_player_row_0", timeout=5)
+        browser_ms.append((time.perf_counter() - start) * 1000)
+
+        park_on_sheet(sb, sheet_url)
+        engine = DirectHttpEngine.from_browser(sb, base_url=base_url)
+        engine.exchange = SlotExchange("GET", "Member_slot", {"stime": "", "ttdata": ""})
+        engine.warm()
+        start = time.perf_counter()
+        engine.hold_slot(engine.fetch_open_slots()[0])
+        http_ms.append((time.perf_counter() - start) * 1000)
+        engine.close()
+    report("Unlock to a held slot", browser=browser_ms, direct_http=http_ms)
+    assert statistics.median(http_ms) < statistics.median(browser_ms)
+
+class RecordingDriver:
+    """WebDriver stand-in that records the size of every script sent."""
+    def __init__(self):
+        self.sent = []
+
+    def execute_script(self, script, *args):
+        self.sent.append(len(script))
+        return True
+
+class RecordingBrowser:
+    def __init__(self):
+        self.driver = RecordingDriver()
+
+def test_page_library_calls_send_a_short_stub():
+    sb = RecordingBrowser()
+    page_lib = PageLibrary(BenchLogger())
+    for _ in range(ROUNDS):
+        page_lib.call(sb, "scrollToTime", "7:30 AM")
+    stub = len(CALL_SCRIPT % "scrollToTime")
+    assert sb.driver.sent == [sb.driver.sent[0]] + [stub] * (ROUNDS - 1)
+    summary = page_lib.summary()["scrollToTime"]
+    assert summary["bytes_saved_per_stub_call"] == len(LIBRARY_FUNCTIONS["scrollToTime"]) - stub > 0
+
+@needs_chrome
+def test_page_library_calls_against_full_scripts(sb, sheet_url):
+    ctx = park_on_sheet(sb, sheet_url)
+    full_script = "return (%s).apply({}, arguments);" % LIBRARY_FUNCTIONS["scrollToTime"]
+    full_ms, stub_ms = [], []
+    for _ in range(ROUNDS * 4):
+        start = time.perf_counter()
+        assert sb.driver.execute_script(full_script, "7:30 AM")
+        full_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        assert ctx.page_lib.call(sb, "scrollToTime", "7:30 AM")
+        stub_ms.append((time.perf_counter() - start) * 1000)
+    report("scrollToTime call", full_source=full_ms, library_stub=stub_ms)
+    summary = ctx.page_lib.summary()["scrollToTime"]
+    print(f"scrollToTime: {len(full_script)} bytes per full call, "
+          f"{summary['bytes_saved_per_stub_call']} saved per stub call")
+    assert summary["median_ms"] is not None
@@ -0,0 +1,171 @@
+import fcntl
+import json
+import socket
+import threading
+import time
+
+import ntplib
+import pytest
+
+from automation import clock_offset
+from automation.clock_offset import ClockOffsetService, MIN_POLL_SECONDS, TimeSyncError
+
+def kiss(code):
+    return int.from_bytes(code.encode("ascii"), "big")
+
+class Response:
+    def __init__(self, offset=0.010, delay=0.020, stratum=2, ref_id=0):
+        self.offset, self.delay, self.stratum, self.ref_id = offset, delay, stratum, ref_id
+
+class FakeNtpClient:
+    """Answers each host with its Response from `responses` and records every query."""
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+
+    def request(self, host, version=3, port=123, timeout=1.0):
+        self.queries.append(host)
+        return self.responses[host]
+
+def make_service(tmp_path, responses, **kwargs):
+    service = ClockOffsetService(servers=list(responses), samples_per_server=4, max_age=300,
+                                 cache_path=str(tmp_path / "clock.json"), burst_spacing=0, **kwargs)
+    service._client = FakeNtpClient(responses)
+    return service
+
+def age_cache(tmp_path, seconds):
+    path = tmp_path / "clock.json"
+    cached = json.loads(path.read_text())
+    cached["queried_at"] -= seconds
+    cached["sampled_at"] = cached.get("sampled_at", 0) - seconds
+    path.write_text(json.dumps(cached))
+
+def test_refresh_queries_each_server_once(tmp_path):
+    service = make_service(tmp_path, {"a": Response(), "b": Response()})
+    estimate = service.refresh()
+    assert sorted(service._client.queries) == ["a", "b"]
+    assert estimate["offset_s"] == pytest.approx(0.010)
+
+def test_processes_share_the_estimate_within_the_minimum_poll(tmp_path):
+    first = make_service(tmp_path, {"a": Response(offset=0.010)})
+    other = make_service(tmp_path, {"a": Response(offset=0.500)})  # another worker process
+    first.refresh()
+    assert other.refresh()["offset_s"] == pytest.approx(0.010)
+    assert other.current()["offset_s"] == pytest.approx(0.010)
+    assert other._client.queries == []
+
+    age_cache(tmp_path, MIN_POLL_SECONDS)
+    assert other.refresh()["offset_s"] == pytest.approx(0.500)
+    assert other._client.queries == ["a"]
+
+def test_burst_only_inside_the_window_before_the_unlock(tmp_path):
+    service = make_service(tmp_path, {"a": Response()}, burst_window=180)
+    service.burst_before(time.time() + 600)
+    assert not service._burst_due(None)
+    assert 400 <= service._next_refresh_in(3600) <= 420
+
+    service.burst_before(time.time() + 60)
+    assert service._burst_due(None)
+    estimate = service.refresh(burst=True)
+    assert service._client.queries == ["a"] * 4
+    assert not service._burst_due(estimate)
+
+def test_rate_kiss_backs_off_the_server(tmp_path):
+    service = make_service(tmp_path, {"a": Response(stratum=0, ref_id=kiss("RATE")), "b": Response()})
+    service.refresh(burst=True)
+    assert service._client.queries == ["a", "b", "b", "b", "b"]
+    assert service._backoff["a:123"]["seconds"] == 2 * MIN_POLL_SECONDS
+
+    age_cache(tmp_path, MIN_POLL_SECONDS)
+    service._client.queries.clear()
+    service.refresh()
+    assert service._client.queries == ["b"]
+
+def test_deny_kiss_drops_the_server_for_a_day(tmp_path):
+    service = make_service(tmp_path, {"a": Response(stratum=0, ref_id=kiss("DENY"))})
+    with pytest.raises(TimeSyncError):
+        service.refresh()
+    assert service._backoff["a:123"]["seconds"] == clock_offset.DENIED_BACKOFF_SECONDS
+    # The failed round counts towards the minimum poll for every process
+    other = make_service(tmp_path, {"a": Response()})
+    with pytest.raises(TimeSyncError):
+        other.refresh()
+    assert other._client.queries == []
+
+class NtpStandIn:
+    """
+    Local NTP server on a UDP socket, answering from a clock `offset` seconds
+    ahead of this host's; with `hold` set it waits for `release` before answering.
+    """
+    def __init__(self, offset, hold=False):
+        self.offset = offset
+        self.release = threading.Event()
+        self.received = threading.Event()
+        if not hold:
+            self.release.set()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while self.running:
+            try:
+                data, peer = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            received_at = time.time() + self.offset
+            self.received.set()
+            self.release.wait()
+            request = ntplib.NTPPacket()
+            request.from_data(data)
+            response = ntplib.NTPPacket(version=request.version, mode=4)
+            response.stratum = 2
+            response.ref_id = kiss("LOCL")
+            response.orig_timestamp = request.tx_timestamp
+            response.recv_timestamp = ntplib.system_to_ntp_time(received_at)
+            response.tx_timestamp = ntplib.system_to_ntp_time(time.time() + self.offset)
+            self.sock.sendto(response.to_data(), peer)
+
+    def close(self):
+        self.release.set()
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+def stand_in_service(tmp_path, server):
+    return ClockOffsetService(servers=[f"127.0.0.1:{server.port}"], samples_per_server=2, max_age=300,
+                              timeout=2.0, cache_path=str(tmp_path / "clock.json"), burst_spacing=0)
+
+def test_offset_from_a_local_ntp_server(tmp_path):
+    server = NtpStandIn(offset=0.250)
+    try:
+        estimate = stand_in_service(tmp_path, server).refresh(burst=True)
+    finally:
+        server.close()
+    assert estimate["samples"] == 2
+    assert estimate["offset_s"] == pytest.approx(0.250, abs=0.02)
+
+def test_sampling_does_not_hold_the_cache_lock(tmp_path):
+    server = NtpStandIn(offset=0.250, hold=True)
+    service = stand_in_service(tmp_path, server)
+    refresh = threading.Thread(target=service.refresh)
+    refresh.start()
+    try:
+        assert server.received.wait(5)
+        # Another process can take the cache lock while the query is in flight, and
+        # finds the round claimed instead of querying the server itself
+        with open(str(tmp_path / "clock.json.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        other = stand_in_service(tmp_path, server)
+        with pytest.raises(TimeSyncError):
+            other.refresh()
+    finally:
+        server.release.set()
+        refresh.join()
+        server.close()
+    assert other.refresh()["offset_s"] == pytest.approx(0.250, abs=0.02)
@@ -0,0 +1,19 @@
+from automation import dispatcher
+
+class FakeExecutor:
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+def test_reset_leaves_a_replacement_pool_running(monkeypatch):
+    broken, replacement = FakeExecutor(), FakeExecutor()
+    monkeypatch.setattr(dispatcher, "_executor", broken)
+    dispatcher._reset_executor(broken)
+    assert broken.shut_down and dispatcher._executor is None
+
+    # Another dispatch started a new pool before a late failure from the old one was handled
+    monkeypatch.setattr(dispatcher, "_executor", replacement)
+    dispatcher._reset_executor(broken)
+    assert dispatcher._executor is replacement and not replacement.shut_down
@@ -0,0 +1,112 @@
+import threading
+from contextlib import nullcontext
+
+import pytest
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+from automation import login
+from automation.hedge import HedgeCoordinator, HedgeLost
+
+class FakeTable:
+    """Table client whose create_entity is atomic, like the service's insert."""
+    def __init__(self):
+        self.entities = {}
+        self.lock = threading.Lock()
+
+    def create_entity(self, entity):
+        with self.lock:
+            key = (entity["PartitionKey"], entity["RowKey"])
+            if key in self.entities:
+                raise ResourceExistsError("EntityAlreadyExists")
+            self.entities[key] = dict(entity)
+
+    def get_entity(self, partition_key, row_key):
+        with self.lock:
+            if (partition_key, row_key) not in self.entities:
+                raise ResourceNotFoundError("ResourceNotFound")
+            return dict(self.entities[(partition_key, row_key)])
+
+class StubSheet:
+    """A tee sheet that tracks which worker holds a slot page open."""
+    def __init__(self):
+        self.held = set()
+        self.lock = threading.Lock()
+
+    def hold(self, worker):
+        with self.lock:
+            self.held.add(worker)
+
+    def release(self, worker):
+        with self.lock:
+            self.held.discard(worker)
+
+class FakeLogger:
+    def log(self, message, **fields):
+        pass
+
+    def context(self, label):
+        return nullcontext()
+
+class FakePageLibrary:
+    def invalidate(self):
+        pass
+
+class FakeCtx:
+    def __init__(self, hedge):
+        self.hedge = hedge
+        self.logger = FakeLogger()
+        self.page_lib = FakePageLibrary()
+        self.timings = {}
+
+class WorkerBrowser:
+    """One worker's browser, parked on the slot page it holds."""
+    GO_BACK = object()
+
+    def __init__(self, sheet, worker):
+        self.sheet = sheet
+        self.worker = worker
+
+    def find_element(self, selector, by=None, timeout=None):
+        assert selector == login.SLOT_GO_BACK_XPATH
+        return self.GO_BACK
+
+    def execute_script(self, script, *args):
+        if args and args[0] is self.GO_BACK:
+            self.sheet.release(self.worker)
+
+@pytest.mark.parametrize("hedges", [2, 4])
+def test_losing_hedges_release_their_slots(hedges):
+    table, sheet = FakeTable(), StubSheet()
+    start = threading.Barrier(hedges)
+    results = {}
+
+    def attempt(hedge):
+        ctx = FakeCtx(HedgeCoordinator(table, "2026-01-04_07:30 AM", "owner-1", hedge, hedges, FakeLogger()))
+        sb = WorkerBrowser(sheet, hedge)
+        start.wait()
+        sheet.hold(hedge)  # "Yes, Continue" opened the slot page
+        try:
+            login.claim_hedge_hold(sb, ctx, "7:30 AM")
+            results[hedge] = "won"
+        except HedgeLost:
+            results[hedge] = "lost"
+
+    workers = [threading.Thread(target=attempt, args=(hedge,)) for hedge in range(1, hedges + 1)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    winners = [hedge for hedge, result in results.items() if result == "won"]
+    assert len(winners) == 1
+    assert sheet.held == set(winners)
+
+def test_hedged_attempts_leave_the_email_to_the_dispatcher(monkeypatch):
+    emails = []
+    monkeypatch.setattr(login, "send_email", lambda *args, **kwargs: emails.append(args))
+    hedged = FakeCtx(HedgeCoordinator(FakeTable(), "2026-01-04_07:30 AM", "owner-1", 2, 2))
+    login.notify_attempt_result(hedged, "2026-01-04", "07:30 AM", success=False)
+    assert emails == []
+
+    login.notify_attempt_result(FakeCtx(None), "2026-01-04", "07:30 AM", success=False)
+    assert len(emails) == 1
@@ -0,0 +1,211 @@
+import json
+import threading
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import pytest
+
+from automation import login
+from automation.http_engine import DirectHttpEngine, EngineDeviation, SlotExchange, record_slot_exchange
+
+SLOT_PAGE = ('<html><body><form><input type="hidden" name="slot_id" value="s740">'
+             '<div id="slot_player_row_0"></div><a class="go_back">Go Back</a></form></body></html>')
+IN_USE_PAGE = "<html><body>This tee time is currently in use by another member.</body></html>"
+
+def button(time_text, **fields):
+    return (f"<a class='teetime_button' href='#' data-ftjson='{json.dumps(fields)}'>{time_text}</a>")
+
+SHEET = (
+    "<html><body><div class='rwdTbody'>"
+    "<div class='rwdTr'><div class='slotCount openSlots4'></div>"
+    + button("7:30 AM", stime="0730", ttdata="a1") +
+    "</div><div class='rwdTr'><div class='slotCount openSlots4'></div>"
+    + button("7:40 AM", stime="0740", ttdata="b2") +
+    "</div></div></body></html>"
+)
+
+# A booking's HAR as the browser would export it, trimmed to the entries that matter
+HAR = {"log": {"entries": [
+    {"request": {"method": "GET", "url": "https://club.example/v5/club/Member_sheet", "queryString": []},
+     "response": {"content": {"text": SHEET}}},
+    {"request": {"method": "POST", "url": "https://club.example/v5/club/Member_slot",
+                 "postData": {"text": "stime=0720&ttdata=z9&continue=yes"}},
+     "response": {"content": {"text": SLOT_PAGE}}},
+    {"request": {"method": "POST", "url": "https://club.example/v5/club/Member_slot",
+                 "postData": {"text": "slot_id=s720&stime=0720&goback=yes"}},
+     "response": {"status": 302, "content": {"text": ""}}},
+]}}
+
+class StubForeTees(BaseHTTPRequestHandler):
+    """
+    Sheet at <base>/Member_sheet; Member_slot holds only the 7:40 AM slot
+    (7:30 AM is in use) and redirects to the sheet on Go Back.
+    """
+    slot_requests = []
+
+    def do_GET(self):
+        if self.path == "/v5/club/Member_sheet":
+            self._send(SHEET)
+        else:
+            self._send("not found", 404)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        form = dict(parse_qsl(body))
+        self.slot_requests.append((self.path, form))
+        if self.path != "/v5/club/Member_slot":
+            self._send("not found", 404)
+        elif form.get("goback"):
+            self.send_response(302)
+            self.send_header("Location", "Member_sheet")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._send(SLOT_PAGE if form.get("stime") == "0740" else IN_USE_PAGE)
+
+    def _send(self, text, status=200):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def foretees():
+    StubForeTees.slot_requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubForeTees)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v5/club/"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def exchange(tmp_path):
+    har = tmp_path / "booking.har"
+    har.write_text(json.dumps(HAR))
+    return record_slot_exchange(str(har))
+
+def make_engine(base_url, exchange):
+    return DirectHttpEngine(base_url + "Member_sheet", [], "test-agent", base_url=base_url, exchange=exchange)
+
+def test_records_the_slot_request_from_a_har(exchange, tmp_path):
+    assert (exchange.method, exchange.path) == ("POST", "Member_slot")
+    assert exchange.fields == {"stime": "0720", "ttdata": "z9", "continue": "yes"}
+    assert exchange.release == {"method": "POST", "path": "Member_slot",
+                                "fields": {"slot_id": "s720", "stime": "0720", "goback": "yes"}}
+    exchange.save(str(tmp_path / "exchange.json"))
+    loaded = SlotExchange.load(str(tmp_path / "exchange.json"))
+    assert (loaded.fields, loaded.release) == (exchange.fields, exchange.release)
+
+def test_hold_replays_the_recorded_exchange(foretees, exchange):
+    engine = make_engine(foretees, exchange)
+    slots = engine.fetch_open_slots()
+    assert [s["time"] for s in slots] == ["7:30 AM", "7:40 AM"]
+    assert "slot_player_row_0" in engine.hold_slot(slots[1])
+    path, form = StubForeTees.slot_requests[-1]
+    assert path == "/v5/club/Member_slot"
+    assert form == {"stime": "0740", "ttdata": "b2", "continue": "yes"}
+
+def test_hold_without_a_recording_is_a_deviation(foretees):
+    engine = make_engine(foretees, None)
+    with pytest.raises(EngineDeviation):
+        engine.hold_slot(engine.fetch_open_slots()[0])
+    assert StubForeTees.slot_requests == []
+
+def test_buttons_the_recording_does_not_cover_are_a_deviation(foretees):
+    engine = make_engine(foretees, SlotExchange("POST", "Member_slot", {"stime": ""}))
+    with pytest.raises(EngineDeviation):
+        engine.hold_slot(engine.fetch_open_slots()[0])
+    assert StubForeTees.slot_requests == []
+
+class FakeLogger:
+    def log(self, message, **fields):
+        pass
+
+    def log_duration(self, label, start, end, extra=None):
+        pass
+
+    def context(self, label):
+        return nullcontext()
+
+class FakePageLibrary:
+    def invalidate(self):
+        pass
+
+class FakeCtx:
+    def __init__(self, engine):
+        self.http_engine = engine
+        self.logger = FakeLogger()
+        self.page_lib = FakePageLibrary()
+        self.timings = {}
+
+class FakeDriver:
+    def add_cookie(self, cookie):
+        pass
+
+class FakeBrowser:
+    """Browser tab the held slot page is written into; `render_fails` simulates a dead tab."""
+    GO_BACK = object()
+
+    def __init__(self, render_fails=False, write_fails=False):
+        self.driver = FakeDriver()
+        self.render_fails = render_fails
+        self.write_fails = write_fails
+        self.page = None
+        self.went_back = False
+
+    def execute_script(self, script, *args):
+        if args and args[0] is self.GO_BACK:
+            self.went_back = True
+        elif "document.write" in script:
+            if self.write_fails:
+                raise Exception("tab crashed")
+            self.page = args[0]
+
+    def is_element_present(self, selector):
+        return self.page is not None and "slot_player_row_0" in self.page
+
+    def wait_for_element(self, selector, timeout=None):
+        if self.render_fails:
+            raise Exception(f"{selector} not found")
+
+    def find_element(self, selector, by=None, timeout=None):
+        return self.GO_BACK
+
+def test_fast_path_tries_every_ranked_candidate(foretees, exchange):
+    sb = FakeBrowser()
+    ctx = FakeCtx(make_engine(foretees, exchange))
+    result = login._http_fast_path(sb, ctx, "7:30 AM", 450, 470, unlock_start=0.0)
+    assert result == (True, "7:40 AM")
+    assert [form["stime"] for _, form in StubForeTees.slot_requests] == ["0730", "0740"]
+    assert sb.page == SLOT_PAGE
+
+def test_fast_path_releases_a_hold_it_cannot_hand_over_over_http(foretees, exchange):
+    sb = FakeBrowser(write_fails=True)  # still on the tee sheet, which has no Go Back
+    ctx = FakeCtx(make_engine(foretees, exchange))
+    assert login._http_fast_path(sb, ctx, "7:40 AM", 460, 460, unlock_start=0.0) is None
+    assert not sb.went_back
+    path, form = StubForeTees.slot_requests[-1]
+    assert form == {"slot_id": "s740", "stime": "0740", "goback": "yes"}
+
+def test_fast_path_releases_from_the_browser_only_on_the_slot_page(foretees, exchange):
+    exchange.release = None
+    sb = FakeBrowser(render_fails=True)  # the page was written but never finished rendering
+    ctx = FakeCtx(make_engine(foretees, exchange))
+    assert login._http_fast_path(sb, ctx, "7:40 AM", 460, 460, unlock_start=0.0) is None
+    assert sb.went_back
+
+    sb = FakeBrowser(write_fails=True)
+    ctx = FakeCtx(make_engine(foretees, exchange))
+    assert login._http_fast_path(sb, ctx, "7:40 AM", 460, 460, unlock_start=0.0) is None
+    assert not sb.went_back
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytz
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+from migrate_reservations import migrate
+from reservation_store import DUE_PARTITION, LEGACY_PARTITION, ReservationStore
+
+class FakeTable:
+    """Table client over a dict, answering the single-partition queries the migration makes."""
+    table_name = "reservations"
+
+    def __init__(self, entities):
+        self.entities = {(e["PartitionKey"], e["RowKey"]): dict(e) for e in entities}
+
+    def query_entities(self, query_filter, select=None):
+        partition = query_filter.split("'")[1]
+        return [dict(e) for (pk, _), e in sorted(self.entities.items()) if pk == partition]
+
+    def create_entity(self, entity):
+        key = (entity["PartitionKey"], entity["RowKey"])
+        if key in self.entities:
+            raise ResourceExistsError("EntityAlreadyExists")
+        self.entities[key] = dict(entity)
+
+    def upsert_entity(self, entity):
+        self.entities[(entity["PartitionKey"], entity["RowKey"])] = dict(entity)
+
+    def delete_entity(self, partition_key, row_key):
+        if self.entities.pop((partition_key, row_key), None) is None:
+            raise ResourceNotFoundError("ResourceNotFound")
+
+def legacy(row_key, status):
+    return {"PartitionKey": LEGACY_PARTITION, "RowKey": row_key, "status": status,
+            "utc_activation_time": datetime(2026, 1, 4, 12, 30, tzinfo=pytz.utc)}
+
+def test_migrating_twice_keeps_the_first_copy():
+    table = FakeTable([legacy("2026-01-11_07:30 AM", "pending"), legacy("2026-01-12_08:00 AM", "success")])
+    store = ReservationStore(table)
+    assert migrate(store, keep_legacy=True) == (2, 1)
+
+    # The migrated reservation is claimed before the second run
+    migrated = table.entities[("res_20260104", "2026-01-11_07:30 AM")]
+    migrated.update(status="locked", lease_owner="host-1", due_key="")
+    table.entities.pop((DUE_PARTITION, "20260104T123000Z_2026-01-11_07:30 AM"))
+    snapshot = dict(table.entities)
+
+    assert migrate(store, keep_legacy=True) == (0, 0)
+    assert table.entities == snapshot
+
+    assert migrate(store) == (0, 0)
+    assert not table.query_entities(f"PartitionKey eq '{LEGACY_PARTITION}'")
+    assert table.entities[("res_20260104", "2026-01-11_07:30 AM")]["status"] == "locked"
@@ -0,0 +1,90 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from automation.page_library import LIBRARY_FUNCTIONS
+
+NODE = shutil.which("node")
+
+# A minimal DOM: containers hold rows, and innerHTML stands in for their content
+FAKE_DOM = """
+function Row(parent, open, times) {
+    this.parentNode = parent;
+    this.open = open;
+    this.buttons = times.map(function (t) { return {textContent: t}; });
+}
+Row.prototype.querySelector = function (sel) { return this.open ? {} : null; };
+Row.prototype.querySelectorAll = function (sel) { return this.buttons; };
+function Container(name, rows) {
+    var self = this;
+    this.innerHTML = name;
+    this.rows = rows.map(function (r) { return new Row(self, r[0], r[1]); });
+}
+function Root(containers) { this.containers = containers; }
+Root.prototype.querySelectorAll = function (sel) {
+    return this.containers.reduce(function (all, c) { return all.concat(c.rows); }, []);
+};
+"""
+
+def run_poll_sheet(live, fetched):
+    script = FAKE_DOM + """
+var document = new Root(%s.map(function (c) { return new Container(c[0], c[1]); }));
+var fetchedDoc = new Root(%s.map(function (c) { return new Container(c[0], c[1]); }));
+function DOMParser() {}
+DOMParser.prototype.parseFromString = function () { return fetchedDoc; };
+global.fetch = function () { return Promise.resolve({text: function () { return Promise.resolve(''); }}); };
+var pollSheet = %s;
+pollSheet.call({}, '/Member_sheet', 1000, 10, function (result) {
+    result.live = document.containers.map(function (c) { return c.innerHTML; });
+    console.log(JSON.stringify(result));
+});
+""" % (json.dumps(live), json.dumps(fetched), LIBRARY_FUNCTIONS["pollSheet"])
+    output = subprocess.run([NODE, "-e", script], capture_output=True, text=True, timeout=30, check=True)
+    return json.loads(output.stdout)
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_poll_sheet_swaps_every_row_container():
+    live = [["front-closed", [[False, ["7:30 AM"]]]], ["back-closed", [[False, ["1:30 PM"]]]]]
+    fetched = [["front-open", [[True, ["7:30 AM"]]]], ["back-open", [[True, ["1:30 PM"]]]]]
+    result = run_poll_sheet(live, fetched)
+    assert result["swapped"]
+    assert result["open"] == ["7:30 AM", "1:30 PM"]
+    assert result["live"] == ["front-open", "back-open"]
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_poll_sheet_does_not_swap_mismatched_layouts():
+    live = [["front-closed", [[False, ["7:30 AM"]]]], ["back-closed", [[False, ["1:30 PM"]]]]]
+    fetched = [["all-open", [[True, ["7:30 AM"]], [True, ["1:30 PM"]]]]]
+    result = run_poll_sheet(live, fetched)
+    assert not result["swapped"]
+    assert result["live"] == ["front-closed", "back-closed"]
+
+def run_await_popup(buttons):
+    """awaitPopup over dialog buttons given as (text, visible); returns its status and the clicked text."""
+    script = """
+var clicked = null;
+var buttons = %s.map(function (b) {
+    return {textContent: b[0], getClientRects: function () { return b[1] ? [{}] : []; },
+            click: function () { clicked = b[0]; }};
+});
+var document = {body: {}, querySelectorAll: function (sel) { return buttons; }};
+function MutationObserver() {}
+MutationObserver.prototype.observe = function () {};
+MutationObserver.prototype.disconnect = function () {};
+var awaitPopup = %s;
+awaitPopup.call({}, 50, null, function (result) {
+    console.log(JSON.stringify({status: result.status, clicked: clicked}));
+});
+""" % (json.dumps(buttons), LIBRARY_FUNCTIONS["awaitPopup"])
+    output = subprocess.run([NODE, "-e", script], capture_output=True, text=True, timeout=30, check=True)
+    return json.loads(output.stdout)
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_await_popup_matches_dialog_buttons_by_text():
+    assert run_await_popup([["Go Back", True], ["Yes,  Continue\n", True]]) == {"status": "continue",
+                                                                               "clicked": "Yes,  Continue\n"}
+    assert run_await_popup([["Go Back", True]]) == {"status": "go_back", "clicked": "Go Back"}
+    # A closed dialog left in the page is not the popup
+    assert run_await_popup([["Yes, Continue", False]]) == {"status": "timeout", "clicked": None}
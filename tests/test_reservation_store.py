@@ -0,0 +1,100 @@
+import itertools
+import re
+from datetime import datetime, timedelta
+
+import pytz
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+import reservation_store
+from reservation_store import DUE_PARTITION, ReservationStore
+
+class Entity(dict):
+    """Table entity with the ETag the service returns in its metadata."""
+    def __init__(self, fields, etag):
+        super().__init__(fields)
+        self.metadata = {"etag": etag}
+
+class FakeTable:
+    """Table client over a dict with ETags, answering the due-index range query."""
+    table_name = "reservations"
+
+    def __init__(self):
+        self.entities = {}
+        self.etags = itertools.count()
+
+    def _store(self, entity):
+        self.entities[(entity["PartitionKey"], entity["RowKey"])] = Entity(entity, str(next(self.etags)))
+
+    def query_entities(self, query_filter, select=None):
+        partition, = re.findall(r"PartitionKey eq '([^']*)'", query_filter)
+        upper = re.findall(r"RowKey lt '([^']*)'", query_filter)
+        return [Entity(e, e.metadata["etag"]) for (pk, rk), e in sorted(self.entities.items())
+                if pk == partition and (not upper or rk < upper[0])]
+
+    def get_entity(self, partition_key, row_key):
+        entity = self.entities.get((partition_key, row_key))
+        if entity is None:
+            raise ResourceNotFoundError("ResourceNotFound")
+        return Entity(entity, entity.metadata["etag"])
+
+    def create_entity(self, entity):
+        self._store(entity)
+
+    def upsert_entity(self, entity):
+        self._store(entity)
+
+    def update_entity(self, entity, mode, etag=None, match_condition=None):
+        current = self.entities[(entity["PartitionKey"], entity["RowKey"])]
+        if etag is not None and etag != current.metadata["etag"]:
+            raise ResourceModifiedError("UpdateConditionNotSatisfied")
+        self._store({**current, **entity})
+
+    def delete_entity(self, partition_key, row_key):
+        if self.entities.pop((partition_key, row_key), None) is None:
+            raise ResourceNotFoundError("ResourceNotFound")
+
+ACTIVATION = datetime(2026, 1, 4, 12, 30, tzinfo=pytz.utc)
+
+def make_store(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(reservation_store, "get_entities",
+                        lambda keys, table_name=None: [table.entities.get(key) for key in keys])
+    store = ReservationStore(table)
+    store.create({"RowKey": "2026-01-11_07:30 AM", "status": "pending", "utc_activation_time": ACTIVATION,
+                  "locked_until": datetime(1970, 1, 1, tzinfo=pytz.utc)})
+    return store, table
+
+def due_keys(table):
+    return [rk for pk, rk in table.entities if pk == DUE_PARTITION]
+
+def test_expired_lease_is_reclaimed(monkeypatch):
+    store, table = make_store(monkeypatch)
+    (_, entity), = store.due(ACTIVATION)
+    lock_until = ACTIVATION + timedelta(minutes=5)
+    assert store.claim(entity, "dead-worker", lock_until)
+    assert store.due(ACTIVATION + timedelta(minutes=1)) == []
+
+    # The worker died: no heartbeat renews the lease, so it comes due at its expiry
+    (_, entity), = store.due(lock_until)
+    assert entity["lease_owner"] == "dead-worker"
+    assert store.claim(entity, "new-worker", lock_until + timedelta(minutes=5))
+    assert len(due_keys(table)) == 1
+
+    # A late outcome from the dead worker's lease is not recorded
+    assert not store.complete({**entity, "status": "executed"}, "dead-worker")
+    assert store.complete({**entity, "status": "executed"}, "new-worker")
+    assert due_keys(table) == []
+
+def test_renewed_lease_is_not_reclaimed(monkeypatch):
+    store, table = make_store(monkeypatch)
+    (_, entity), = store.due(ACTIVATION)
+    lock_until = ACTIVATION + timedelta(minutes=5)
+    assert store.claim(entity, "worker", lock_until)
+
+    # The heartbeat pushed the lock out; the index entry follows it when it comes up
+    renewed = lock_until + timedelta(minutes=5)
+    store.update({"PartitionKey": entity["PartitionKey"], "RowKey": entity["RowKey"], "locked_until": renewed})
+    assert store.due(lock_until) == []
+    assert due_keys(table) == [reservation_store.due_row_key(renewed, entity["RowKey"])]
+    (_, entity), = store.due(renewed)
+    assert entity["lease_owner"] == "worker"
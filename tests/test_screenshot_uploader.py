@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from automation.screenshot_uploader import ScreenshotUploader
+
+class FakeBlobService:
+    """Stores uploads by blob name the way BlobStorageService names them."""
+    def __init__(self):
+        self.blobs = {}
+
+    def upload_screenshot(self, image_bytes, method_name, reservation_folder, attempt, captured_at=None, extension="png"):
+        self.blobs[f"{reservation_folder}/Attempt_{attempt}/{method_name}_{captured_at:%Y%m%d_%H%M%S}.{extension}"] = image_bytes
+
+def test_sibling_hedges_do_not_overwrite_each_other():
+    blobs = FakeBlobService()
+    captured_at = datetime(2026, 1, 4, 7, 20, 0)
+    uploaders = [ScreenshotUploader(blobs, "2026-01-08_07:30 AM", 1, hedge=hedge) for hedge in (1, 2)]
+    for hedge, uploader in enumerate(uploaders, start=1):
+        uploader.submit(f"hedge {hedge}".encode(), "001_initial_page_load", captured_at=captured_at)
+        assert uploader.drain(timeout=10)
+    assert sorted(blobs.blobs.values()) == [b"hedge 1", b"hedge 2"]
+    assert all("/Attempt_1/h" in name for name in blobs.blobs)
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from automation.server_clock import ServerClockEstimator
+
+class FakeDriver:
+    """Driver whose async script answers with `samples` (or raises them)."""
+    def __init__(self, samples):
+        self.samples = samples
+        self.timeouts = SimpleNamespace(script=10)
+        self.timeouts_during_script = []
+
+    def set_script_timeout(self, seconds):
+        self.timeouts.script = seconds
+
+    def execute_async_script(self, script, *args):
+        self.timeouts_during_script.append(self.timeouts.script)
+        if isinstance(self.samples, Exception):
+            raise self.samples
+        return self.samples
+
+def sampling_browser(samples):
+    return SimpleNamespace(driver=FakeDriver(samples), get_current_url=lambda: "https://club.example/Member_sheet")
+
+def test_sampling_restores_the_script_timeout():
+    sb = sampling_browser([[1_700_000_000_000, 1_700_000_000_050, "Tue, 14 Nov 2023 22:13:20 GMT"]])
+    assert ServerClockEstimator().sample(sb, count=12, interval_ms=137)["samples"] == 1
+    assert sb.driver.timeouts_during_script[0] >= 30
+    assert sb.driver.timeouts.script == 10
+
+def test_failed_sampling_restores_the_script_timeout():
+    sb = sampling_browser(TimeoutError("script timeout"))
+    with pytest.raises(TimeoutError):
+        ServerClockEstimator().sample(sb, count=12, interval_ms=137)
+    assert sb.driver.timeouts.script == 10
@@ -0,0 +1,99 @@
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pytz
+
+from automation import login
+from automation.session_store import SessionStore
+
+COOKIE = {"name": "JSESSIONID", "value": "abc", "domain": "web.foretees.com", "path": "/",
+          "secure": True, "httpOnly": True, "session": True, "expires": -1}
+
+class FakeLogger:
+    def log(self, message, **fields):
+        pass
+
+    def log_duration(self, label, start, end, extra=None):
+        pass
+
+    def context(self, label):
+        return nullcontext()
+
+class FakeCtx:
+    logger = FakeLogger()
+
+class FakeDriver:
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.commands.append((command, params))
+        return {"cookies": []} if command == "Network.getAllCookies" else {}
+
+class FakeSB:
+    def __init__(self):
+        self.driver = FakeDriver()
+
+def test_shared_jar_survives_the_other_attempt_finishing(tmp_path, monkeypatch):
+    logouts = []
+    monkeypatch.setattr(login, "handle_logout", lambda sb, ctx: logouts.append(ctx) or True)
+    cold = SessionStore("member", base_dir=str(tmp_path))      # logged in from scratch
+    resumed = SessionStore("member", base_dir=str(tmp_path))   # parallel attempt, same account
+    cold.write_jar([COOKIE])
+    sb = FakeSB()
+    assert resumed.restore_cookies(sb) == 1
+
+    # The cold attempt books and finishes while the resumed one is mid-flow
+    assert login.end_session(FakeSB(), FakeCtx(), cold)
+
+    assert logouts == []
+    assert resumed.load_cookies()[0]["value"] == "abc"
+
+def test_logout_without_session_reuse(monkeypatch):
+    logouts = []
+    monkeypatch.setattr(login, "handle_logout", lambda sb, ctx: logouts.append(ctx) or True)
+    assert login.end_session(FakeSB(), FakeCtx(), None)
+    assert len(logouts) == 1
+
+def test_concurrent_jar_writes_leave_a_readable_jar(tmp_path):
+    stores = [SessionStore("member", base_dir=str(tmp_path)) for _ in range(8)]
+    threads = [threading.Thread(target=store.write_jar, args=([dict(COOKIE, value=str(i))],))
+               for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cookies = stores[0].load_cookies()
+    assert len(cookies) == 1 and cookies[0]["value"] in {str(i) for i in range(8)}
+
+def test_clear_keeps_a_session_saved_meanwhile(tmp_path):
+    store = SessionStore("member", base_dir=str(tmp_path))
+    store.write_jar([COOKIE])
+    store.restore_cookies(FakeSB())
+    store.write_jar([dict(COOKIE, value="newer")])  # another attempt logged in afresh
+    store.clear(stale=store.restored)
+    assert store.load_cookies()[0]["value"] == "newer"
+    store.clear()
+    assert store.load_cookies() is None
+
+def test_resumed_session_that_cannot_reach_the_sheet_logs_in_cold(tmp_path, monkeypatch):
+    store = SessionStore("member", base_dir=str(tmp_path))
+    store.write_jar([COOKIE])
+    logins, navigations = [], iter([False, True])
+
+    def resume(sb, ctx, store):
+        store.restore_cookies(sb)
+        return True
+
+    monkeypatch.setattr(login, "resume_saved_session", resume)
+    monkeypatch.setattr(login, "navigate_to_tee_sheet", lambda sb, ctx, date, course: next(navigations))
+    monkeypatch.setattr(login, "_login_to_foretees", lambda *args: logins.append(args))
+    monkeypatch.setattr(login, "log_page_load", lambda sb, phase, logger: None)
+    sb = FakeSB()
+    refresh_time = datetime.now(pytz.utc) + timedelta(minutes=5)
+    readiness = login.prestage_session(sb, FakeCtx(), "https://club.example", "2026-01-11", "07:30 AM",
+                                       "Main", refresh_time, store)
+    assert len(logins) == 1 and "navigate_to_tee_sheet" in readiness
+    assert ("Network.clearBrowserCookies", {}) in sb.driver.commands
+    assert store.load_cookies() is None  # the dead jar is gone; the fake browser has no cookies to save
@@ -0,0 +1,114 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import urllib3
+from requests.adapters import BaseAdapter
+from azure.core.exceptions import ResourceNotFoundError
+
+from automation import storage_clients
+from automation.metrics import STORAGE_LATENCY
+
+AZURITE = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+    "TableEndpoint=http://127.0.0.1:10002/devstoreaccount1;"
+)
+
+class NotFoundAdapter(BaseAdapter):
+    """Answers every request with a storage-style 404 without touching the network."""
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = 404
+        response.reason = "Not Found"
+        response.url = request.url
+        response.request = request
+        body = b'{"odata.error": {"code": "ResourceNotFound", "message": {"value": "not found"}}}'
+        headers = {"x-ms-error-code": "ResourceNotFound", "Content-Type": "application/json",
+                   "Content-Length": str(len(body))}
+        response.headers.update(headers)
+        response.raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=headers, status=404,
+                                            preload_content=False)
+        return response
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def transport(monkeypatch):
+    monkeypatch.setenv("AZURE_STORAGE_CONNECTION_STRING", AZURITE)
+    session = requests.Session()
+    adapter = NotFoundAdapter()
+    session.mount("http://", adapter)
+    return storage_clients._build_transport(session), adapter
+
+def _count(service, method):
+    series = STORAGE_LATENCY._series.get((service, method, "404"))
+    return series["count"] if series else 0
+
+def test_table_operation_is_timed(transport):
+    transport, adapter = transport
+    client = storage_clients.build_table_client("reservations", transport)
+    before = _count("table", "GET")
+    with pytest.raises(ResourceNotFoundError):
+        client.get_entity(partition_key="res_20260101", row_key="2026-01-04_07:30 AM")
+    assert adapter.requests
+    assert _count("table", "GET") == before + 1
+
+def test_blob_operation_is_timed(transport):
+    transport, adapter = transport
+    service = storage_clients.build_blob_service_client(transport)
+    blob = service.get_container_client("screenshots").get_blob_client("a/Attempt_1/x.png")
+    before = _count("blob", "HEAD")
+    with pytest.raises(ResourceNotFoundError):
+        blob.get_blob_properties()
+    assert adapter.requests
+    assert _count("blob", "HEAD") == before + 1
+
+class TableNotFound(BaseHTTPRequestHandler):
+    """Keep-alive Table endpoint answering every entity read with ResourceNotFound."""
+    protocol_version = "HTTP/1.1"
+    peers = []
+
+    def do_GET(self):
+        self.peers.append(self.client_address)
+        body = b'{"odata.error": {"code": "ResourceNotFound", "message": {"value": "not found"}}}'
+        self.send_response(404)
+        self.send_header("x-ms-error-code", "ResourceNotFound")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_async_reads_reuse_one_client_across_batches(monkeypatch):
+    TableNotFound.peers = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TableNotFound)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("AZURE_STORAGE_CONNECTION_STRING",
+                       AZURITE.replace("10002", str(server.server_port)))
+    monkeypatch.setenv("STORAGE_ASYNC", "1")
+    monkeypatch.setattr(storage_clients, "_clients", {})
+    try:
+        keys = [("res_20260104", "2026-01-11_07:30 AM"), ("res_20260104", "2026-01-11_07:40 AM")]
+        assert storage_clients.get_entities(keys, "reservations") == [None, None]
+        tables = storage_clients._clients["aio_tables"]
+        assert storage_clients.get_entities(keys, "reservations") == [None, None]
+        assert storage_clients._clients["aio_tables"] is tables and len(tables._clients) == 1
+        # The second batch went over the connections the first one opened
+        assert len(TableNotFound.peers) == 4 and len(set(TableNotFound.peers)) <= 2
+    finally:
+        if "aio_tables" in storage_clients._clients:
+            storage_clients._clients["aio_tables"].close()
+        server.shutdown()
+        server.server_close()